@@ -0,0 +1,181 @@
+"""
+Occupancy and revenue analytics
+Per hotel, rooms sold and revenue are kept as numpy matrices (row per room type,
+column per night) over a rolling two-year window. Bookings that changed since the
+last look are folded in by subtracting their old contribution and adding the new
+one, so a year of occupancy, ADR and RevPAR is a few slice sums
+"""
+
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+PAST_DAYS = 365
+FUTURE_DAYS = 365
+
+# Row for stays booked against the hotel rather than a room (and for rooms without a type)
+ANY_ROOM_TYPE = None
+
+
+def _nights(start, check_in, check_out, days):
+    """Clipped column range [first, last) of a stay inside the window"""
+    first = max((check_in - start).days, 0)
+    last = min((check_out - start).days, days)
+    return first, last
+
+
+class HotelStats:
+    """Nightly rooms sold and revenue per room type for one hotel"""
+
+    def __init__(self, start, days, room_counts):
+        """room_counts: {room_type: rooms of that type}; hotel-level bookings use ANY_ROOM_TYPE"""
+        self.start = start
+        self.days = days
+        self.room_types = list(room_counts)
+        if ANY_ROOM_TYPE not in room_counts:
+            self.room_types.append(ANY_ROOM_TYPE)
+        self.row = {room_type: i for i, room_type in enumerate(self.room_types)}
+        self.rooms = np.array([room_counts.get(t, 0) for t in self.room_types], dtype=np.int64)
+        self.sold = np.zeros((len(self.room_types), days), dtype=np.int64)
+        self.revenue = np.zeros((len(self.room_types), days))
+        self.contributions = {}  # booking id -> (row, check_in, check_out, nightly rate)
+        self.synced_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.days)
+
+    def _add(self, row, check_in, check_out, nightly, sign):
+        first, last = _nights(self.start, check_in, check_out, self.days)
+        if first < last:
+            self.sold[row, first:last] += sign
+            self.revenue[row, first:last] += sign * nightly
+
+    def apply(self, booking_id, room_type, check_in, check_out, total_price, confirmed):
+        """Replace a booking's contribution; idempotent, so re-reading a booking is harmless"""
+        old = self.contributions.pop(booking_id, None)
+        if old is not None:
+            self._add(*old, sign=-1)
+        if not confirmed or check_out <= check_in:
+            return
+        row = self.row.get(room_type, self.row[ANY_ROOM_TYPE])
+        entry = (row, check_in, check_out, total_price / (check_out - check_in).days)
+        self.contributions[booking_id] = entry
+        self._add(*entry, sign=1)
+
+    def series(self, start, end, room_type=False):
+        """Daily occupancy, ADR and RevPAR arrays for [start, end); room_type False = all types"""
+        first, last = _nights(self.start, start, end, self.days)
+        last = max(first, last)
+        if room_type is False:
+            rows = slice(None)
+        else:
+            rows = [self.row[room_type]] if room_type in self.row else []
+        sold = self.sold[rows, first:last].sum(axis=0)
+        revenue = self.revenue[rows, first:last].sum(axis=0)
+        rooms = int(self.rooms[rows].sum())
+
+        occupancy = sold / rooms if rooms else np.zeros(len(sold))
+        adr = np.where(sold > 0, revenue / np.maximum(sold, 1), 0.0)
+        revpar = revenue / rooms if rooms else np.zeros(len(sold))
+        return {
+            'start': self.start + timedelta(days=first),
+            'rooms': rooms,
+            'sold': sold,
+            'revenue': revenue,
+            'occupancy': occupancy,
+            'adr': adr,
+            'revpar': revpar,
+        }
+
+    def daily(self, start, end, room_type=False):
+        """series() as rounded plain lists, ready for JSON"""
+        s = self.series(start, end, room_type)
+        return {
+            'start': s['start'],
+            'rooms': s['rooms'],
+            'sold': s['sold'].tolist(),
+            'revenue': np.round(s['revenue'], 2).tolist(),
+            'occupancy': np.round(s['occupancy'], 4).tolist(),
+            'adr': np.round(s['adr'], 2).tolist(),
+            'revpar': np.round(s['revpar'], 2).tolist(),
+        }
+
+    def summary(self, start, end, room_type=False):
+        """Totals for the range: occupancy over all room-nights, ADR over sold nights"""
+        s = self.series(start, end, room_type)
+        room_nights = s['rooms'] * len(s['sold'])
+        sold, revenue = int(s['sold'].sum()), float(s['revenue'].sum())
+        return {
+            'nights': len(s['sold']),
+            'room_nights': room_nights,
+            'sold': sold,
+            'revenue': round(revenue, 2),
+            'occupancy': round(sold / room_nights, 4) if room_nights else 0.0,
+            'adr': round(revenue / sold, 2) if sold else 0.0,
+            'revpar': round(revenue / room_nights, 2) if room_nights else 0.0,
+        }
+
+    def monthly(self, start, end, room_type=False):
+        """[(first day of month, summary)] for each calendar month touching [start, end)"""
+        months = []
+        month = date(start.year, start.month, 1)
+        while month < end:
+            following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            months.append((month, self.summary(max(month, start), min(following, end), room_type)))
+            month = following
+        return months
+
+
+class AnalyticsEngine:
+    """Per-process HotelStats cache, rebuilt when the window moves or rooms change, else synced incrementally"""
+
+    def __init__(self, past_days=PAST_DAYS, future_days=FUTURE_DAYS):
+        self.past_days = past_days
+        self.future_days = future_days
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def stats(self, hotel_id, load_rooms, load_bookings, now, today=None):
+        """
+        load_rooms() -> {room_id: room_type}
+        load_bookings(since, start, end) -> [(id, room_id, check_in, check_out, total_price, status)]:
+            every booking overlapping [start, end) when since is None, else every booking updated
+            at or after since (wherever its dates now fall, so moved stays leave the window too)
+        now: sync watermark in the same clock as the bookings' updated_at (None = no bookings yet)
+        """
+        today = today or date.today()
+        start = today - timedelta(days=self.past_days)
+        room_types = load_rooms()
+        room_counts = {}
+        for room_type in room_types.values():
+            room_counts[room_type] = room_counts.get(room_type, 0) + 1
+
+        stats = self._stats.get(hotel_id)
+        if stats is None or stats.start != start or \
+                dict(zip(stats.room_types, stats.rooms.tolist())) != {**{ANY_ROOM_TYPE: 0}, **room_counts}:
+            stats = HotelStats(start, self.past_days + self.future_days, room_counts)
+            since = None
+        else:
+            since = stats.synced_at
+
+        with stats.lock:
+            for booking_id, room_id, check_in, check_out, total_price, status in load_bookings(since, start, stats.end):
+                stats.apply(booking_id, room_types.get(room_id, ANY_ROOM_TYPE), check_in, check_out,
+                            total_price, status == 'confirmed')
+            stats.synced_at = now
+        with self._lock:
+            self._stats[hotel_id] = stats
+        return stats
+
+    def invalidate(self, hotel_id=None):
+        with self._lock:
+            if hotel_id is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(hotel_id, None)
+
+
+analytics_engine = AnalyticsEngine()
@@ -0,0 +1,74 @@
+"""
+API bearer tokens and JSON responses
+Signed, expiring tokens carry the user id, role and hotel scope, so /api/v1
+requests are authorized without a session or a user-table lookup
+"""
+
+import json
+
+from flask import Response
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+class ApiTokenError(Exception):
+    pass
+
+
+class ApiTokens:
+    """Issue and verify itsdangerous-signed bearer tokens"""
+
+    salt = 'api-v1-token'
+
+    def __init__(self, secret_key=None, max_age=3600):
+        self.secret_key = secret_key
+        self.max_age = max_age
+        self._serializer = None
+
+    def init_app(self, app):
+        self.secret_key = app.config['SECRET_KEY']
+        self.max_age = app.config.get('API_TOKEN_MAX_AGE', self.max_age)
+        self._serializer = None
+
+    @property
+    def serializer(self):
+        if self._serializer is None:
+            self._serializer = URLSafeTimedSerializer(self.secret_key, salt=self.salt)
+        return self._serializer
+
+    def issue(self, user_id, role, hotel_ids=()):
+        """Token for a user; hotel_ids are the hotels a hotel_admin may manage"""
+        return self.serializer.dumps({'uid': user_id, 'role': role, 'hotels': sorted(hotel_ids)})
+
+    def verify(self, token):
+        """Claims dict, or ApiTokenError if the token is forged, malformed or expired"""
+        try:
+            return self.serializer.loads(token, max_age=self.max_age)
+        except SignatureExpired:
+            raise ApiTokenError('Token expired')
+        except BadSignature:
+            raise ApiTokenError('Invalid token')
+
+
+def _default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """JSON bytes; dates and datetimes become ISO strings with either encoder"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+api_tokens = ApiTokens()
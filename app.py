@@ -1,21 +1,62 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, session, get_flashed_messages
+from flask import Flask, render_template, redirect, url_for, flash, request, session, get_flashed_messages, jsonify, send_from_directory, abort, g, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import safe_join
 from datetime import datetime, timedelta
 import os
+import io
+import atexit
+import csv
+import hmac
+import json
+import mimetypes
+import threading
+import time
+import uuid
+from functools import wraps
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
+from werkzeug.middleware.proxy_fix import ProxyFix
+from markupsafe import escape
 import re
-import requests
 from dotenv import load_dotenv
+import click
+from whatsapp_service import whatsapp_service
+from image_utils import image_utils, generate_placeholder
+from password_hashing import password_hasher, PasswordHasherBusy
+from login_throttle import login_throttle
+from cache import cache
+from api_tokens import api_tokens, ApiTokenError, json_response
+from rate_engine import rate_engine, build_rate_calendar, HOTEL_KEY, HORIZON_DAYS
+from events import events
+from analytics import analytics_engine, ANY_ROOM_TYPE
+from exports import csv_stream, xlsx_stream, ExportUnavailable
+from bulk_import import RowError, SPECS as IMPORT_SPECS, detect_format, read_records, validate
+from synthetic_data import SyntheticData, DOMAIN as SYNTHETIC_DOMAIN
+from profiling import profiler
+from metrics import metrics, MetricsUnavailable
 
 # Load environment variables
 load_dotenv()
+whatsapp_service.configure_from_env()
+password_hasher.configure_from_env()
+login_throttle.configure_from_env()
+events.configure_from_env()
+profiler.configure_from_env()
+metrics.configure_from_env()
 
 # Flask app creation
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY') or 'your-secret-key-12345-change-in-production'
 
+# Per-request timings and SQL counts for /admin/profiling (and response headers in debug mode)
+profiler.init_app(app, ignore={'static', 'profiling_report', 'clear_profiling'})
+
+# Behind Railway/nginx the client address arrives in X-Forwarded-For; login throttling keys on it
+if os.environ.get('PROXY_FIX_X_FOR'):
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ['PROXY_FIX_X_FOR']))
+
 # Database configuration for Railway (PostgreSQL)
 def get_database_url():
     if 'DATABASE_URL' in os.environ:
@@ -35,8 +76,27 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Originals stay out of the public folder; only processed variants are served
+app.config['IMAGE_ORIGINALS_FOLDER'] = os.environ.get('IMAGE_ORIGINALS_FOLDER', 'uploads/originals')
+app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+# Processed variants are served from /media; set IMAGE_SENDFILE to 'x-accel' (nginx) or
+# 'x-sendfile' (Apache/lighttpd) to let the front proxy stream the bytes instead of gunicorn
+app.config['IMAGE_URL_PREFIX'] = '/media'
+app.config['IMAGE_SENDFILE'] = os.environ.get('IMAGE_SENDFILE', '').lower()
+app.config['IMAGE_ACCEL_PREFIX'] = os.environ.get('IMAGE_ACCEL_PREFIX', '/protected-media')
+app.config['USE_X_SENDFILE'] = app.config['IMAGE_SENDFILE'] == 'x-sendfile'
+# Storage accounting counts each distinct original a hotel (or its rooms) references
+app.config['HOTEL_STORAGE_QUOTA_MB'] = int(os.environ.get('HOTEL_STORAGE_QUOTA_MB', 200))
+# Unreferenced files are only removed once they are older than this
+app.config['IMAGE_GC_GRACE_SECONDS'] = int(os.environ.get('IMAGE_GC_GRACE_SECONDS', 24 * 3600))
+
 # Create upload folder if not exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+image_utils.init_app(app)
+
+# Bearer tokens for /api/v1
+app.config['API_TOKEN_MAX_AGE'] = int(os.environ.get('API_TOKEN_MAX_AGE', 3600))
+api_tokens.init_app(app)
 
 db = SQLAlchemy(app)
 login_manager = LoginManager(app)
@@ -61,6 +121,25 @@ def validate_password_strength(password):
         return False, "මුරපදයේ අවම වශයෙන් එක් ඉලක්කමක්වත් තිබිය යුතුය"
     return True, "මුරපදය ශක්තිමත් ය"
 
+DUPLICATE_USER_MESSAGES = {
+    'username': 'මෙම පරිශීලක නාමය දැනටමත් භාවිතා කර ඇත.',
+    'email': 'මෙම ඊමේල් ලිපිනය දැනටමත් භාවිතා කර ඇත.',
+}
+
+def duplicate_user_field(error):
+    """Which unique User column an IntegrityError tripped: 'username', 'email' or None"""
+    # SQLite: "UNIQUE constraint failed: user.email"; PostgreSQL: "... Key (email)=(...) already exists"
+    detail = str(error.orig).lower()
+    for field in DUPLICATE_USER_MESSAGES:
+        if field in detail:
+            return field
+    return None
+
+def can_manage_hotel(hotel):
+    """Super admins, or the hotel admin who owns this hotel"""
+    return current_user.user_type == 'super_admin' or \
+        (current_user.user_type == 'hotel_admin' and hotel is not None and hotel.owner_email == current_user.email)
+
 def validate_booking_dates(check_in, check_out):
     """Validate booking dates"""
     if check_in >= check_out:
@@ -82,10 +161,13 @@ class User(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
 class Hotel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -95,12 +177,17 @@ class Hotel(db.Model):
     owner_name = db.Column(db.String(100))
     owner_email = db.Column(db.String(100))
     contact_number = db.Column(db.String(20))
+    whatsapp_number = db.Column(db.String(20))
     price_per_night = db.Column(db.Float, nullable=False)
     total_rooms = db.Column(db.Integer, nullable=False)
     available_rooms = db.Column(db.Integer, nullable=False)
     amenities = db.Column(db.Text)
     hotel_type = db.Column(db.String(20), default='hotel')  # hotel, villa, resort
     image_path = db.Column(db.String(255))
+    images = db.relationship('HotelImage', backref='hotel', lazy=True,
+                             order_by='(HotelImage.is_primary.desc(), HotelImage.id)')
+    notification_digest_minutes = db.Column(db.Integer, nullable=True)  # None = notify owner per event
+    rates_version = db.Column(db.Integer, default=0)  # bumped when rooms or rate rules change
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_approved = db.Column(db.Boolean, default=False)
     approved_by = db.Column(db.Integer, nullable=True)
@@ -116,8 +203,70 @@ class Room(db.Model):
     is_available = db.Column(db.Boolean, default=True)
     features = db.Column(db.Text)
     image_path = db.Column(db.String(255))
+    images = db.relationship('RoomImage', backref='room', lazy=True,
+                             order_by='(RoomImage.is_primary.desc(), RoomImage.id)')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class ImageBlob(db.Model):
+    """One stored original per distinct upload (sha256), shared by every image row that uses it"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    variants = db.Column(db.Text)  # JSON: {"thumb": {"width": .., "height": .., "webp": url, "jpeg": url}, ...}
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    processing_status = db.Column(db.String(20), default='pending')  # pending, ready, failed
+    released_at = db.Column(db.DateTime)  # when the garbage collector first saw ref_count at 0
+    placeholder = db.Column(db.Text)  # ~16px JPEG data URI rendered inline before the real image loads
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class StoredImageMixin:
+    """Image rows read their URLs and processing state from the shared blob"""
+    
+    @property
+    def processing_status(self):
+        return self.blob.processing_status if self.blob else 'failed'
+    
+    @property
+    def image_url(self):
+        return self.variant_url('large') or ''
+    
+    @property
+    def placeholder(self):
+        return self.blob.placeholder if self.blob else None
+    
+    @property
+    def width(self):
+        return self.blob.width if self.blob else None
+    
+    @property
+    def height(self):
+        return self.blob.height if self.blob else None
+    
+    def variant_url(self, name='medium', fmt='jpeg'):
+        return image_utils.variant_url(self.blob.variants if self.blob else None, name, fmt)
+    
+    def srcset(self, fmt='jpeg'):
+        return image_utils.srcset(self.blob.variants if self.blob else None, fmt)
+
+class HotelImage(StoredImageMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hotel_id = db.Column(db.Integer, db.ForeignKey('hotel.id'), nullable=False, index=True)
+    content_hash = db.Column(db.String(64), db.ForeignKey('image_blob.content_hash'), nullable=False, index=True)
+    blob = db.relationship('ImageBlob', lazy='joined')
+    is_primary = db.Column(db.Boolean, default=False)
+    upload_job_id = db.Column(db.String(32), index=True)  # batch upload this image arrived in
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class RoomImage(StoredImageMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('room.id'), nullable=False, index=True)
+    content_hash = db.Column(db.String(64), db.ForeignKey('image_blob.content_hash'), nullable=False, index=True)
+    blob = db.relationship('ImageBlob', lazy='joined')
+    is_primary = db.Column(db.Boolean, default=False)
+    uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     hotel_id = db.Column(db.Integer, nullable=False)
@@ -125,12 +274,111 @@ class Booking(db.Model):
     guest_name = db.Column(db.String(100), nullable=False)
     guest_email = db.Column(db.String(100))
     guest_phone = db.Column(db.String(20))
+    guest_whatsapp = db.Column(db.String(20))
     check_in_date = db.Column(db.Date, nullable=False)
     check_out_date = db.Column(db.Date, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
     booking_date = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='confirmed')
     customer_id = db.Column(db.Integer, nullable=True)
+    group_id = db.Column(db.String(32), nullable=True, index=True)  # rooms reserved together in one group booking
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+class BookingCalendar(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hotel_id = db.Column(db.Integer, nullable=False, index=True)
+    room_id = db.Column(db.Integer, nullable=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    status = db.Column(db.String(20), default='available')  # available, booked, blocked
+    booking_id = db.Column(db.Integer, nullable=True)
+    updated_by = db.Column(db.Integer, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyInventory(db.Model):
+    """Rooms booked per hotel per night, kept in step with bookings (one row per hotel and date)"""
+    __table_args__ = (db.UniqueConstraint('hotel_id', 'date'),)
+    id = db.Column(db.Integer, primary_key=True)
+    hotel_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    booked_rooms = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class WaitlistEntry(db.Model):
+    """A stay request for a full hotel; offered a held room when matching inventory frees up"""
+    id = db.Column(db.Integer, primary_key=True)
+    hotel_id = db.Column(db.Integer, nullable=False, index=True)
+    room_type = db.Column(db.String(50), nullable=True)  # None = any room that fits the guests
+    check_in_date = db.Column(db.Date, nullable=False)
+    check_out_date = db.Column(db.Date, nullable=False)
+    guests = db.Column(db.Integer, nullable=False, default=1)
+    customer_id = db.Column(db.Integer, nullable=False, index=True)
+    guest_name = db.Column(db.String(100), nullable=False)
+    guest_phone = db.Column(db.String(20))
+    guest_whatsapp = db.Column(db.String(20))
+    priority = db.Column(db.Integer, default=0)  # higher first, then oldest first
+    status = db.Column(db.String(20), default='waiting')  # waiting, held, booked, expired, cancelled
+    held_room_id = db.Column(db.Integer, nullable=True)
+    hold_expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    booking_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class WaitlistNight(db.Model):
+    """Date index over waiting entries: one row per requested night, removed once the entry stops waiting"""
+    __table_args__ = (db.Index('ix_waitlist_night_hotel_date', 'hotel_id', 'date'),)
+    id = db.Column(db.Integer, primary_key=True)
+    entry_id = db.Column(db.Integer, db.ForeignKey('waitlist_entry.id'), nullable=False, index=True)
+    hotel_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+
+class RateRule(db.Model):
+    """Nightly price override/multiplier for a date range and weekdays, or a length-of-stay discount"""
+    id = db.Column(db.Integer, primary_key=True)
+    hotel_id = db.Column(db.Integer, nullable=False, index=True)
+    room_type = db.Column(db.String(50), nullable=True)  # None = every room type
+    name = db.Column(db.String(100), nullable=False)
+    start_date = db.Column(db.Date, nullable=True)
+    end_date = db.Column(db.Date, nullable=True)  # inclusive
+    weekdays = db.Column(db.String(20))  # "4,5" = Friday and Saturday nights (0 = Monday)
+    price = db.Column(db.Float, nullable=True)
+    multiplier = db.Column(db.Float, nullable=True)
+    min_nights = db.Column(db.Integer, nullable=True)
+    discount_percent = db.Column(db.Float, nullable=True)
+    priority = db.Column(db.Integer, default=0)  # higher priority rules apply later
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def as_rule(self):
+        return {
+            'room_type': self.room_type or None,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'weekdays': {int(d) for d in self.weekdays.split(',') if d.strip().isdigit()} if self.weekdays else None,
+            'price': self.price,
+            'multiplier': self.multiplier,
+            'min_nights': self.min_nights,
+            'discount_percent': self.discount_percent,
+            'priority': self.priority,
+        }
+
+class NotificationDigestEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    hotel_id = db.Column(db.Integer, nullable=False, index=True)
+    event_type = db.Column(db.String(20), nullable=False)  # booking, cancellation, modification, calendar
+    summary = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    digested_at = db.Column(db.DateTime, nullable=True, index=True)
+
+class NotificationDeadLetter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(50))
+    phone = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    context = db.Column(db.Text)  # JSON, e.g. {"booking_id": 1, "hotel_id": 2}
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(255))
+    queued_at = db.Column(db.DateTime)
+    failed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    replayed_at = db.Column(db.DateTime, nullable=True)
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -160,28 +408,241 @@ Check-out: {check_out}
     return True
 
 def send_whatsapp_api_message(phone, message):
-    """Send actual WhatsApp message using API"""
-    try:
-        # Example using a WhatsApp API service (adjust based on your provider)
-        api_url = "https://api.whatsapp.com/send"
-        payload = {
-            'phone': phone,
-            'message': message,
-            'api_key': os.environ.get('WHATSAPP_API_KEY')
-        }
-        # response = requests.post(api_url, json=payload)
-        # return response.status_code == 200
-        print(f"📧 WhatsApp API would send to {phone}: {message[:50]}...")
-        return True
-    except Exception as e:
-        print(f"WhatsApp API Error: {e}")
-        return False
+    """Queue WhatsApp message for delivery (retried in the background)"""
+    whatsapp_service.enqueue(phone, message)
+    return True
+
+def store_dead_letter(outbound):
+    """Persist a notification that exhausted its retries so admins can replay it"""
+    with app.app_context():
+        db.session.add(NotificationDeadLetter(
+            provider=outbound.provider or whatsapp_service.default_provider,
+            phone=outbound.phone,
+            message=outbound.message,
+            context=json.dumps(outbound.context),
+            attempts=outbound.attempts,
+            last_error=(outbound.last_error or '')[:255],
+            queued_at=outbound.created_at
+        ))
+        db.session.commit()
+
+whatsapp_service.dead_letter_handler = store_dead_letter
+# the outbox is in memory: keep what is still queued when the worker exits
+atexit.register(whatsapp_service.drain_to_dead_letters)
+
+# Owner notifications / digest mode
+def notify_hotel_owner(hotel, event_type, summary, message=None):
+    """Notify the hotel owner now, or hold the event for the next digest.
+
+    Call after the change has been committed; digest events are committed here.
+    """
+    if hotel.notification_digest_minutes:
+        db.session.add(NotificationDigestEvent(hotel_id=hotel.id, event_type=event_type, summary=summary[:255]))
+        db.session.commit()
+    else:
+        whatsapp_service.enqueue(hotel.whatsapp_number or hotel.contact_number, message or summary,
+                                 context={'hotel_id': hotel.id, 'event_type': event_type})
+
+def send_notification_digests(now=None):
+    """Send one coalesced message per digest-mode hotel whose oldest pending event is due"""
+    now = now or datetime.utcnow()
+    Event = NotificationDigestEvent
+    pending = db.session.query(Event.hotel_id, db.func.min(Event.created_at), db.func.max(Event.id)).filter(
+        Event.digested_at.is_(None)).group_by(Event.hotel_id).all()
+    if not pending:
+        return 0
+    
+    hotels = {h.id: h for h in Hotel.query.filter(Hotel.id.in_([row[0] for row in pending])).all()}
+    sent = 0
+    for hotel_id, oldest, last_id in pending:
+        hotel = hotels.get(hotel_id)
+        # hotels that switched digest mode off get their backlog flushed straight away
+        interval = (hotel.notification_digest_minutes or 0) if hotel else 0
+        if oldest > now - timedelta(minutes=interval):
+            continue
+        
+        # Claiming with a conditional UPDATE keeps concurrent schedulers from double-sending
+        claimed = Event.query.filter(Event.hotel_id == hotel_id, Event.digested_at.is_(None),
+                                     Event.id <= last_id).update({'digested_at': now}, synchronize_session=False)
+        db.session.commit()
+        if not claimed or hotel is None:
+            continue
+        
+        events = Event.query.filter(Event.hotel_id == hotel_id, Event.digested_at == now,
+                                    Event.id <= last_id).order_by(Event.id).all()
+        whatsapp_service.send_owner_digest(hotel, [(e.event_type, e.summary) for e in events])
+        sent += 1
+    return sent
+
+def run_digest_scheduler(interval_seconds):
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            with app.app_context():
+                send_notification_digests()
+        except Exception as e:
+            print(f"Digest scheduler error: {e}")
+
+_digest_scheduler_pid = None
+
+@app.before_request
+def start_digest_scheduler():
+    """Run the digest job inside each worker when NOTIFICATION_DIGEST_SCHEDULER is set"""
+    global _digest_scheduler_pid
+    interval = int(os.environ.get('NOTIFICATION_DIGEST_SCHEDULER', 0))
+    if interval and _digest_scheduler_pid != os.getpid():
+        _digest_scheduler_pid = os.getpid()
+        threading.Thread(target=run_digest_scheduler, args=(interval,), name='digest-scheduler', daemon=True).start()
+
+@app.cli.command('send-digests')
+def send_digests_command():
+    """Send due hotel-owner notification digests (run from cron)"""
+    print(f"📋 {send_notification_digests()} digest(s) queued")
+
+# Schema upgrades
+def _legacy_columns(table, existing):
+    """Columns the database requires that the model no longer fills: NOT NULL without a default,
+    either gone from the model (hotel_image.image_url) or relaxed to nullable in it"""
+    legacy = []
+    for name, column in existing.items():
+        if column['nullable'] or column.get('default') is not None or column.get('primary_key'):
+            continue
+        if name not in table.c or table.c[name].nullable:
+            legacy.append(name)
+    return legacy
+
+def _column_default(column):
+    default = column.default
+    if default is None or not (default.is_scalar or default.is_callable):
+        return None
+    return default.arg(None) if default.is_callable else default.arg
+
+def _add_missing_columns(conn, table, existing):
+    """ALTER TABLE ADD COLUMN for every model column the table lacks, then backfill its default.
+    Added columns stay nullable on SQLite, which cannot add NOT NULL without a constant default"""
+    preparer = conn.dialect.identifier_preparer
+    added = []
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        conn.execute(db.text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN '
+                             f'{preparer.format_column(column)} {column.type.compile(conn.dialect)}'))
+        value = _column_default(column)
+        if value is not None:
+            conn.execute(table.update().where(column.is_(None)).values({column.name: value}))
+        if conn.dialect.name == 'postgresql' and not column.nullable and value is not None:
+            conn.execute(db.text(f'ALTER TABLE {preparer.format_table(table)} '
+                                 f'ALTER COLUMN {preparer.format_column(column)} SET NOT NULL'))
+        added.append(column.name)
+    for index in table.indexes:
+        if any(column.name in added for column in index.columns):
+            index.create(conn, checkfirst=True)
+    return added
+
+def _rebuild_table(conn, table, existing):
+    """Recreate a table whose old NOT NULL columns would reject new rows; rows are copied when the
+    old table has every column the new one requires, otherwise the old table is kept as <name>_legacy"""
+    preparer = conn.dialect.identifier_preparer
+    legacy_name = f'{table.name}_legacy'
+    # index names are per schema; the new table recreates them
+    for index in db.inspect(conn).get_indexes(table.name):
+        if not index.get('duplicates_constraint'):
+            conn.execute(db.text(f"DROP INDEX {preparer.quote(index['name'])}"))
+    if conn.dialect.name == 'sqlite':
+        # keep foreign keys elsewhere pointing at the new table, not the renamed one
+        conn.execute(db.text('PRAGMA legacy_alter_table = ON'))
+    conn.execute(db.text(f'ALTER TABLE {preparer.format_table(table)} RENAME TO {preparer.quote(legacy_name)}'))
+    if conn.dialect.name == 'sqlite':
+        conn.execute(db.text('PRAGMA legacy_alter_table = OFF'))
+    table.create(conn)
+
+    required = {c.name for c in table.columns if not c.nullable and not c.primary_key and _column_default(c) is None}
+    if not required <= set(existing):
+        return legacy_name
+    shared = ', '.join(preparer.quote(c.name) for c in table.columns if c.name in existing)
+    conn.execute(db.text(f'INSERT INTO {preparer.format_table(table)} ({shared}) '
+                         f'SELECT {shared} FROM {preparer.quote(legacy_name)}'))
+    conn.execute(db.text(f'DROP TABLE {preparer.quote(legacy_name)}'))
+    return None
+
+def _migrate_kept_legacy(model, legacy_name, owner_column):
+    """Move rows of a pre-blob image table (image_url per row) into content-addressed storage;
+    rows whose file is gone stay in the legacy table"""
+    rows = db.session.execute(db.text(
+        f'SELECT id, {owner_column}, image_url, is_primary, uploaded_at FROM {legacy_name}')).all()
+    migrated, missing = [], []
+    for row in rows:
+        path = os.path.join(app.root_path, row.image_url.lstrip('/')) if row.image_url else ''
+        if not os.path.isfile(path):
+            missing.append(row.id)
+            continue
+        with open(path, 'rb') as fh:
+            stored = image_utils.store_upload(FileStorage(stream=fh, filename=os.path.basename(path)))
+        if stored is None:
+            missing.append(row.id)
+            continue
+        acquire_image_blob(*stored)
+        image = model(content_hash=stored[0], is_primary=bool(row.is_primary),
+                      uploaded_at=row.uploaded_at, **{owner_column: getattr(row, owner_column)})
+        db.session.add(image)
+        migrated.append(image)
+    if migrated:
+        db.session.execute(db.text(f'DELETE FROM {legacy_name} WHERE id NOT IN :missing').bindparams(
+            db.bindparam('missing', expanding=True)), {'missing': missing or [-1]})
+    if not missing:
+        db.session.execute(db.text(f'DROP TABLE {legacy_name}'))
+    db.session.commit()
+    start_image_processing(migrated)
+    return len(migrated), len(missing)
+
+def upgrade_schema():
+    """Bring an existing database up to the models: db.create_all() only creates missing tables.
+    Safe to run repeatedly; returns a list of the changes made"""
+    db.create_all()
+    changes = []
+    kept_legacy = []
+    with db.engine.begin() as conn:
+        inspector = db.inspect(conn)
+        for table in db.metadata.sorted_tables:
+            existing = {c['name']: c for c in inspector.get_columns(table.name)}
+            legacy = _legacy_columns(table, existing)
+            if legacy:
+                kept = _rebuild_table(conn, table, existing)
+                dropped = [name for name in existing if name not in table.c]
+                changes.append(f"{table.name}: rebuilt without NOT NULL on {', '.join(legacy)}"
+                               + (f" (dropped {', '.join(dropped)})" if dropped and not kept else ''))
+                if kept:
+                    kept_legacy.append((table.name, kept))
+                continue
+            added = _add_missing_columns(conn, table, existing)
+            if added:
+                changes.append(f"{table.name}: added {', '.join(added)}")
+
+    image_models = {'hotel_image': (HotelImage, 'hotel_id'), 'room_image': (RoomImage, 'room_id')}
+    for table_name, legacy_name in kept_legacy:
+        if table_name not in image_models:
+            changes.append(f"{table_name}: old rows kept in {legacy_name}, copy them by hand")
+            continue
+        migrated, missing = _migrate_kept_legacy(image_models[table_name][0], legacy_name,
+                                                   image_models[table_name][1])
+        changes.append(f"{table_name}: {migrated} image(s) moved to blob storage"
+                       + (f", {missing} with missing files left in {legacy_name}" if missing else ''))
+    return changes
+
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Add the tables, columns and indexes that existing databases are missing"""
+    changes = upgrade_schema()
+    for change in changes:
+        print(f"🔧 {change}")
+    print(f"✅ Schema up to date ({len(changes)} change(s))")
 
 # Database initialization
 def init_db():
     with app.app_context():
-        # Create all tables
-        db.create_all()
+        # Create missing tables and bring older databases up to the models
+        for change in upgrade_schema():
+            print(f"🔧 {change}")
         
         print("✅ Database tables created!")
         
@@ -344,6 +805,7 @@ def init_db():
             print("✅ Database already initialized!")
 
 # Base Template with common styling
+@profiler.rendering
 def base_template(title, content):
     nav_links = """
     <a class="nav-link text-white" href="/hotels"><i class="fas fa-hotel"></i> හොටෙල්</a>
@@ -466,7 +928,7 @@ def home():
         <div class="col-md-4">
             <div class="card hotel-card h-100">
                 <img src="{hotel.image_path or 'https://via.placeholder.com/300x200?text=Hotel+Image'}" 
-                     class="card-img-top hotel-image" alt="{hotel.name}">
+                     class="card-img-top hotel-image" alt="{hotel.name}" loading="lazy" decoding="async">
                 <div class="card-body">
                     <div class="d-flex justify-content-between align-items-start">
                         <h5 class="card-title">{hotel.name}</h5>
@@ -541,14 +1003,33 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        
+        # rejected here before any user lookup or password hashing
+        wait = login_throttle.check(username, request.remote_addr)
+        if wait:
+            flash(f'පිවිසුම් උත්සාහයන් වැඩියි. කරුණාකර තත්පර {int(wait) + 1} කින් නැවත උත්සාහ කරන්න.', 'warning')
+            return redirect(url_for('login'))
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password) and user.is_active:
+        try:
+            authenticated = user and user.check_password(password) and user.is_active
+            if authenticated and user.password_needs_rehash():
+                # stored with older hash parameters: upgrade now that we have the plaintext
+                user.set_password(password)
+                db.session.commit()
+        except PasswordHasherBusy:
+            flash('පද්ධතිය කාර්යබහුලයි. කරුණාකර මොහොතකින් නැවත උත්සාහ කරන්න.', 'warning')
+            return redirect(url_for('login'))
+        
+        if authenticated:
+            login_throttle.succeeded(username)
             login_user(user)
             flash('සාර්ථකව පිවිසිය!', 'success')
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('dashboard'))
         else:
+            login_throttle.failed(username)
             flash('පිවිසීම අසාර්ථකයි. කරුණාකර පරිශීලක නාමය සහ මුරපදය පරීක්ෂා කරන්න.', 'danger')
             return redirect(url_for('login'))
     
@@ -628,14 +1109,6 @@ def register():
             flash(message, 'danger')
             return redirect(url_for('register'))
         
-        if User.query.filter_by(username=username).first():
-            flash('මෙම පරිශීලක නාමය දැනටමත් භාවිතා කර ඇත.', 'danger')
-            return redirect(url_for('register'))
-        
-        if User.query.filter_by(email=email).first():
-            flash('මෙම ඊමේල් ලිපිනය දැනටමත් භාවිතා කර ඇත.', 'danger')
-            return redirect(url_for('register'))
-        
         user = User(
             username=username,
             email=email,
@@ -643,10 +1116,21 @@ def register():
             phone=phone,
             user_type=user_type
         )
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except PasswordHasherBusy:
+            flash('පද්ධතිය කාර්යබහුලයි. කරුණාකර මොහොතකින් නැවත උත්සාහ කරන්න.', 'warning')
+            return redirect(url_for('register'))
         
+        # The unique constraints decide; no separate lookups before the insert
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            flash(DUPLICATE_USER_MESSAGES.get(duplicate_user_field(e),
+                                              'ලියාපදිංචි වීමේ දෝෂයක්. කරුණාකර පසුව උත්සාහ කරන්න.'), 'danger')
+            return redirect(url_for('register'))
         
         flash('ඔබගේ ගිණුම සාර්ථකව නිර්මාණය කරන ලදී! දැන් ඔබට පිවිසිය හැකිය.', 'success')
         return redirect(url_for('login'))
@@ -704,9 +1188,60 @@ def register():
             </div>
         </div>
     </div>
+    <script>
+    // Live check: one request answers both fields
+    (function () {
+        const form = document.querySelector('form[method="POST"]');
+        const fields = ['username', 'email'].map(name => form.elements[name]);
+        let timer = null;
+        function check() {
+            const params = new URLSearchParams();
+            fields.forEach(field => { if (field.value.trim()) params.set(field.name, field.value.trim()); });
+            if (![...params.keys()].length) return;
+            fetch('/api/check_registration?' + params)
+                .then(response => response.json())
+                .then(data => fields.forEach(field => {
+                    if (data[field.name] === undefined) return;
+                    field.classList.toggle('is-invalid', !data[field.name]);
+                    field.setCustomValidity(data[field.name] ? '' : 'දැනටමත් භාවිතා කර ඇත');
+                }));
+        }
+        fields.forEach(field => field.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(check, 400);
+        }));
+    })();
+    </script>
     """
     return base_template("Register", content)
 
+@app.route('/api/check_registration')
+def check_registration():
+    """Are ?username= and/or ?email= still free? Both answered with one indexed lookup"""
+    username = request.args.get('username', '').strip()
+    email = request.args.get('email', '').strip()
+    
+    # throttled so it can't be used to enumerate accounts at speed
+    allowed, retry_after = cache.token_bucket(f"regcheck:{request.remote_addr}", rate=1, capacity=30)
+    if not allowed:
+        return jsonify({'success': False, 'retry_after': round(retry_after, 1)}), 429
+    
+    conditions = []
+    if username:
+        conditions.append(User.username == username)
+    if email:
+        conditions.append(User.email == email)
+    if not conditions:
+        return jsonify({'success': False, 'message': 'username or email required'}), 400
+    
+    taken = db.session.query(User.username, User.email).filter(db.or_(*conditions)).all()
+    result = {'success': True}
+    if username:
+        result['username'] = not any(row.username == username for row in taken)
+    if email:
+        result['email'] = not any(row.email == email for row in taken)
+    return jsonify(result)
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -736,9 +1271,8 @@ def admin_dashboard():
     pending_hotels = Hotel.query.filter_by(is_approved=False).count()
     total_bookings = Booking.query.count()
     
-    # Calculate total revenue
-    all_bookings = Booking.query.all()
-    total_revenue = sum([b.total_price for b in all_bookings]) if all_bookings else 0
+    # Calculate total revenue in the database rather than loading every booking
+    total_revenue = db.session.query(db.func.coalesce(db.func.sum(Booking.total_price), 0)).scalar()
     
     recent_bookings = Booking.query.order_by(Booking.booking_date.desc()).limit(5).all()
     
@@ -840,6 +1374,21 @@ def admin_dashboard():
                                 <i class="fas fa-eye"></i> හොටෙල් බලන්න
                             </a>
                         </div>
+                        <div class="col-md-6 mb-3">
+                            <a href="/admin/notifications" class="btn btn-outline-danger btn-lg w-100">
+                                <i class="fas fa-exclamation-triangle"></i> අසාර්ථක දන්වීම්
+                            </a>
+                        </div>
+                        <div class="col-md-6 mb-3">
+                            <a href="/admin/import" class="btn btn-outline-dark btn-lg w-100">
+                                <i class="fas fa-file-import"></i> දත්ත ඇතුලත් කිරීම
+                            </a>
+                        </div>
+                        <div class="col-md-6 mb-3">
+                            <a href="/admin/profiling" class="btn btn-outline-secondary btn-lg w-100">
+                                <i class="fas fa-stopwatch"></i> ඉල්ලීම් ප්‍රොෆයිල්
+                            </a>
+                        </div>
                     </div>
                 </div>
             </div>
@@ -866,6 +1415,8 @@ def admin_dashboard():
                             </tbody>
                         </table>
                     </div>
+                    <a href="/export/bookings.csv" class="btn btn-sm btn-outline-secondary"><i class="fas fa-file-csv"></i> CSV</a>
+                    <a href="/export/bookings.xlsx" class="btn btn-sm btn-outline-success"><i class="fas fa-file-excel"></i> Excel</a>
                 </div>
             </div>
         </div>
@@ -970,10 +1521,20 @@ def hotel_admin_dashboard():
                 <div class="card-body">
                     <div class="row">
                         <div class="col-md-6 mb-3">
-                            <a href="/hotel_admin/calendar" class="btn btn-outline-success btn-lg w-100">
+                            <a href="/hotel/{hotel.id}/calendar" class="btn btn-outline-success btn-lg w-100">
                                 <i class="fas fa-calendar-alt"></i> කැලන්ඩරය
                             </a>
                         </div>
+                        <div class="col-md-6 mb-3">
+                            <a href="/hotel/{hotel.id}/rates" class="btn btn-outline-secondary btn-lg w-100">
+                                <i class="fas fa-tags"></i> මිල නීති
+                            </a>
+                        </div>
+                        <div class="col-md-6 mb-3">
+                            <a href="/hotel/{hotel.id}/analytics" class="btn btn-outline-dark btn-lg w-100">
+                                <i class="fas fa-chart-line"></i> විශ්ලේෂණ
+                            </a>
+                        </div>
                         <div class="col-md-6 mb-3">
                             <a href="/hotel_admin/bookings" class="btn btn-outline-primary btn-lg w-100">
                                 <i class="fas fa-calendar-check"></i> බුකින්ග්
@@ -990,6 +1551,16 @@ def hotel_admin_dashboard():
                             </a>
                         </div>
                     </div>
+                    <form method="POST" action="/hotel/{hotel.id}/notification_settings" class="row g-2 align-items-end mt-2">
+                        <div class="col-md-8">
+                            <label class="form-label">WhatsApp සාරාංශය (මිනිත්තු, හිස් = එක් එක් බුකින්ග් සඳහා)</label>
+                            <input type="number" min="0" class="form-control" name="digest_minutes"
+                                   value="{hotel.notification_digest_minutes or ''}">
+                        </div>
+                        <div class="col-md-4">
+                            <button type="submit" class="btn btn-outline-success w-100">සුරකින්න</button>
+                        </div>
+                    </form>
                 </div>
             </div>
         </div>
@@ -1015,6 +1586,8 @@ def hotel_admin_dashboard():
                             </tbody>
                         </table>
                     </div>
+                    <a href="/export/bookings.csv?hotel_id={hotel.id}" class="btn btn-sm btn-outline-secondary"><i class="fas fa-file-csv"></i> CSV</a>
+                    <a href="/export/bookings.xlsx?hotel_id={hotel.id}" class="btn btn-sm btn-outline-success"><i class="fas fa-file-excel"></i> Excel</a>
                 </div>
             </div>
         </div>
@@ -1120,7 +1693,7 @@ def view_hotels():
         <div class="col-md-4 mb-4">
             <div class="card hotel-card h-100">
                 <img src="{hotel.image_path or 'https://via.placeholder.com/300x200?text=Hotel+Image'}" 
-                     class="card-img-top hotel-image" alt="{hotel.name}">
+                     class="card-img-top hotel-image" alt="{hotel.name}" loading="lazy" decoding="async">
                 <div class="card-body">
                     <div class="d-flex justify-content-between align-items-start">
                         <h5 class="card-title">{hotel.name}</h5>
@@ -1151,6 +1724,2773 @@ def view_hotels():
     """
     return base_template("Hotels", content)
 
+@app.route('/book_hotel/<int:hotel_id>', methods=['GET', 'POST'])
+@login_required
+def book_hotel(hotel_id):
+    """හොටෙල් බුක් කිරීම"""
+    if current_user.user_type != 'customer':
+        flash('මෙම ක්‍රියාවට ගනුදෙනුකරු අවසරය අවශ්‍යයි.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    hotel = Hotel.query.get_or_404(hotel_id)
+    rooms = Room.query.filter_by(hotel_id=hotel_id, is_available=True).all()
+    
+    if request.method == 'POST':
+        try:
+            check_in = datetime.strptime(request.form['check_in_date'], '%Y-%m-%d').date()
+            check_out = datetime.strptime(request.form['check_out_date'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            flash('කරුණාකර වලංගු දින ඇතුලත් කරන්න.', 'danger')
+            return redirect(url_for('book_hotel', hotel_id=hotel_id))
+        
+        is_valid, message = validate_booking_dates(check_in, check_out)
+        if not is_valid:
+            flash(message, 'danger')
+            return redirect(url_for('book_hotel', hotel_id=hotel_id))
+        
+        if not rooms:
+            # nothing to hold the booking against; /api/quotes does not quote these hotels either
+            flash('මෙම හොටෙලයේ තවම බුක් කළ හැකි කාමර නොමැත.', 'danger')
+            return redirect(url_for('book_hotel', hotel_id=hotel_id))
+        
+        guest_name = request.form['guest_name']
+        guest_phone = request.form['guest_phone']
+        guest_whatsapp = request.form.get('guest_whatsapp') or guest_phone
+        room_id = request.form.get('room_id', type=int)
+        
+        metrics.booking_attempts.labels('single').inc()
+        room = lock_free_room(hotel_id, check_in, check_out, room_id)
+        if room is None:
+            db.session.rollback()
+            metrics.booking_conflicts.labels('single').inc()
+            if room_id:
+                flash('තෝරාගත් කාමරය එම දිනවල ලබා ගත නොහැක. කරුණාකර වෙනත් කාමරයක් හෝ දින තෝරන්න.', 'danger')
+            else:
+                flash('එම දිනවල නිදහස් කාමර නොමැත - පොරොත්තු ලේඛනයට එක්විය හැක.', 'danger')
+            return redirect(url_for('book_hotel', hotel_id=hotel_id))
+        
+        quote = quote_stay(hotel.id, room.id, check_in, check_out)
+        
+        booking = Booking(
+            hotel_id=hotel.id,
+            room_id=room.id,
+            guest_name=guest_name,
+            guest_email=current_user.email,
+            guest_phone=guest_phone,
+            guest_whatsapp=guest_whatsapp,
+            check_in_date=check_in,
+            check_out_date=check_out,
+            total_price=quote['total'],
+            customer_id=current_user.id
+        )
+        db.session.add(booking)
+        adjust_daily_inventory(hotel.id, check_in, check_out, 1)
+        
+        if hotel.available_rooms > 0:
+            hotel.available_rooms -= 1
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            metrics.booking_conflicts.labels('single').inc()
+            flash('එම අවස්ථාවේම වෙනත් බුකින්ග් එකක් සිදු විය. කරුණාකර නැවත උත්සාහ කරන්න.', 'warning')
+            return redirect(url_for('book_hotel', hotel_id=hotel_id))
+        metrics.booking_successes.labels('single').inc()
+        
+        publish_inventory_change(hotel.id, [booking.room_id], taken=[(check_in, check_out)])
+        
+        # Queued for background delivery - failures are retried and dead-lettered, never lost
+        notify_hotel_owner(hotel, 'booking',
+                           f"#{booking.id} {guest_name}: {check_in} → {check_out}",
+                           message=whatsapp_service.booking_notification_message(hotel, booking))
+        whatsapp_service.send_booking_confirmation_to_customer(hotel, booking)
+        
+        flash(f'ඔබගේ බුකින්ග් සාර්ථකව සිදු කරන ලදී! බුකින්ග් ID: {booking.id}', 'success')
+        return redirect(url_for('my_bookings'))
+    
+    room_options = "".join(
+        f'<option value="{room.id}">{escape(room.room_number)} - {escape(room.room_type or "")} '
+        f'(රු. {room.price_per_night:,.2f})</option>'
+        for room in rooms
+    )
+    lowest_price = min((room.price_per_night for room in rooms), default=hotel.price_per_night)
+    today = datetime.now().date().isoformat()
+    
+    content = f"""
+    <div class="row justify-content-center">
+        <div class="col-md-8">
+            <div class="card">
+                <div class="card-header bg-success text-white">
+                    <h4 class="mb-0"><i class="fas fa-calendar-check"></i> {escape(hotel.name)} - බුකින්ග්</h4>
+                </div>
+                <div class="card-body">
+                    <form method="POST">
+                        <div class="row">
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">ඇතුල්වීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_in_date" min="{today}" required>
+                            </div>
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">පිටවීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_out_date" min="{today}" required>
+                            </div>
+                        </div>
+                        <div class="mb-3">
+                            <label class="form-label">කාමරය</label>
+                            <select class="form-control" name="room_id">
+                                <option value="">ඕනෑම කාමරයක් (රු. {lowest_price:,.2f} සිට)</option>
+                                {room_options}
+                            </select>
+                        </div>
+                        <div class="row">
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">අමුත්තන්ගේ නම</label>
+                                <input type="text" class="form-control" name="guest_name" value="{escape(current_user.full_name)}" required>
+                            </div>
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">දුරකථන අංකය</label>
+                                <input type="text" class="form-control" name="guest_phone" value="{escape(current_user.phone or '')}" required>
+                            </div>
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">WhatsApp අංකය</label>
+                                <input type="text" class="form-control" name="guest_whatsapp" placeholder="දුරකථන අංකයම නම් හිස්ව තබන්න">
+                            </div>
+                        </div>
+                        <button type="submit" class="btn btn-success w-100">බුකින්ග් තහවුරු කරන්න</button>
+                    </form>
+                    <a href="/book_hotel/{hotel.id}/group" class="btn btn-outline-success w-100 mt-2">
+                        <i class="fas fa-users"></i> කාමර කිහිපයක් එකවර බුක් කරන්න
+                    </a>
+                    <a href="/hotel/{hotel.id}/waitlist" class="btn btn-outline-warning w-100 mt-2">
+                        <i class="fas fa-hourglass-half"></i> කාමර නැතිද? පොරොත්තු ලේඛනයට එක්වන්න
+                    </a>
+                </div>
+            </div>
+        </div>
+    </div>
+    """
+    return base_template("Book Hotel", content)
+
+def adjust_daily_inventory(hotel_id, check_in, check_out, delta):
+    """Add delta booked rooms to every night of [check_in, check_out) in the caller's transaction.
+    
+    Existing nights are bumped by one UPDATE and missing ones created by one bulk insert,
+    so a booking touches each date exactly once however many rooms it holds. A concurrent
+    first booking of the same night surfaces as IntegrityError at commit.
+    """
+    nights = {check_in + timedelta(days=i) for i in range((check_out - check_in).days)}
+    existing = {row[0] for row in db.session.query(DailyInventory.date).filter(
+        DailyInventory.hotel_id == hotel_id, DailyInventory.date >= check_in, DailyInventory.date < check_out)}
+    if existing:
+        DailyInventory.query.filter(
+            DailyInventory.hotel_id == hotel_id, DailyInventory.date >= check_in, DailyInventory.date < check_out
+        ).update({'booked_rooms': DailyInventory.booked_rooms + delta, 'updated_at': datetime.utcnow()},
+                 synchronize_session=False)
+    missing = sorted(nights - existing)
+    if missing and delta > 0:
+        db.session.execute(db.insert(DailyInventory), [
+            {'hotel_id': hotel_id, 'date': night, 'booked_rooms': delta, 'updated_at': datetime.utcnow()}
+            for night in missing])
+
+def stay_difference(old_check_in, old_check_out, new_check_in, new_check_out):
+    """(released, taken) night ranges [start, end) when a stay moves from old to new dates"""
+    released, taken = [], []
+    for start, end, into in ((old_check_in, min(old_check_out, new_check_in), released),
+                             (max(old_check_in, new_check_out), old_check_out, released),
+                             (new_check_in, min(new_check_out, old_check_in), taken),
+                             (max(new_check_in, old_check_out), new_check_out, taken)):
+        if start < end:
+            into.append((start, end))
+    return released, taken
+
+def publish_inventory_change(hotel_id, room_ids, released=(), taken=()):
+    """Tell subscribers which rooms and nights changed; call only after the commit"""
+    events.publish('inventory.changed', hotel_id=hotel_id, room_ids=[r for r in room_ids if r is not None],
+                   released=[(start.isoformat(), end.isoformat()) for start, end in released],
+                   taken=[(start.isoformat(), end.isoformat()) for start, end in taken])
+
+class BookingChangeError(Exception):
+    pass
+
+def can_change_booking(booking, hotel):
+    """The customer who made the booking, or whoever manages the hotel"""
+    return (current_user.user_type == 'customer' and booking.customer_id == current_user.id) or \
+        can_manage_hotel(hotel)
+
+def cancel_booking(booking, hotel):
+    """Release the stay's nights; the caller commits and then publishes"""
+    if booking.status != 'confirmed':
+        raise BookingChangeError('මෙම බුකින්ග් දැනටමත් අවලංගුයි.')
+    if booking.check_out_date <= datetime.now().date():
+        raise BookingChangeError('අවසන් වූ බුකින්ග් අවලංගු කළ නොහැක.')
+    
+    # unused nights only: a stay already in progress keeps the nights that were slept
+    start = max(booking.check_in_date, datetime.now().date())
+    booking.status = 'cancelled'
+    adjust_daily_inventory(hotel.id, start, booking.check_out_date, -1)
+    hotel.available_rooms = min(hotel.available_rooms + 1, hotel.total_rooms)
+    return [(start, booking.check_out_date)], []
+
+def modify_booking(booking, hotel, check_in, check_out, room_id):
+    """Shorten, extend, move or change room in place -> (released, taken) night ranges.
+    
+    Only nights that differ between the old and new stay are checked and re-counted;
+    the caller commits and then publishes.
+    """
+    if booking.status != 'confirmed':
+        raise BookingChangeError('අවලංගු කළ බුකින්ග් වෙනස් කළ නොහැක.')
+    today = datetime.now().date()
+    if check_in != booking.check_in_date:
+        is_valid, message = validate_booking_dates(check_in, check_out)
+        if not is_valid or booking.check_in_date <= today:
+            raise BookingChangeError(message if not is_valid else 'ආරම්භ වූ නවාතැනක check-in දිනය වෙනස් කළ නොහැක.')
+    elif check_out <= max(check_in, today):
+        raise BookingChangeError('Check-out දිනය අද දිනට පසුව විය යුතුය')
+    
+    old_check_in, old_check_out = booking.check_in_date, booking.check_out_date
+    if not room_id:
+        # "any room": keep the current room; a booking without one gets the cheapest free room
+        room_id = booking.room_id
+        if not room_id:
+            room = lock_free_room(hotel.id, check_in, check_out)
+            if room is None:
+                raise BookingChangeError('එම දිනවල නිදහස් කාමර නොමැත.')
+            room_id = room.id
+    # locked, so a concurrent booking cannot take the nights checked below
+    room = Room.query.filter_by(id=room_id, hotel_id=hotel.id).with_for_update().first()
+    if room_id != booking.room_id:
+        # the whole stay moves, so the new room has to be free for all of it
+        if room is None or not room.is_available:
+            raise BookingChangeError('කාමරය සොයාගත නොහැක.')
+        released, taken = [(old_check_in, old_check_out)], [(check_in, check_out)]
+    else:
+        released, taken = stay_difference(old_check_in, old_check_out, check_in, check_out)
+    for start, end in taken:
+        if room_id in unavailable_room_ids(hotel.id, start, end):
+            raise BookingChangeError(f'{start} - {end} අතර කාමරය වෙන් කර ඇත.')
+    
+    # inventory counts rooms per hotel night, so only the nights that differ are re-counted
+    nights_released, nights_taken = stay_difference(old_check_in, old_check_out, check_in, check_out)
+    for start, end in nights_released:
+        adjust_daily_inventory(hotel.id, start, end, -1)
+    for start, end in nights_taken:
+        adjust_daily_inventory(hotel.id, start, end, 1)
+    
+    booking.check_in_date, booking.check_out_date, booking.room_id = check_in, check_out, room_id
+    booking.total_price = quote_stay(hotel.id, room_id, check_in, check_out)['total']
+    return released, taken
+
+@app.route('/booking/<int:booking_id>/cancel', methods=['POST'])
+@login_required
+def cancel_booking_route(booking_id):
+    """බුකින්ග් අවලංගු කිරීම"""
+    booking = Booking.query.get_or_404(booking_id)
+    hotel = Hotel.query.get_or_404(booking.hotel_id)
+    if not can_change_booking(booking, hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    try:
+        released, taken = cancel_booking(booking, hotel)
+        db.session.commit()
+    except BookingChangeError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('my_bookings') if current_user.user_type == 'customer' else url_for('dashboard'))
+    
+    publish_inventory_change(hotel.id, [booking.room_id], released=released)
+    notify_hotel_owner(hotel, 'cancellation', f"#{booking.id} {booking.guest_name}: {booking.check_in_date} → {booking.check_out_date}")
+    whatsapp_service.send_booking_change_to_customer(hotel, booking)
+    
+    flash(f'බුකින්ග් #{booking.id} අවලංගු කරන ලදී.', 'success')
+    return redirect(url_for('my_bookings') if current_user.user_type == 'customer' else url_for('dashboard'))
+
+@app.route('/booking/<int:booking_id>/modify', methods=['GET', 'POST'])
+@login_required
+def modify_booking_route(booking_id):
+    """බුකින්ග් වෙනස් කිරීම - දින කෙටි කිරීම, දීර්ඝ කිරීම හෝ කාමරය මාරු කිරීම"""
+    booking = Booking.query.get_or_404(booking_id)
+    hotel = Hotel.query.get_or_404(booking.hotel_id)
+    if not can_change_booking(booking, hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if request.method == 'POST':
+        try:
+            check_in = datetime.strptime(request.form['check_in_date'], '%Y-%m-%d').date()
+            check_out = datetime.strptime(request.form['check_out_date'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            flash('කරුණාකර වලංගු දින ඇතුලත් කරන්න.', 'danger')
+            return redirect(url_for('modify_booking_route', booking_id=booking_id))
+        room_id = request.form.get('room_id', type=int) or 0
+        old_room_id = booking.room_id
+        
+        try:
+            released, taken = modify_booking(booking, hotel, check_in, check_out, room_id)
+            db.session.commit()
+        except BookingChangeError as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return redirect(url_for('modify_booking_route', booking_id=booking_id))
+        
+        if released or taken:
+            publish_inventory_change(hotel.id, {old_room_id, booking.room_id}, released=released, taken=taken)
+            notify_hotel_owner(hotel, 'modification', f"#{booking.id} {booking.guest_name}: {check_in} → {check_out}")
+            whatsapp_service.send_booking_change_to_customer(hotel, booking)
+        
+        flash(f'බුකින්ග් #{booking.id} යාවත්කාලීන කරන ලදී. නව මුදල: රු. {booking.total_price:,.2f}', 'success')
+        return redirect(url_for('my_bookings') if current_user.user_type == 'customer' else url_for('dashboard'))
+    
+    rooms = Room.query.filter_by(hotel_id=hotel.id, is_available=True).order_by(Room.room_number).all()
+    room_options = "".join(
+        f'<option value="{room.id}" {"selected" if room.id == booking.room_id else ""}>'
+        f'{escape(room.room_number)} - {escape(room.room_type or "")} (රු. {room.price_per_night:,.2f})</option>'
+        for room in rooms
+    )
+    
+    content = f"""
+    <div class="row justify-content-center">
+        <div class="col-md-6">
+            <div class="card">
+                <div class="card-header bg-primary text-white">
+                    <h4 class="mb-0"><i class="fas fa-edit"></i> බුකින්ග් #{booking.id} - {escape(hotel.name)}</h4>
+                </div>
+                <div class="card-body">
+                    <form method="POST">
+                        <div class="row">
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">ඇතුල්වීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_in_date" value="{booking.check_in_date}" required>
+                            </div>
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">පිටවීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_out_date" value="{booking.check_out_date}" required>
+                            </div>
+                        </div>
+                        <div class="mb-3">
+                            <label class="form-label">කාමරය</label>
+                            <select class="form-control" name="room_id">
+                                <option value="" {"selected" if not booking.room_id else ""}>ඕනෑම කාමරයක්</option>
+                                {room_options}
+                            </select>
+                        </div>
+                        <button type="submit" class="btn btn-primary w-100">වෙනස්කම් සුරකින්න</button>
+                    </form>
+                    <form method="POST" action="/booking/{booking.id}/cancel" class="mt-2"
+                          onsubmit="return confirm('බුකින්ග් අවලංගු කරන්නද?');">
+                        <button type="submit" class="btn btn-outline-danger w-100">බුකින්ග් අවලංගු කරන්න</button>
+                    </form>
+                </div>
+            </div>
+        </div>
+    </div>
+    """
+    return base_template("Modify Booking", content)
+
+GROUP_BOOKING_MAX_ROOMS = 50
+
+@app.route('/book_hotel/<int:hotel_id>/group', methods=['GET', 'POST'])
+@login_required
+def book_hotel_group(hotel_id):
+    """කණ්ඩායම් බුකින්ග් - කාමර කිහිපයක් එකවර"""
+    if current_user.user_type != 'customer':
+        flash('මෙම ක්‍රියාවට ගනුදෙනුකරු අවසරය අවශ්‍යයි.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if request.method == 'POST':
+        try:
+            check_in = datetime.strptime(request.form['check_in_date'], '%Y-%m-%d').date()
+            check_out = datetime.strptime(request.form['check_out_date'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            flash('කරුණාකර වලංගු දින ඇතුලත් කරන්න.', 'danger')
+            return redirect(url_for('book_hotel_group', hotel_id=hotel_id))
+        
+        is_valid, message = validate_booking_dates(check_in, check_out)
+        if not is_valid:
+            flash(message, 'danger')
+            return redirect(url_for('book_hotel_group', hotel_id=hotel_id))
+        
+        wanted = {}
+        for key, value in request.form.items():
+            if key.startswith('qty:') and value.strip().isdigit() and int(value) > 0:
+                wanted[key[4:]] = int(value)
+        if not wanted or sum(wanted.values()) > GROUP_BOOKING_MAX_ROOMS:
+            flash(f'කාමර 1 සිට {GROUP_BOOKING_MAX_ROOMS} දක්වා තෝරන්න.', 'danger')
+            return redirect(url_for('book_hotel_group', hotel_id=hotel_id))
+        
+        metrics.booking_attempts.labels('group').inc()
+        # Lock the hotel's rooms so two groups cannot be handed the same free room
+        rooms = Room.query.filter_by(hotel_id=hotel_id, is_available=True).order_by(
+            Room.price_per_night, Room.id).with_for_update().all()
+        taken = unavailable_room_ids(hotel_id, check_in, check_out)
+        chosen, short = [], []
+        for room_type, count in wanted.items():
+            free = [room for room in rooms if (room.room_type or '') == room_type and room.id not in taken]
+            if len(free) < count:
+                short.append(f"{room_type or '-'} ({len(free)} ඉතිරි)")
+            chosen += free[:count]
+        if short:
+            db.session.rollback()
+            metrics.booking_conflicts.labels('group').inc()
+            flash('ප්‍රමාණවත් කාමර නොමැත: ' + ', '.join(short) + ' - පොරොත්තු ලේඛනයට එක්විය හැක.', 'danger')
+            return redirect(url_for('book_hotel_group', hotel_id=hotel_id))
+        
+        calendar = hotel_rate_calendar(hotel.id, check_in, check_out)
+        _, _, totals = calendar.stay_totals([room.id for room in chosen], [check_in] * len(chosen),
+                                            [check_out] * len(chosen))
+        
+        group_id = uuid.uuid4().hex
+        guest_phone = request.form['guest_phone']
+        db.session.execute(db.insert(Booking), [{
+            'hotel_id': hotel.id,
+            'room_id': room.id,
+            'guest_name': request.form['guest_name'],
+            'guest_email': current_user.email,
+            'guest_phone': guest_phone,
+            'guest_whatsapp': request.form.get('guest_whatsapp') or guest_phone,
+            'check_in_date': check_in,
+            'check_out_date': check_out,
+            'total_price': float(total),
+            'customer_id': current_user.id,
+            'group_id': group_id
+        } for room, total in zip(chosen, totals)])
+        adjust_daily_inventory(hotel.id, check_in, check_out, len(chosen))
+        hotel.available_rooms = max(hotel.available_rooms - len(chosen), 0)
+        
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            metrics.booking_conflicts.labels('group').inc()
+            flash('එම අවස්ථාවේම වෙනත් බුකින්ග් එකක් සිදු විය. කරුණාකර නැවත උත්සාහ කරන්න.', 'warning')
+            return redirect(url_for('book_hotel_group', hotel_id=hotel_id))
+        metrics.booking_successes.labels('group').inc()
+        
+        bookings = Booking.query.filter_by(group_id=group_id).order_by(Booking.id).all()
+        publish_inventory_change(hotel.id, [room.id for room in chosen], taken=[(check_in, check_out)])
+        notify_hotel_owner(hotel, 'booking',
+                           f"{len(bookings)} කාමර - {bookings[0].guest_name}: {check_in} → {check_out}",
+                           message=whatsapp_service.group_booking_notification_message(
+                               hotel, bookings, {room.id: room for room in chosen}))
+        whatsapp_service.send_group_confirmation_to_customer(hotel, bookings)
+        
+        flash(f'කාමර {len(bookings)}ක කණ්ඩායම් බුකින්ග් සාර්ථකයි! '
+              f'මුළු මුදල: රු. {sum(b.total_price for b in bookings):,.2f}', 'success')
+        return redirect(url_for('my_bookings'))
+    
+    room_types = db.session.query(Room.room_type, db.func.count(Room.id), db.func.min(Room.price_per_night)).filter(
+        Room.hotel_id == hotel_id, Room.is_available == True).group_by(Room.room_type).order_by(Room.room_type).all()
+    today = datetime.now().date().isoformat()
+    
+    type_rows = "".join(f"""
+                        <tr>
+                            <td>{escape(room_type or '-')}</td>
+                            <td>{count}</td>
+                            <td>රු. {min_price:,.2f}</td>
+                            <td><input type="number" class="form-control form-control-sm" name="qty:{escape(room_type or '')}"
+                                       min="0" max="{count}" value="0"></td>
+                        </tr>""" for room_type, count, min_price in room_types)
+    
+    content = f"""
+    <div class="row justify-content-center">
+        <div class="col-md-8">
+            <div class="card">
+                <div class="card-header bg-success text-white">
+                    <h4 class="mb-0"><i class="fas fa-users"></i> {escape(hotel.name)} - කණ්ඩායම් බුකින්ග්</h4>
+                </div>
+                <div class="card-body">
+                    <form method="POST">
+                        <div class="row">
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">ඇතුල්වීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_in_date" min="{today}" required>
+                            </div>
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">පිටවීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_out_date" min="{today}" required>
+                            </div>
+                        </div>
+                        <table class="table table-sm">
+                            <thead>
+                                <tr><th>කාමර වර්ගය</th><th>කාමර</th><th>මිල සිට</th><th>අවශ්‍ය ගණන</th></tr>
+                            </thead>
+                            <tbody>
+                                {type_rows or '<tr><td colspan="4" class="text-center">No rooms</td></tr>'}
+                            </tbody>
+                        </table>
+                        <div class="row">
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">සංවිධායකගේ නම</label>
+                                <input type="text" class="form-control" name="guest_name" value="{escape(current_user.full_name)}" required>
+                            </div>
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">දුරකථන අංකය</label>
+                                <input type="text" class="form-control" name="guest_phone" value="{escape(current_user.phone or '')}" required>
+                            </div>
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">WhatsApp අංකය</label>
+                                <input type="text" class="form-control" name="guest_whatsapp" placeholder="දුරකථන අංකයම නම් හිස්ව තබන්න">
+                            </div>
+                        </div>
+                        <button type="submit" class="btn btn-success w-100">කණ්ඩායම් බුකින්ග් තහවුරු කරන්න</button>
+                    </form>
+                </div>
+            </div>
+        </div>
+    </div>
+    """
+    return base_template("Group Booking", content)
+
+WAITLIST_HOLD_MINUTES = int(os.environ.get('WAITLIST_HOLD_MINUTES', 120))
+
+def waitlist_candidates(hotel_id, start, end):
+    """Waiting entries wanting any night of [start, end), best first.
+    
+    Reads only the date index rows for those nights, so the cost follows the freed
+    range and the demand on it rather than the size of the whole waitlist.
+    """
+    entry_ids = db.select(WaitlistNight.entry_id).where(
+        WaitlistNight.hotel_id == hotel_id, WaitlistNight.date >= start, WaitlistNight.date < end).distinct()
+    return WaitlistEntry.query.filter(
+        WaitlistEntry.id.in_(entry_ids), WaitlistEntry.status == 'waiting',
+        WaitlistEntry.check_in_date >= datetime.now().date()
+    ).order_by(WaitlistEntry.priority.desc(), WaitlistEntry.created_at, WaitlistEntry.id).all()
+
+def index_waitlist_nights(entry):
+    """Date index rows for a waiting entry; the caller commits"""
+    db.session.execute(db.insert(WaitlistNight), [
+        {'entry_id': entry.id, 'hotel_id': entry.hotel_id, 'date': entry.check_in_date + timedelta(days=i)}
+        for i in range((entry.check_out_date - entry.check_in_date).days)])
+
+def hold_room_for(entry, rooms):
+    """Hold the cheapest free room that suits the entry; the caller commits"""
+    unavailable = unavailable_room_ids(entry.hotel_id, entry.check_in_date, entry.check_out_date)
+    for room in rooms:
+        if room.id in unavailable or room.capacity < entry.guests or \
+                (entry.room_type and room.room_type != entry.room_type):
+            continue
+        entry.status = 'held'
+        entry.held_room_id = room.id
+        entry.hold_expires_at = datetime.utcnow() + timedelta(minutes=WAITLIST_HOLD_MINUTES)
+        WaitlistNight.query.filter_by(entry_id=entry.id).delete(synchronize_session=False)
+        db.session.flush()  # later candidates see this hold through unavailable_room_ids
+        return room
+    return None
+
+def match_waitlist(hotel_id, ranges):
+    """Offer freed nights to waiting entries in priority order -> [(entry, room)] holds made"""
+    candidates = {}
+    for start, end in ranges:
+        for entry in waitlist_candidates(hotel_id, start, end):
+            candidates.setdefault(entry.id, entry)
+    if not candidates:
+        return []
+    
+    rooms = Room.query.filter_by(hotel_id=hotel_id, is_available=True).order_by(Room.price_per_night, Room.id).all()
+    held = []
+    for entry in sorted(candidates.values(), key=lambda e: (-(e.priority or 0), e.created_at, e.id)):
+        room = hold_room_for(entry, rooms)
+        if room is not None:
+            held.append((entry, room))
+    if not held:
+        return []
+    db.session.commit()
+    
+    hotel = Hotel.query.get(hotel_id)
+    for entry, room in held:
+        whatsapp_service.send_waitlist_offer(hotel, entry, room)
+    publish_inventory_change(hotel_id, [room.id for _, room in held],
+                             taken=[(entry.check_in_date, entry.check_out_date) for entry, _ in held])
+    return held
+
+@events.subscribe('inventory.changed')
+def offer_freed_inventory(topic, payload):
+    """Cancellations, shortened stays, unblocked days and lapsed holds go to the waitlist first"""
+    if payload.get('released'):
+        ranges = [(datetime.strptime(start, '%Y-%m-%d').date(), datetime.strptime(end, '%Y-%m-%d').date())
+                  for start, end in payload['released']]
+        match_waitlist(payload['hotel_id'], ranges)
+
+def expire_waitlist(now=None):
+    """Lapse unanswered holds and stale requests; freed holds are offered to the next entry"""
+    now = now or datetime.utcnow()
+    lapsed = WaitlistEntry.query.filter(WaitlistEntry.status == 'held', WaitlistEntry.hold_expires_at <= now).all()
+    stale_ids = [row[0] for row in db.session.query(WaitlistEntry.id).filter(
+        WaitlistEntry.status == 'waiting', WaitlistEntry.check_in_date < now.date())]
+    for entry in lapsed:
+        entry.status = 'expired'
+    if stale_ids:
+        WaitlistEntry.query.filter(WaitlistEntry.id.in_(stale_ids)).update({'status': 'expired'},
+                                                                          synchronize_session=False)
+        WaitlistNight.query.filter(WaitlistNight.entry_id.in_(stale_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    
+    for entry in lapsed:
+        publish_inventory_change(entry.hotel_id, [entry.held_room_id],
+                                 released=[(entry.check_in_date, entry.check_out_date)])
+    return len(lapsed) + len(stale_ids)
+
+def run_waitlist_scheduler(interval_seconds):
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            with app.app_context():
+                expire_waitlist()
+        except Exception as e:
+            print(f"Waitlist scheduler error: {e}")
+
+_waitlist_scheduler_pid = None
+
+@app.before_request
+def start_waitlist_scheduler():
+    """Expire waitlist holds inside each worker when WAITLIST_SWEEP_INTERVAL is set"""
+    global _waitlist_scheduler_pid
+    interval = int(os.environ.get('WAITLIST_SWEEP_INTERVAL', 0))
+    if interval and _waitlist_scheduler_pid != os.getpid():
+        _waitlist_scheduler_pid = os.getpid()
+        threading.Thread(target=run_waitlist_scheduler, args=(interval,), name='waitlist-sweep', daemon=True).start()
+
+@app.cli.command('expire-waitlist')
+def expire_waitlist_command():
+    """Lapse unanswered waitlist holds and past requests (run from cron)"""
+    print(f"⏳ {expire_waitlist()} waitlist entr(ies) expired")
+
+@app.route('/hotel/<int:hotel_id>/waitlist', methods=['GET', 'POST'])
+@login_required
+def join_waitlist(hotel_id):
+    """පොරොත්තු ලේඛනයට එක්වීම"""
+    if current_user.user_type != 'customer':
+        flash('මෙම ක්‍රියාවට ගනුදෙනුකරු අවසරය අවශ්‍යයි.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if request.method == 'POST':
+        try:
+            check_in = datetime.strptime(request.form['check_in_date'], '%Y-%m-%d').date()
+            check_out = datetime.strptime(request.form['check_out_date'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            flash('කරුණාකර වලංගු දින ඇතුලත් කරන්න.', 'danger')
+            return redirect(url_for('join_waitlist', hotel_id=hotel_id))
+        
+        is_valid, message = validate_booking_dates(check_in, check_out)
+        if not is_valid:
+            flash(message, 'danger')
+            return redirect(url_for('join_waitlist', hotel_id=hotel_id))
+        
+        guest_phone = request.form['guest_phone']
+        entry = WaitlistEntry(
+            hotel_id=hotel.id,
+            room_type=request.form.get('room_type') or None,
+            check_in_date=check_in,
+            check_out_date=check_out,
+            guests=max(request.form.get('guests', 1, type=int) or 1, 1),
+            customer_id=current_user.id,
+            guest_name=request.form['guest_name'],
+            guest_phone=guest_phone,
+            guest_whatsapp=request.form.get('guest_whatsapp') or guest_phone
+        )
+        db.session.add(entry)
+        db.session.flush()
+        index_waitlist_nights(entry)
+        db.session.commit()
+        
+        # a room may already be free, e.g. the customer only saw the hotel-level count
+        if match_waitlist(hotel.id, [(check_in, check_out)]):
+            flash('කාමරයක් ඔබ වෙනුවෙන් රඳවා ඇත! තහවුරු කිරීමට මගේ බුකින්ග් වෙත යන්න.', 'success')
+        else:
+            flash('ඔබ පොරොත්තු ලේඛනයට එක් කරන ලදී. කාමරයක් නිදහස් වූ විට WhatsApp මගින් දැනුම් දෙනු ඇත.', 'success')
+        return redirect(url_for('my_bookings'))
+    
+    room_types = [row[0] for row in db.session.query(Room.room_type).filter(
+        Room.hotel_id == hotel_id, Room.room_type.isnot(None)).distinct().order_by(Room.room_type)]
+    type_options = "".join(f'<option value="{escape(room_type)}">{escape(room_type)}</option>' for room_type in room_types)
+    today = datetime.now().date().isoformat()
+    
+    content = f"""
+    <div class="row justify-content-center">
+        <div class="col-md-8">
+            <div class="card">
+                <div class="card-header bg-warning">
+                    <h4 class="mb-0"><i class="fas fa-hourglass-half"></i> {escape(hotel.name)} - පොරොත්තු ලේඛනය</h4>
+                </div>
+                <div class="card-body">
+                    <p class="text-muted">කාමරයක් නිදහස් වූ විට එය ඔබ වෙනුවෙන් පැය {WAITLIST_HOLD_MINUTES // 60}ක් රඳවා තබා WhatsApp මගින් දැනුම් දෙනු ඇත.</p>
+                    <form method="POST">
+                        <div class="row">
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">ඇතුල්වීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_in_date" min="{today}" required>
+                            </div>
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">පිටවීමේ දිනය</label>
+                                <input type="date" class="form-control" name="check_out_date" min="{today}" required>
+                            </div>
+                        </div>
+                        <div class="row">
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">කාමර වර්ගය</label>
+                                <select class="form-control" name="room_type">
+                                    <option value="">ඕනෑම කාමරයක්</option>
+                                    {type_options}
+                                </select>
+                            </div>
+                            <div class="col-md-6 mb-3">
+                                <label class="form-label">අමුත්තන් ගණන</label>
+                                <input type="number" class="form-control" name="guests" min="1" value="2" required>
+                            </div>
+                        </div>
+                        <div class="row">
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">අමුත්තන්ගේ නම</label>
+                                <input type="text" class="form-control" name="guest_name" value="{escape(current_user.full_name)}" required>
+                            </div>
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">දුරකථන අංකය</label>
+                                <input type="text" class="form-control" name="guest_phone" value="{escape(current_user.phone or '')}" required>
+                            </div>
+                            <div class="col-md-4 mb-3">
+                                <label class="form-label">WhatsApp අංකය</label>
+                                <input type="text" class="form-control" name="guest_whatsapp" placeholder="දුරකථන අංකයම නම් හිස්ව තබන්න">
+                            </div>
+                        </div>
+                        <button type="submit" class="btn btn-warning w-100">පොරොත්තු ලේඛනයට එක්වන්න</button>
+                    </form>
+                </div>
+            </div>
+        </div>
+    </div>
+    """
+    return base_template("Waitlist", content)
+
+@app.route('/waitlist/<int:entry_id>/confirm', methods=['POST'])
+@login_required
+def confirm_waitlist_hold(entry_id):
+    """රඳවා ඇති කාමරය බුකින්ග් එකක් බවට පත් කිරීම"""
+    entry = WaitlistEntry.query.get_or_404(entry_id)
+    if entry.customer_id != current_user.id:
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    if entry.status != 'held' or entry.hold_expires_at <= datetime.utcnow():
+        flash('මෙම රඳවා තැබීම කල් ඉකුත් වී ඇත.', 'warning')
+        return redirect(url_for('my_bookings'))
+    
+    hotel = Hotel.query.get_or_404(entry.hotel_id)
+    metrics.booking_attempts.labels('waitlist').inc()
+    # the hold keeps other customers out, but a booking or block written around it must still win
+    room = Room.query.filter_by(id=entry.held_room_id, hotel_id=hotel.id).with_for_update().first()
+    if room is None or room.id in unavailable_room_ids(hotel.id, entry.check_in_date, entry.check_out_date,
+                                                       except_hold=entry.id):
+        # back in the queue for the next freed room
+        entry.status = 'waiting'
+        entry.held_room_id = entry.hold_expires_at = None
+        index_waitlist_nights(entry)
+        db.session.commit()
+        metrics.booking_conflicts.labels('waitlist').inc()
+        flash('රඳවා තැබූ කාමරය තවදුරටත් ලබා ගත නොහැක. ඔබගේ ඉල්ලීම පොරොත්තු ලේඛනයේ පවතී.', 'warning')
+        return redirect(url_for('my_bookings'))
+    booking = Booking(
+        hotel_id=hotel.id,
+        room_id=entry.held_room_id,
+        guest_name=entry.guest_name,
+        guest_email=current_user.email,
+        guest_phone=entry.guest_phone,
+        guest_whatsapp=entry.guest_whatsapp,
+        check_in_date=entry.check_in_date,
+        check_out_date=entry.check_out_date,
+        total_price=quote_stay(hotel.id, entry.held_room_id, entry.check_in_date, entry.check_out_date)['total'],
+        customer_id=current_user.id
+    )
+    db.session.add(booking)
+    db.session.flush()
+    entry.status = 'booked'
+    entry.booking_id = booking.id
+    adjust_daily_inventory(hotel.id, entry.check_in_date, entry.check_out_date, 1)
+    if hotel.available_rooms > 0:
+        hotel.available_rooms -= 1
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        metrics.booking_conflicts.labels('waitlist').inc()
+        flash('එම අවස්ථාවේම වෙනත් බුකින්ග් එකක් සිදු විය. කරුණාකර නැවත උත්සාහ කරන්න.', 'warning')
+        return redirect(url_for('my_bookings'))
+    metrics.booking_successes.labels('waitlist').inc()
+    
+    # the hold already counted as taken, so availability caches are already correct
+    notify_hotel_owner(hotel, 'booking',
+                       f"#{booking.id} {booking.guest_name}: {booking.check_in_date} → {booking.check_out_date}",
+                       message=whatsapp_service.booking_notification_message(hotel, booking))
+    whatsapp_service.send_booking_confirmation_to_customer(hotel, booking)
+    
+    flash(f'ඔබගේ බුකින්ග් සාර්ථකව සිදු කරන ලදී! බුකින්ග් ID: {booking.id}', 'success')
+    return redirect(url_for('my_bookings'))
+
+@app.route('/waitlist/<int:entry_id>/cancel', methods=['POST'])
+@login_required
+def cancel_waitlist_entry(entry_id):
+    """පොරොත්තු ලේඛනයෙන් ඉවත්වීම"""
+    entry = WaitlistEntry.query.get_or_404(entry_id)
+    if entry.customer_id != current_user.id:
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    if entry.status not in ('waiting', 'held'):
+        return redirect(url_for('my_bookings'))
+    
+    was_held = entry.status == 'held' and entry.hold_expires_at > datetime.utcnow()
+    entry.status = 'cancelled'
+    WaitlistNight.query.filter_by(entry_id=entry.id).delete(synchronize_session=False)
+    db.session.commit()
+    
+    if was_held:
+        publish_inventory_change(entry.hotel_id, [entry.held_room_id],
+                                 released=[(entry.check_in_date, entry.check_out_date)])
+    flash('පොරොත්තු ඉල්ලීම ඉවත් කරන ලදී.', 'info')
+    return redirect(url_for('my_bookings'))
+
+@app.route('/my_bookings')
+@login_required
+def my_bookings():
+    """ගනුදෙනුකරුගේ බුකින්ග්"""
+    if current_user.user_type != 'customer':
+        flash('මෙම ක්‍රියාවට ගනුදෙනුකරු අවසරය අවශ්‍යයි.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    bookings = Booking.query.filter_by(customer_id=current_user.id).order_by(Booking.booking_date.desc()).all()
+    
+    # One IN query per table instead of one lookup per booking
+    hotels = {h.id: h for h in Hotel.query.filter(Hotel.id.in_({b.hotel_id for b in bookings})).all()} if bookings else {}
+    rooms = {r.id: r for r in Room.query.filter(Room.id.in_({b.room_id for b in bookings})).all()} if bookings else {}
+    today = datetime.now().date()
+    
+    waitlist = WaitlistEntry.query.filter(WaitlistEntry.customer_id == current_user.id,
+                                          WaitlistEntry.status.in_(['waiting', 'held'])).order_by(
+        WaitlistEntry.check_in_date).all()
+    waitlist_hotels = {h.id: h for h in Hotel.query.filter(Hotel.id.in_({e.hotel_id for e in waitlist})).all()} \
+        if waitlist else {}
+    waitlist_rows = ""
+    for entry in waitlist:
+        hotel = waitlist_hotels.get(entry.hotel_id)
+        is_held = entry.status == 'held' and entry.hold_expires_at > datetime.utcnow()
+        confirm_form = f"""
+                <form method="POST" action="/waitlist/{entry.id}/confirm" class="d-inline">
+                    <button type="submit" class="btn btn-sm btn-success">තහවුරු කරන්න</button>
+                </form>""" if is_held else ''
+        waitlist_rows += f"""
+        <tr>
+            <td>{escape(hotel.name) if hotel else 'N/A'}</td>
+            <td>{escape(entry.room_type or '-')}</td>
+            <td>{entry.check_in_date}</td>
+            <td>{entry.check_out_date}</td>
+            <td><span class="badge {'bg-success' if is_held else 'bg-secondary'}">{'held' if is_held else entry.status}</span>
+                {f'<br><small>{entry.hold_expires_at:%Y-%m-%d %H:%M} UTC දක්වා</small>' if is_held else ''}</td>
+            <td>{confirm_form}
+                <form method="POST" action="/waitlist/{entry.id}/cancel" class="d-inline">
+                    <button type="submit" class="btn btn-sm btn-outline-danger">ඉවත් වන්න</button>
+                </form>
+            </td>
+        </tr>
+        """
+    waitlist_html = f"""
+    <h3 class="mt-4"><i class="fas fa-hourglass-half"></i> පොරොත්තු ලේඛනය</h3>
+    <div class="table-responsive">
+        <table class="table table-sm">
+            <thead>
+                <tr><th>හොටෙල්</th><th>කාමර වර්ගය</th><th>Check-in</th><th>Check-out</th><th>තත්වය</th><th></th></tr>
+            </thead>
+            <tbody>{waitlist_rows}</tbody>
+        </table>
+    </div>
+    """ if waitlist else ""
+    
+    bookings_html = ""
+    for booking in bookings:
+        hotel = hotels.get(booking.hotel_id)
+        room = rooms.get(booking.room_id)
+        status_badge = "bg-success" if booking.status == 'confirmed' else "bg-warning"
+        bookings_html += f"""
+        <tr>
+            <td>#{booking.id}</td>
+            <td>{escape(hotel.name) if hotel else 'N/A'}</td>
+            <td>{escape(room.room_number) if room else 'N/A'}</td>
+            <td>{booking.check_in_date}</td>
+            <td>{booking.check_out_date}</td>
+            <td>රු. {booking.total_price:,.2f}</td>
+            <td><span class="badge {status_badge}">{booking.status}</span></td>
+            <td>{f'<a href="/booking/{booking.id}/modify" class="btn btn-sm btn-outline-primary">වෙනස් කරන්න</a>' if booking.status == 'confirmed' and booking.check_out_date > today else ''}</td>
+        </tr>
+        """
+    
+    content = f"""
+    <h1><i class="fas fa-history"></i> මගේ බුකින්ග්</h1>
+    <div class="table-responsive mt-3">
+        <table class="table table-striped">
+            <thead>
+                <tr>
+                    <th>ID</th>
+                    <th>හොටෙල්</th>
+                    <th>කාමරය</th>
+                    <th>Check-in</th>
+                    <th>Check-out</th>
+                    <th>මුදල</th>
+                    <th>තත්වය</th>
+                    <th></th>
+                </tr>
+            </thead>
+            <tbody>
+                {bookings_html if bookings_html else '<tr><td colspan="8" class="text-center">No bookings yet</td></tr>'}
+            </tbody>
+        </table>
+    </div>
+    {waitlist_html}
+    """
+    return base_template("My Bookings", content)
+
+EXPORT_COLUMNS = [
+    ('booking_id', Booking.id),
+    ('hotel', Hotel.name),
+    ('room', Room.room_number),
+    ('room_type', Room.room_type),
+    ('guest_name', Booking.guest_name),
+    ('guest_email', Booking.guest_email),
+    ('guest_phone', Booking.guest_phone),
+    ('check_in', Booking.check_in_date),
+    ('check_out', Booking.check_out_date),
+    ('total_price', Booking.total_price),
+    ('status', Booking.status),
+    ('booked_at', Booking.booking_date),
+    ('group_id', Booking.group_id),
+]
+EXPORT_BATCH_SIZE = 1000
+
+def export_bookings_query():
+    """Bookings query for the export filters, limited to the hotels the user manages; None if none"""
+    query = db.session.query(*[column for _, column in EXPORT_COLUMNS]) \
+        .outerjoin(Hotel, Hotel.id == Booking.hotel_id) \
+        .outerjoin(Room, Room.id == Booking.room_id)
+    if current_user.user_type == 'hotel_admin':
+        query = query.filter(Hotel.owner_email == current_user.email)
+    elif current_user.user_type != 'super_admin':
+        return None
+    
+    if request.args.get('hotel_id', type=int):
+        query = query.filter(Booking.hotel_id == request.args.get('hotel_id', type=int))
+    if request.args.get('status'):
+        query = query.filter(Booking.status == request.args['status'])
+    try:
+        # stays overlapping [start, end)
+        if request.args.get('start'):
+            query = query.filter(Booking.check_out_date > datetime.strptime(request.args['start'], '%Y-%m-%d').date())
+        if request.args.get('end'):
+            query = query.filter(Booking.check_in_date < datetime.strptime(request.args['end'], '%Y-%m-%d').date())
+    except ValueError:
+        return None
+    # yield_per streams rows through a server-side cursor instead of loading the whole result
+    return query.order_by(Booking.id).yield_per(EXPORT_BATCH_SIZE)
+
+@app.route('/export/bookings.<fmt>')
+@login_required
+def export_bookings(fmt):
+    """බුකින්ග් CSV/XLSX ලෙස බාගත කිරීම"""
+    if fmt not in ('csv', 'xlsx'):
+        abort(404)
+    query = export_bookings_query()
+    if query is None:
+        flash('අවසරය නොමැත හෝ පෙරහන් වලංගු නොවේ.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    header = [name for name, _ in EXPORT_COLUMNS]
+    filename = f"bookings-{datetime.now():%Y%m%d-%H%M}.{fmt}"
+    rows = (tuple(row) for row in query)
+    if fmt == 'csv':
+        body, mimetype = csv_stream(header, rows), 'text/csv'
+    else:
+        try:
+            body = xlsx_stream(header, rows, sheet_name='Bookings')
+        except ExportUnavailable:
+            flash('Excel අපනයනය මෙම සේවාදායකයේ සක්‍රිය කර නැත. CSV භාවිතා කරන්න.', 'warning')
+            return redirect(url_for('dashboard'))
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+IMPORT_BATCH_SIZE = 5000
+IMPORT_MAX_REPORTED_ERRORS = 200
+
+def write_rows(model, rows):
+    """Insert mappings in batches; PostgreSQL gets COPY, everything else bulk_insert_mappings"""
+    if not rows:
+        return
+    columns = list(rows[0])
+    use_copy = db.engine.dialect.name == 'postgresql'
+    if use_copy:
+        # COPY bypasses the ORM, so Python-side column defaults would be left NULL
+        defaults = {column.name: _column_default(column) for column in model.__table__.columns
+                    if column.name not in columns and not column.primary_key}
+        defaults = {name: value for name, value in defaults.items() if value is not None}
+        columns += list(defaults)
+    for offset in range(0, len(rows), IMPORT_BATCH_SIZE):
+        batch = rows[offset:offset + IMPORT_BATCH_SIZE]
+        if use_copy:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([row.get(column, defaults.get(column)) for column in columns]
+                                         for row in batch)
+            buffer.seek(0)
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert(f'COPY "{model.__table__.name}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+                               buffer)
+        else:
+            db.session.bulk_insert_mappings(model, batch)
+
+def resolve_hotels(rows, errors):
+    """Fill hotel_id from a hotel name where needed; rows with an unknown hotel become errors"""
+    names = {row['hotel'] for _, row in rows if row['hotel_id'] is None}
+    ids = {row['hotel_id'] for _, row in rows if row['hotel_id'] is not None}
+    by_name, ambiguous = {}, set()
+    for hotel_id, name in db.session.query(Hotel.id, Hotel.name).filter(Hotel.name.in_(names)) if names else ():
+        if name in by_name:
+            ambiguous.add(name)
+        by_name[name] = hotel_id
+    known_ids = {row[0] for row in db.session.query(Hotel.id).filter(Hotel.id.in_(ids))} if ids else set()
+    
+    resolved = []
+    for row_number, row in rows:
+        if row['hotel_id'] is not None:
+            if row['hotel_id'] not in known_ids:
+                errors.append(RowError(row_number, 'hotel_id', 'unknown hotel'))
+                continue
+        elif row['hotel'] in ambiguous:
+            errors.append(RowError(row_number, 'hotel', 'several hotels have this name, use hotel_id'))
+            continue
+        elif row['hotel'] not in by_name:
+            errors.append(RowError(row_number, 'hotel', 'unknown hotel'))
+            continue
+        else:
+            row['hotel_id'] = by_name[row['hotel']]
+        resolved.append((row_number, row))
+    return resolved
+
+def reject_conflicting_bookings(candidates, errors):
+    """Keep the imported bookings that neither repeat an existing booking nor take a room already
+    booked for those nights, in the database or earlier in the file; the rest become row errors.
+    Repeats are what make a second import of the same file load nothing"""
+    if not candidates:
+        return []
+    hotel_ids = {row['hotel_id'] for _, row in candidates}
+    first = min(row['check_in_date'] for _, row in candidates)
+    last = max(row['check_out_date'] for _, row in candidates)
+    seen, busy = {}, {}
+    
+    def remember(row, source):
+        seen[(row['hotel_id'], row['room_id'], row['guest_name'], row['check_in_date'], row['check_out_date'])] = source
+        if row['status'] == 'confirmed' and row['room_id']:
+            busy.setdefault(row['room_id'], []).append((row['check_in_date'], row['check_out_date'], source))
+    
+    for booking in db.session.query(Booking.id, Booking.hotel_id, Booking.room_id, Booking.guest_name,
+                                    Booking.check_in_date, Booking.check_out_date, Booking.status).filter(
+            Booking.hotel_id.in_(hotel_ids), Booking.check_in_date < last, Booking.check_out_date > first):
+        remember(booking._asdict(), f'booking #{booking.id}')
+    
+    accepted = []
+    for row_number, row in candidates:
+        source = seen.get((row['hotel_id'], row['room_id'], row['guest_name'], row['check_in_date'],
+                           row['check_out_date']))
+        if source:
+            errors.append(RowError(row_number, 'guest_name', f'same booking as {source}'))
+            continue
+        if row['status'] == 'confirmed' and row['room_id']:
+            source = next((source for start, end, source in busy.get(row['room_id'], ())
+                           if start < row['check_out_date'] and end > row['check_in_date']), None)
+            if source:
+                errors.append(RowError(row_number, 'check_in_date', f'room already booked for these nights ({source})'))
+                continue
+        remember(row, f'row {row_number}')
+        accepted.append(row)
+    return accepted
+
+def import_records(kind, records, skip_invalid=False):
+    """Validate and bulk-load hotels, rooms or bookings in one transaction -> report dict.
+    
+    With skip_invalid the clean rows are loaded and the rest reported; otherwise any
+    error loads nothing.
+    """
+    started = time.perf_counter()
+    rows, errors, total = [], [], 0
+    for row_number, row, row_errors in validate(kind, records):
+        total += 1
+        errors += row_errors
+        if row is not None:
+            rows.append((row_number, row))
+    now = datetime.utcnow()
+    
+    if kind == 'hotels':
+        names = {row['name'] for _, row in rows}
+        existing = {row[0] for row in db.session.query(Hotel.name).filter(Hotel.name.in_(names))} if names else set()
+        seen, mappings = set(), []
+        for row_number, row in rows:
+            if row['name'] in existing or row['name'] in seen:
+                errors.append(RowError(row_number, 'name', 'a hotel with this name already exists'))
+                continue
+            seen.add(row['name'])
+            if row['available_rooms'] is None:
+                row['available_rooms'] = row['total_rooms']
+            mappings.append({**row, 'created_at': now, 'approved_at': now if row['is_approved'] else None})
+        model = Hotel
+    
+    elif kind == 'rooms':
+        rows = resolve_hotels(rows, errors)
+        hotel_ids = {row['hotel_id'] for _, row in rows}
+        taken = set(db.session.query(Room.hotel_id, Room.room_number).filter(Room.hotel_id.in_(hotel_ids))) \
+            if hotel_ids else set()
+        mappings = []
+        for row_number, row in rows:
+            key = (row['hotel_id'], row['room_number'])
+            if key in taken:
+                errors.append(RowError(row_number, 'room_number', 'already exists in this hotel'))
+                continue
+            taken.add(key)
+            row.pop('hotel')
+            mappings.append({**row, 'created_at': now})
+        model = Room
+    
+    else:
+        rows = resolve_hotels(rows, errors)
+        hotel_ids = {row['hotel_id'] for _, row in rows}
+        room_ids = {(hotel_id, number): room_id for room_id, hotel_id, number in db.session.query(
+            Room.id, Room.hotel_id, Room.room_number).filter(Room.hotel_id.in_(hotel_ids))} if hotel_ids else {}
+        candidates = []
+        for row_number, row in rows:
+            room_number = row.pop('room_number')
+            room_id = room_ids.get((row['hotel_id'], room_number)) if room_number else 0
+            if room_id is None:
+                errors.append(RowError(row_number, 'room_number', 'unknown room for this hotel'))
+                continue
+            row.pop('hotel')
+            candidates.append((row_number, {**row, 'room_id': room_id,
+                                            'guest_whatsapp': row['guest_whatsapp'] or row['guest_phone'],
+                                            'booking_date': row['booking_date'] or now, 'updated_at': now}))
+        mappings = reject_conflicting_bookings(candidates, errors)
+        model = Booking
+    
+    errors.sort(key=lambda e: e.row)
+    report = {'kind': kind, 'total': total, 'imported': 0, 'errors': len(errors),
+              'error_rows': errors[:IMPORT_MAX_REPORTED_ERRORS]}
+    if errors and not skip_invalid or not mappings:
+        report['seconds'] = round(time.perf_counter() - started, 2)
+        return report
+    
+    write_rows(model, mappings)
+    if kind == 'bookings':
+        add_imported_inventory(mappings)
+    elif kind == 'rooms':
+        for hotel_id in {row['hotel_id'] for row in mappings}:
+            bump_rates_version(hotel_id)  # new rooms need rows in the rate calendar
+    db.session.commit()
+    
+    if kind == 'bookings':
+        for hotel_id in {row['hotel_id'] for row in mappings}:
+            stays = [(row['check_in_date'], row['check_out_date']) for row in mappings
+                     if row['hotel_id'] == hotel_id and row['status'] == 'confirmed']
+            if stays:
+                publish_inventory_change(hotel_id, [], taken=[(min(s for s, _ in stays), max(e for _, e in stays))])
+    
+    report['imported'] = len(mappings)
+    report['seconds'] = round(time.perf_counter() - started, 2)
+    return report
+
+def add_imported_inventory(bookings):
+    """Count confirmed imported stays into DailyInventory: one read and one bulk write per table"""
+    counts = {}
+    for row in bookings:
+        if row['status'] != 'confirmed':
+            continue
+        night = row['check_in_date']
+        while night < row['check_out_date']:
+            counts[(row['hotel_id'], night)] = counts.get((row['hotel_id'], night), 0) + 1
+            night += timedelta(days=1)
+    if not counts:
+        return
+    
+    hotel_ids = {hotel_id for hotel_id, _ in counts}
+    first, last = min(night for _, night in counts), max(night for _, night in counts)
+    existing = {(row.hotel_id, row.date): row for row in db.session.query(
+        DailyInventory.id, DailyInventory.hotel_id, DailyInventory.date, DailyInventory.booked_rooms).filter(
+        DailyInventory.hotel_id.in_(hotel_ids), DailyInventory.date >= first, DailyInventory.date <= last)}
+    now = datetime.utcnow()
+    db.session.bulk_update_mappings(DailyInventory, [
+        {'id': existing[key].id, 'booked_rooms': existing[key].booked_rooms + count, 'updated_at': now}
+        for key, count in counts.items() if key in existing])
+    write_rows(DailyInventory, [
+        {'hotel_id': hotel_id, 'date': night, 'booked_rooms': count, 'updated_at': now}
+        for (hotel_id, night), count in counts.items() if (hotel_id, night) not in existing])
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['hotels', 'rooms', 'bookings']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), default=None,
+              help='Defaults to the file extension')
+@click.option('--skip-invalid', is_flag=True, help='Load the valid rows even if some rows have errors')
+def import_data_command(kind, path, fmt, skip_invalid):
+    """Bulk-load hotels, rooms or bookings from a CSV or JSON file"""
+    with open(path, 'rb') as f:
+        report = import_records(kind, read_records(f, fmt or detect_format(path)), skip_invalid)
+    for error in report['error_rows']:
+        print(f"  ❌ {error!r}")
+    if report['errors'] > len(report['error_rows']):
+        print(f"  ... and {report['errors'] - len(report['error_rows'])} more")
+    print(f"📥 {report['imported']}/{report['total']} {kind} imported in {report['seconds']}s, {report['errors']} error(s)")
+
+SYNTHETIC_PASSWORD = 'synthetic123'
+
+def purge_synthetic_data():
+    """Remove everything seed-synthetic created (recognised by the @synthetic.test emails)"""
+    pattern = f'%@{SYNTHETIC_DOMAIN}'
+    hotel_ids = db.session.query(Hotel.id).filter(Hotel.owner_email.like(pattern))
+    counts = {
+        'bookings': Booking.query.filter(db.or_(Booking.hotel_id.in_(hotel_ids), Booking.guest_email.like(pattern)))
+                                 .delete(synchronize_session=False),
+        'inventory': DailyInventory.query.filter(DailyInventory.hotel_id.in_(hotel_ids)).delete(synchronize_session=False),
+        'rooms': Room.query.filter(Room.hotel_id.in_(hotel_ids)).delete(synchronize_session=False),
+    }
+    counts['hotels'] = Hotel.query.filter(Hotel.owner_email.like(pattern)).delete(synchronize_session=False)
+    counts['users'] = User.query.filter(User.email.like(pattern)).delete(synchronize_session=False)
+    db.session.commit()
+    analytics_engine.invalidate()
+    return counts
+
+@app.cli.command('seed-synthetic')
+@click.option('--hotels', default=10000, show_default=True)
+@click.option('--rooms', default=200000, show_default=True)
+@click.option('--users', default=1000000, show_default=True)
+@click.option('--bookings', default=10000000, show_default=True)
+@click.option('--seed', default=42, show_default=True, help='Same seed and volumes give the same data')
+@click.option('--anchor', type=click.DateTime(['%Y-%m-%d']), default=None,
+              help='Date the booking window is centred on (default today); fix it for reproducible runs')
+@click.option('--purge', is_flag=True, help='Delete earlier synthetic data first')
+def seed_synthetic_command(hotels, rooms, users, bookings, seed, anchor, purge):
+    """Fill the database with skewed, seeded load-test data, bulk inserted a chunk at a time"""
+    if purge:
+        print(f"🧹 Removed {purge_synthetic_data()}")
+    elif Hotel.query.filter(Hotel.owner_email.like(f'%@{SYNTHETIC_DOMAIN}')).first() or \
+            User.query.filter(User.email.like(f'%@{SYNTHETIC_DOMAIN}')).first():
+        raise click.ClickException('Synthetic data already exists; rerun with --purge')
+
+    generator = SyntheticData(seed, anchor.date() if anchor else None)
+
+    def load(model, chunks, label, after=None):
+        started, written = time.perf_counter(), 0
+        for chunk in chunks:
+            write_rows(model, chunk)
+            if after is not None:
+                after(chunk)
+            db.session.commit()
+            written += len(chunk)
+            print(f"  {label}: {written}", end='\r', flush=True)
+        print(f"✅ {written} {label} in {time.perf_counter() - started:.1f}s")
+
+    synthetic_hotels = Hotel.query.filter(Hotel.owner_email.like(f'%@{SYNTHETIC_DOMAIN}'))
+    load(Hotel, generator.hotels(hotels), 'hotels')
+    hotel_rows = synthetic_hotels.with_entities(Hotel.id, Hotel.price_per_night).order_by(Hotel.id).all()
+
+    load(Room, generator.rooms(hotel_rows, rooms), 'rooms')
+    hotel_ids = synthetic_hotels.with_entities(Hotel.id)
+    room_rows = db.session.query(Room.id, Room.hotel_id, Room.price_per_night) \
+        .filter(Room.hotel_id.in_(hotel_ids)).order_by(Room.id).all()
+    room_count = db.select(db.func.count(Room.id)).where(Room.hotel_id == Hotel.id).scalar_subquery()
+    synthetic_hotels.update({Hotel.total_rooms: room_count, Hotel.available_rooms: room_count},
+                            synchronize_session=False)
+    db.session.commit()
+
+    # one hash for every synthetic account: hashing a million passwords would dominate the run
+    load(User, generator.users(users, password_hasher.hash(SYNTHETIC_PASSWORD)), 'users')
+    customer_ids = [row[0] for row in db.session.query(User.id).filter(User.email.like(f'%@{SYNTHETIC_DOMAIN}'))
+                    .order_by(User.id)]
+
+    if room_rows:
+        # the generator never double-books a room; DailyInventory counts the nights like an import does
+        load(Booking, generator.bookings(room_rows, customer_ids, bookings), 'bookings', add_imported_inventory)
+    analytics_engine.invalidate()
+    print(f"🔑 Synthetic customers log in as synthetic<n> / {SYNTHETIC_PASSWORD}")
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+def admin_import():
+    """හොටෙල්, කාමර සහ බුකින්ග් තොග වශයෙන් ඇතුලත් කිරීම"""
+    if current_user.user_type != 'super_admin':
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    report_html = ""
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        upload = request.files.get('file')
+        if kind not in ('hotels', 'rooms', 'bookings') or not upload or not upload.filename:
+            flash('වර්ගය සහ ගොනුව තෝරන්න.', 'danger')
+            return redirect(url_for('admin_import'))
+        
+        try:
+            report = import_records(kind, read_records(upload.stream, detect_format(upload.filename)),
+                                    skip_invalid=bool(request.form.get('skip_invalid')))
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            db.session.rollback()
+            flash(f'ගොනුව කියවිය නොහැක: {e}', 'danger')
+            return redirect(url_for('admin_import'))
+        
+        error_rows = "".join(
+            f"<tr><td>{error.row}</td><td>{escape(error.field or '')}</td><td>{escape(error.message)}</td></tr>"
+            for error in report['error_rows'])
+        alert = 'success' if report['imported'] and not report['errors'] else 'warning' if report['imported'] else 'danger'
+        report_html = f"""
+        <div class="alert alert-{alert}">
+            {report['imported']}/{report['total']} {kind} ඇතුලත් කරන ලදී ({report['seconds']}s), දෝෂ {report['errors']}
+            {'' if report['imported'] or not report['errors'] else '- කිසිවක් ඇතුලත් නොකළා. දෝෂ නිවැරදි කරන්න හෝ "වලංගු පේළි පමණක්" තෝරන්න.'}
+        </div>
+        {f'''<table class="table table-sm"><thead><tr><th>පේළිය</th><th>ක්ෂේත්‍රය</th><th>දෝෂය</th></tr></thead>
+        <tbody>{error_rows}</tbody></table>''' if error_rows else ''}
+        """
+    
+    fields = {kind: ", ".join(field.name for field in spec[0]) for kind, spec in IMPORT_SPECS.items()}
+    content = f"""
+    <h1><i class="fas fa-file-import"></i> දත්ත ඇතුලත් කිරීම</h1>
+    <div class="card mb-4">
+        <div class="card-body">
+            <form method="POST" enctype="multipart/form-data">
+                <div class="row g-2 align-items-end">
+                    <div class="col-md-3">
+                        <label class="form-label">වර්ගය</label>
+                        <select class="form-control" name="kind">
+                            <option value="hotels">හොටෙල්</option>
+                            <option value="rooms">කාමර</option>
+                            <option value="bookings">බුකින්ග්</option>
+                        </select>
+                    </div>
+                    <div class="col-md-5">
+                        <label class="form-label">CSV / JSON ගොනුව</label>
+                        <input type="file" class="form-control" name="file" accept=".csv,.json,.jsonl" required>
+                    </div>
+                    <div class="col-md-2 form-check">
+                        <input type="checkbox" class="form-check-input" name="skip_invalid" id="skip_invalid">
+                        <label class="form-check-label" for="skip_invalid">වලංගු පේළි පමණක්</label>
+                    </div>
+                    <div class="col-md-2">
+                        <button type="submit" class="btn btn-primary w-100">ඇතුලත් කරන්න</button>
+                    </div>
+                </div>
+            </form>
+            <p class="text-muted mt-3 mb-0"><small>
+                හොටෙල්: {fields['hotels']}<br>
+                කාමර: {fields['rooms']}<br>
+                බුකින්ග්: {fields['bookings']}
+            </small></p>
+        </div>
+    </div>
+    {report_html}
+    """
+    return base_template("Import", content)
+
+@app.route('/admin/notifications')
+@login_required
+def admin_notifications():
+    """අසාර්ථක WhatsApp දන්වීම්"""
+    if current_user.user_type != 'super_admin':
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    dead_letters = NotificationDeadLetter.query.filter_by(replayed_at=None).order_by(
+        NotificationDeadLetter.failed_at.desc()).limit(200).all()
+    
+    rows_html = ""
+    for item in dead_letters:
+        rows_html += f"""
+        <tr>
+            <td>{item.failed_at:%Y-%m-%d %H:%M}</td>
+            <td>{escape(item.phone)}</td>
+            <td><small>{escape(item.message[:80])}</small></td>
+            <td>{item.attempts}</td>
+            <td><small class="text-danger">{escape(item.last_error or '')}</small></td>
+            <td>
+                <form method="POST" action="/admin/notifications/{item.id}/replay">
+                    <button type="submit" class="btn btn-sm btn-outline-primary">නැවත යවන්න</button>
+                </form>
+            </td>
+        </tr>
+        """
+    
+    content = f"""
+    <div class="d-flex justify-content-between align-items-center">
+        <h1><i class="fas fa-exclamation-triangle"></i> අසාර්ථක දන්වීම්</h1>
+        <form method="POST" action="/admin/notifications/replay_all">
+            <button type="submit" class="btn btn-primary" {'disabled' if not dead_letters else ''}>සියල්ල නැවත යවන්න</button>
+        </form>
+    </div>
+    <p class="text-muted">පෝලිමේ ඇති පණිවිඩ: {whatsapp_service.queue_depth}</p>
+    <div class="table-responsive">
+        <table class="table table-sm">
+            <thead>
+                <tr>
+                    <th>අසාර්ථක වූ වේලාව</th>
+                    <th>දුරකථන</th>
+                    <th>පණිවිඩය</th>
+                    <th>උත්සාහ</th>
+                    <th>දෝෂය</th>
+                    <th></th>
+                </tr>
+            </thead>
+            <tbody>
+                {rows_html if rows_html else '<tr><td colspan="6" class="text-center">No failed notifications</td></tr>'}
+            </tbody>
+        </table>
+    </div>
+    """
+    return base_template("Failed Notifications", content)
+
+def replay_dead_letters(dead_letters):
+    """Put dead-lettered notifications back on the outbox"""
+    for item in dead_letters:
+        whatsapp_service.enqueue(item.phone, item.message, provider=item.provider,
+                                 context=json.loads(item.context or '{}'))
+        item.replayed_at = datetime.utcnow()
+    db.session.commit()
+
+@app.route('/admin/notifications/<int:dead_letter_id>/replay', methods=['POST'])
+@login_required
+def replay_notification(dead_letter_id):
+    """දන්වීම නැවත යැවීම"""
+    if current_user.user_type != 'super_admin':
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    replay_dead_letters([NotificationDeadLetter.query.get_or_404(dead_letter_id)])
+    flash('දන්වීම නැවත යැවීමට පෝලිමට එක් කරන ලදී.', 'success')
+    return redirect(url_for('admin_notifications'))
+
+@app.route('/admin/notifications/replay_all', methods=['POST'])
+@login_required
+def replay_all_notifications():
+    """සියලු දන්වීම් නැවත යැවීම"""
+    if current_user.user_type != 'super_admin':
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    dead_letters = NotificationDeadLetter.query.filter_by(replayed_at=None).all()
+    replay_dead_letters(dead_letters)
+    flash(f'දන්වීම් {len(dead_letters)}ක් නැවත යැවීමට පෝලිමට එක් කරන ලදී.', 'success')
+    return redirect(url_for('admin_notifications'))
+
+def sample_capacity_gauges():
+    """Per-process gauges for /metrics, refreshed after every request and on each scrape"""
+    metrics.notification_queue.set(whatsapp_service.queue_depth)
+    pool = db.engine.pool
+    metrics.db_pool_checked_out.set(pool.checkedout() if hasattr(pool, 'checkedout') else 0)
+    metrics.db_pool_size.set(pool.size() if hasattr(pool, 'size') else 0)
+    metrics.image_jobs_in_flight.set(image_utils.in_flight)
+
+metrics.init_app(app, sampler=sample_capacity_gauges, ignore={'static', 'prometheus_metrics'})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; when METRICS_TOKEN is set it must be sent as a bearer token"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    
+    if metrics.enabled:
+        metrics.image_backlog.set(ImageBlob.query.filter_by(processing_status='pending').count())
+    try:
+        body, content_type = metrics.render()
+    except MetricsUnavailable as e:
+        return Response(f"{e}\n", status=503, mimetype='text/plain')
+    return Response(body, content_type=content_type)
+
+@app.route('/admin/profiling')
+@login_required
+def profiling_report():
+    """මෑත ඉල්ලීම්වල කාලය, SQL සහ N+1 රටා"""
+    if current_user.user_type != 'super_admin':
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    flagged_only = request.args.get('flagged') == '1'
+    threshold = profiler.repeat_threshold
+    
+    summary_rows = "".join(f"""
+        <tr class="{'table-warning' if stats['flagged'] else ''}">
+            <td>{escape(endpoint)}</td>
+            <td>{stats['requests']}</td>
+            <td>{stats['p50_ms']}</td>
+            <td>{stats['p95_ms']}</td>
+            <td>{stats['sql']}</td>
+            <td>{stats['db_ms']}</td>
+            <td>{stats['render_ms']}</td>
+            <td>{stats['outbound']}</td>
+            <td>{stats['flagged']}</td>
+        </tr>""" for endpoint, stats in profiler.summary())
+    
+    request_rows = ""
+    for profile in profiler.recent(limit=100, flagged_only=flagged_only):
+        repeated = profile.repeated(threshold)
+        repeated_html = "".join(
+            # long column lists push the WHERE clause out of view; keep the head and the tail
+            f'<div><span class="badge bg-warning text-dark">{count}×</span> <code title="{escape(shape)}">'
+            f'{escape(shape if len(shape) <= 160 else shape[:60] + " … " + shape[-95:])}</code></div>'
+            for shape, count in repeated[:3])
+        request_rows += f"""
+        <tr>
+            <td><small>{profile.started_at:%H:%M:%S}</small></td>
+            <td>{profile.method}</td>
+            <td><small>{escape(profile.path[:80])}</small></td>
+            <td>{profile.status}</td>
+            <td>{profile.wall * 1000:.1f}</td>
+            <td>{profile.sql_count}</td>
+            <td>{profile.sql_time * 1000:.1f}</td>
+            <td>{profile.render_time * 1000:.1f}</td>
+            <td>{profile.outbound}</td>
+            <td>{repeated_html}</td>
+        </tr>
+        """
+    
+    content = f"""
+    <div class="d-flex justify-content-between align-items-center">
+        <h1><i class="fas fa-stopwatch"></i> ඉල්ලීම් ප්‍රොෆයිල්</h1>
+        <form method="POST" action="/admin/profiling/clear">
+            <button type="submit" class="btn btn-outline-secondary">හිස් කරන්න</button>
+        </form>
+    </div>
+    <p class="text-muted">මෙම worker ක්‍රියාවලියේ අවසන් ඉල්ලීම් {profiler.history.maxlen} දක්වා.
+        එකම SQL රටාව {threshold} වතාවක් හෝ වැඩියෙන් ධාවනය වූ ඉල්ලීම් N+1 ලෙස සලකුණු කෙරේ.</p>
+    
+    <h3>Endpoint අනුව</h3>
+    <div class="table-responsive">
+        <table class="table table-sm">
+            <thead>
+                <tr><th>Endpoint</th><th>ඉල්ලීම්</th><th>p50 ms</th><th>p95 ms</th><th>SQL</th><th>DB ms</th>
+                    <th>Render ms</th><th>Outbound</th><th>N+1</th></tr>
+            </thead>
+            <tbody>
+                {summary_rows if summary_rows else '<tr><td colspan="9" class="text-center">No requests recorded</td></tr>'}
+            </tbody>
+        </table>
+    </div>
+    
+    <div class="d-flex justify-content-between align-items-center mt-4">
+        <h3>මෑත ඉල්ලීම්</h3>
+        <a href="{'/admin/profiling' if flagged_only else '/admin/profiling?flagged=1'}" class="btn btn-sm btn-outline-warning">
+            {'සියල්ල පෙන්වන්න' if flagged_only else 'N+1 පමණක්'}</a>
+    </div>
+    <div class="table-responsive">
+        <table class="table table-sm">
+            <thead>
+                <tr><th>වේලාව</th><th></th><th>Path</th><th>Status</th><th>ms</th><th>SQL</th><th>DB ms</th>
+                    <th>Render ms</th><th>Outbound</th><th>නැවත නැවත ධාවනය වූ SQL</th></tr>
+            </thead>
+            <tbody>
+                {request_rows if request_rows else '<tr><td colspan="10" class="text-center">No requests recorded</td></tr>'}
+            </tbody>
+        </table>
+    </div>
+    """
+    return base_template("Request Profiling", content)
+
+@app.route('/admin/profiling/clear', methods=['POST'])
+@login_required
+def clear_profiling():
+    """ප්‍රොෆයිල් ඉතිහාසය හිස් කිරීම"""
+    if current_user.user_type != 'super_admin':
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    profiler.clear()
+    return redirect(url_for('profiling_report'))
+
+@app.route('/hotel/<int:hotel_id>/calendar')
+@login_required
+def hotel_calendar(hotel_id):
+    """බුකින්ග් කැලන්ඩරය"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    try:
+        start_date = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start_date = datetime.now().date()
+    days = min(request.args.get('days', 14, type=int), 62)
+    dates = [start_date + timedelta(days=i) for i in range(days)]
+    end_date = start_date + timedelta(days=days)
+    
+    rooms = Room.query.filter_by(hotel_id=hotel_id).order_by(Room.room_number).all()
+    bookings = Booking.query.filter(
+        Booking.hotel_id == hotel_id,
+        Booking.status == 'confirmed',
+        Booking.check_in_date < end_date,
+        Booking.check_out_date > start_date
+    ).all()
+    entries = BookingCalendar.query.filter(
+        BookingCalendar.hotel_id == hotel_id,
+        BookingCalendar.date >= start_date,
+        BookingCalendar.date < end_date
+    ).all()
+    
+    status = {}
+    for booking in bookings:
+        day = max(booking.check_in_date, start_date)
+        while day < min(booking.check_out_date, end_date):
+            status[(booking.room_id, day)] = 'booked'
+            day += timedelta(days=1)
+    for entry in entries:
+        if entry.status == 'blocked' and (entry.room_id, entry.date) not in status:
+            status[(entry.room_id, entry.date)] = 'blocked'
+    
+    header_html = "".join(f"<th><small>{day:%m-%d}</small></th>" for day in dates)
+    rows_html = ""
+    for room in rooms:
+        cells = ""
+        for day in dates:
+            day_status = status.get((room.id, day), 'available')
+            css = {'booked': 'booked', 'blocked': 'bg-warning'}.get(day_status, 'available')
+            cells += f'<td class="{css}" title="{day_status}"></td>'
+        rows_html += f"<tr><th>{escape(room.room_number)}</th>{cells}</tr>"
+    
+    content = f"""
+    <h1><i class="fas fa-calendar-alt"></i> {escape(hotel.name)} - කැලන්ඩරය</h1>
+    <div class="booking-calendar table-responsive">
+        <table class="table table-bordered table-sm">
+            <thead><tr><th>කාමරය</th>{header_html}</tr></thead>
+            <tbody>
+                {rows_html if rows_html else f'<tr><td colspan="{days + 1}" class="text-center">No rooms</td></tr>'}
+            </tbody>
+        </table>
+    </div>
+    <a href="?start={start_date - timedelta(days=days)}&days={days}" class="btn btn-outline-primary">&laquo;</a>
+    <a href="?start={end_date}&days={days}" class="btn btn-outline-primary">&raquo;</a>
+    """
+    return base_template("Calendar", content)
+
+@app.route('/api/calendar/update', methods=['POST'])
+@login_required
+def update_calendar():
+    """කැලන්ඩරය යාවත්කාලීන කිරීම (හොටෙල් අයිතිකරුවන් සඳහා)"""
+    data = request.get_json(silent=True) or {}
+    hotel = Hotel.query.get_or_404(data.get('hotel_id'))
+    
+    if not can_manage_hotel(hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    status = data.get('status')
+    if status not in ['available', 'blocked']:
+        return jsonify({'success': False, 'message': 'Invalid status'}), 400
+    try:
+        date = datetime.strptime(data.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid date'}), 400
+    room_id = data.get('room_id')
+    
+    entry = BookingCalendar.query.filter_by(hotel_id=hotel.id, room_id=room_id, date=date).first()
+    if entry is None:
+        entry = BookingCalendar(hotel_id=hotel.id, room_id=room_id, date=date)
+        db.session.add(entry)
+    entry.status = status
+    entry.updated_by = current_user.id
+    entry.updated_at = datetime.utcnow()
+    db.session.commit()
+    
+    span = [(date, date + timedelta(days=1))]
+    publish_inventory_change(hotel.id, [room_id], **({'taken': span} if status == 'blocked' else {'released': span}))
+    notify_hotel_owner(hotel, 'calendar', f"{date} කාමර {room_id or '-'}: {status}")
+    return jsonify({'success': True, 'message': 'Calendar updated'})
+
+@app.route('/hotel/<int:hotel_id>/notification_settings', methods=['POST'])
+@login_required
+def hotel_notification_settings(hotel_id):
+    """WhatsApp සාරාංශ සැකසුම්"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    minutes = request.form.get('digest_minutes', type=int)
+    hotel.notification_digest_minutes = minutes if minutes and minutes > 0 else None
+    db.session.commit()
+    
+    flash('දන්වීම් සැකසුම් යාවත්කාලීන කරන ලදී.', 'success')
+    return redirect(url_for('dashboard'))
+
+def load_rate_inputs(hotel_id):
+    """(rooms, rules) for build_rate_calendar: every room plus the hotel-level 'any room' row"""
+    hotel_price = db.session.query(Hotel.price_per_night).filter_by(id=hotel_id).scalar() or 0
+    rooms = [(row.id, row.room_type, row.price_per_night) for row in
+             db.session.query(Room.id, Room.room_type, Room.price_per_night).filter_by(hotel_id=hotel_id)]
+    rooms.append((HOTEL_KEY, None, hotel_price))
+    rules = [rule.as_rule() for rule in RateRule.query.filter_by(hotel_id=hotel_id, is_active=True)]
+    return rooms, rules
+
+def rates_version(hotel_id):
+    # kept on the hotel row so every worker and CLI process agrees; usually already in the session
+    hotel = db.session.get(Hotel, hotel_id)
+    return hotel.rates_version if hotel else None
+
+def bump_rates_version(hotel_id):
+    """Tell every worker to rebuild this hotel's rate calendar; commits with the caller's change"""
+    Hotel.query.filter_by(id=hotel_id).update(
+        {'rates_version': db.func.coalesce(Hotel.rates_version, 0) + 1}, synchronize_session='fetch')
+    rate_engine.invalidate(hotel_id)
+
+def hotel_rate_calendar(hotel_id, check_in=None, check_out=None):
+    """The hotel's precomputed calendar, or a one-off one for stays beyond the horizon"""
+    calendar = rate_engine.calendar(hotel_id, lambda: load_rate_inputs(hotel_id), rates_version(hotel_id))
+    if check_in is None or calendar.covers(check_in, check_out):
+        return calendar
+    rooms, rules = load_rate_inputs(hotel_id)
+    start = min(check_in, calendar.start)
+    return build_rate_calendar(start, rooms, rules, days=(check_out - start).days)
+
+def quote_stay(hotel_id, room_id, check_in, check_out):
+    """Price breakdown for one stay; room_id None/0 prices the hotel's 'any room' rate"""
+    calendar = hotel_rate_calendar(hotel_id, check_in, check_out)
+    return calendar.quote(room_id or HOTEL_KEY, check_in, check_out)
+
+# The sync watermark is the newest updated_at already committed, so clocks of other hosts don't matter;
+# bookings stamped this much before it are read again in case they committed late (harmless, contributions
+# are replaced)
+ANALYTICS_SYNC_SLACK = timedelta(seconds=60)
+# room_type query value for the row of hotel-level bookings and rooms without a type
+ANALYTICS_UNTYPED = '-'
+
+def hotel_stats(hotel_id):
+    """The hotel's analytics matrices, folding in only bookings changed since the last call"""
+    def load_rooms():
+        return dict(db.session.query(Room.id, Room.room_type).filter(Room.hotel_id == hotel_id))
+    
+    def load_bookings(since, start, end):
+        query = db.session.query(Booking.id, Booking.room_id, Booking.check_in_date, Booking.check_out_date,
+                                 Booking.total_price, Booking.status).filter(Booking.hotel_id == hotel_id)
+        if since is None:
+            return query.filter(Booking.check_in_date < end, Booking.check_out_date > start).all()
+        return query.filter(Booking.updated_at >= since - ANALYTICS_SYNC_SLACK).all()
+    
+    # read before the bookings: anything committed in between is simply read again next time
+    watermark = db.session.query(db.func.max(Booking.updated_at)).scalar()
+    return analytics_engine.stats(hotel_id, load_rooms, load_bookings, watermark)
+
+def analytics_params(stats):
+    """(start, end, room_type) from the query string, defaulting to the last twelve months"""
+    today = datetime.now().date()
+    default_start = (today.replace(day=1) - timedelta(days=334)).replace(day=1)
+    try:
+        start = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        start = default_start
+    try:
+        end = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        end = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+    start, end = max(start, stats.start), min(end, stats.end)
+    room_type = request.args.get('room_type') or False  # missing or "" = every room type
+    return start, max(end, start), ANY_ROOM_TYPE if room_type == ANALYTICS_UNTYPED else room_type
+
+@app.route('/hotel/<int:hotel_id>/analytics')
+@login_required
+def hotel_analytics(hotel_id):
+    """පිරුම්, ADR සහ RevPAR විශ්ලේෂණ"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    started = time.perf_counter()
+    stats = hotel_stats(hotel.id)
+    start, end, room_type = analytics_params(stats)
+    summary = stats.summary(start, end, room_type)
+    months = stats.monthly(start, end, room_type)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    type_options = "".join(
+        f'<option value="{escape(t)}" {"selected" if t == room_type else ""}>{escape(t)}</option>'
+        for t in stats.room_types if t is not ANY_ROOM_TYPE)
+    type_options += (f'<option value="{ANALYTICS_UNTYPED}" {"selected" if room_type is ANY_ROOM_TYPE else ""}>'
+                     f'වර්ගයක් නොමැති / ඕනෑම කාමරයක්</option>')
+    month_rows = "".join(f"""
+            <tr>
+                <td>{month:%Y-%m}</td>
+                <td>
+                    <div class="progress" style="height: 18px;">
+                        <div class="progress-bar" style="width: {m['occupancy'] * 100:.1f}%">{m['occupancy'] * 100:.1f}%</div>
+                    </div>
+                </td>
+                <td>{m['sold']}</td>
+                <td>රු. {m['adr']:,.2f}</td>
+                <td>රු. {m['revpar']:,.2f}</td>
+                <td>රු. {m['revenue']:,.2f}</td>
+            </tr>""" for month, m in months)
+    
+    content = f"""
+    <h1><i class="fas fa-chart-line"></i> {escape(hotel.name)} - විශ්ලේෂණ</h1>
+    <form method="GET" class="row g-2 align-items-end mb-4">
+        <div class="col-md-3">
+            <label class="form-label">සිට</label>
+            <input type="date" class="form-control" name="start" value="{start}">
+        </div>
+        <div class="col-md-3">
+            <label class="form-label">දක්වා</label>
+            <input type="date" class="form-control" name="end" value="{end}">
+        </div>
+        <div class="col-md-3">
+            <label class="form-label">කාමර වර්ගය</label>
+            <select class="form-control" name="room_type">
+                <option value="" {"selected" if room_type is False else ""}>සියල්ල</option>
+                {type_options}
+            </select>
+        </div>
+        <div class="col-md-3">
+            <button type="submit" class="btn btn-primary w-100">පෙන්වන්න</button>
+        </div>
+    </form>
+    
+    <div class="row">
+        <div class="col-md-3"><div class="card text-white bg-primary"><div class="card-body text-center">
+            <h3>{summary['occupancy'] * 100:.1f}%</h3><p>පිරුම් අනුපාතය</p></div></div></div>
+        <div class="col-md-3"><div class="card text-white bg-success"><div class="card-body text-center">
+            <h3>රු. {summary['adr']:,.0f}</h3><p>ADR</p></div></div></div>
+        <div class="col-md-3"><div class="card text-white bg-info"><div class="card-body text-center">
+            <h3>රු. {summary['revpar']:,.0f}</h3><p>RevPAR</p></div></div></div>
+        <div class="col-md-3"><div class="card text-white bg-dark"><div class="card-body text-center">
+            <h3>රු. {summary['revenue']:,.0f}</h3><p>ආදායම</p></div></div></div>
+    </div>
+    
+    <div class="table-responsive mt-4">
+        <table class="table table-sm">
+            <thead>
+                <tr><th>මාසය</th><th>පිරුම්</th><th>විකුණූ රාත්‍රී</th><th>ADR</th><th>RevPAR</th><th>ආදායම</th></tr>
+            </thead>
+            <tbody>{month_rows}</tbody>
+        </table>
+    </div>
+    <p class="text-muted"><small>{summary['room_nights']} කාමර-රාත්‍රී, {elapsed_ms:.1f} ms -
+        <a href="{escape(url_for('hotel_analytics_json', hotel_id=hotel.id, start=start, end=end, room_type=request.args.get('room_type', '')))}">JSON</a></small></p>
+    """
+    return base_template("Analytics", content)
+
+@app.route('/hotel/<int:hotel_id>/analytics.json')
+@login_required
+def hotel_analytics_json(hotel_id):
+    """Daily occupancy/ADR/RevPAR series plus monthly and overall summaries"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    if not can_manage_hotel(hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    stats = hotel_stats(hotel.id)
+    start, end, room_type = analytics_params(stats)
+    return json_response({
+        'success': True,
+        'hotel_id': hotel.id,
+        'start': start,
+        'end': end,
+        'room_type': None if room_type is False else ANALYTICS_UNTYPED if room_type is ANY_ROOM_TYPE else room_type,
+        'summary': stats.summary(start, end, room_type),
+        'monthly': [dict(month=month, **m) for month, m in stats.monthly(start, end, room_type)],
+        'daily': stats.daily(start, end, room_type),
+    })
+
+@app.route('/hotel/<int:hotel_id>/rates', methods=['GET', 'POST'])
+@login_required
+def hotel_rates(hotel_id):
+    """මිල නීති"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if request.method == 'POST':
+        def optional_date(name):
+            value = request.form.get(name)
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        try:
+            rule = RateRule(
+                hotel_id=hotel.id,
+                name=request.form['name'].strip(),
+                room_type=request.form.get('room_type') or None,
+                start_date=optional_date('start_date'),
+                end_date=optional_date('end_date'),
+                weekdays=",".join(request.form.getlist('weekdays')) or None,
+                price=request.form.get('price', type=float),
+                multiplier=request.form.get('multiplier', type=float),
+                min_nights=request.form.get('min_nights', type=int),
+                discount_percent=request.form.get('discount_percent', type=float),
+                priority=request.form.get('priority', 0, type=int),
+            )
+        except (KeyError, ValueError):
+            flash('කරුණාකර වලංගු අගයන් ඇතුලත් කරන්න.', 'danger')
+            return redirect(url_for('hotel_rates', hotel_id=hotel_id))
+        if not rule.name or (rule.price is None and rule.multiplier is None and not rule.discount_percent):
+            flash('මිලක්, ගුණකයක් හෝ වට්ටමක් ඇතුලත් කරන්න.', 'danger')
+            return redirect(url_for('hotel_rates', hotel_id=hotel_id))
+        db.session.add(rule)
+        bump_rates_version(hotel.id)
+        db.session.commit()
+        flash('මිල නීතිය එකතු කරන ලදී.', 'success')
+        return redirect(url_for('hotel_rates', hotel_id=hotel_id))
+    
+    rules = RateRule.query.filter_by(hotel_id=hotel_id).order_by(RateRule.priority, RateRule.id).all()
+    room_types = sorted({row[0] for row in db.session.query(Room.room_type).filter_by(hotel_id=hotel_id) if row[0]})
+    weekday_names = ['සඳුදා', 'අඟහරුවාදා', 'බදාදා', 'බ්‍රහස්පතින්දා', 'සිකුරාදා', 'සෙනසුරාදා', 'ඉරිදා']
+    
+    # next 14 nights of the 'any room' rate, straight from the precomputed calendar
+    calendar = hotel_rate_calendar(hotel_id)
+    preview = "".join(
+        f"<td><small>{calendar.start + timedelta(days=i):%m-%d}</small><br>{price:,.0f}</td>"
+        for i, price in enumerate(calendar.prices[calendar.row[HOTEL_KEY], :14])
+    )
+    
+    rows_html = ""
+    for rule in rules:
+        if rule.discount_percent:
+            effect = f"{rule.discount_percent:g}% off, {rule.min_nights or 1}+ nights"
+        else:
+            effect = " ".join(filter(None, [
+                f"රු. {rule.price:,.2f}" if rule.price is not None else "",
+                f"x{rule.multiplier:g}" if rule.multiplier is not None else "",
+            ]))
+        days = ", ".join(weekday_names[int(d)] for d in (rule.weekdays or "").split(",") if d.isdigit())
+        rows_html += f"""
+            <tr>
+                <td>{escape(rule.name)}</td>
+                <td>{escape(rule.room_type or 'සියල්ල')}</td>
+                <td>{rule.start_date or ''} - {rule.end_date or ''}</td>
+                <td>{days}</td>
+                <td>{effect}</td>
+                <td>{rule.priority}</td>
+                <td>
+                    <form method="POST" action="/hotel/rate_rule/{rule.id}/delete">
+                        <button class="btn btn-sm btn-outline-danger">මකන්න</button>
+                    </form>
+                </td>
+            </tr>"""
+    
+    type_options = "".join(f'<option value="{escape(t)}">{escape(t)}</option>' for t in room_types)
+    weekday_checks = "".join(
+        f'<label class="me-2"><input type="checkbox" name="weekdays" value="{i}"> {name}</label>'
+        for i, name in enumerate(weekday_names)
+    )
+    
+    content = f"""
+    <h1><i class="fas fa-tags"></i> {escape(hotel.name)} - මිල නීති</h1>
+    <div class="table-responsive mb-4">
+        <table class="table table-bordered table-sm text-center"><tr>{preview}</tr></table>
+    </div>
+    <table class="table table-striped">
+        <thead><tr><th>නම</th><th>කාමර වර්ගය</th><th>කාල සීමාව</th><th>දින</th><th>බලපෑම</th><th>ප්‍රමුඛතාව</th><th></th></tr></thead>
+        <tbody>{rows_html or '<tr><td colspan="7" class="text-center">නීති නොමැත</td></tr>'}</tbody>
+    </table>
+    <div class="card">
+        <div class="card-header bg-success text-white"><h5 class="mb-0">නව නීතියක්</h5></div>
+        <div class="card-body">
+            <form method="POST" class="row g-2">
+                <div class="col-md-4"><input class="form-control" name="name" placeholder="නම (උදා: සති අන්තය)" required></div>
+                <div class="col-md-4">
+                    <select class="form-control" name="room_type"><option value="">සියලුම කාමර වර්ග</option>{type_options}</select>
+                </div>
+                <div class="col-md-2"><input type="date" class="form-control" name="start_date"></div>
+                <div class="col-md-2"><input type="date" class="form-control" name="end_date"></div>
+                <div class="col-12">{weekday_checks}</div>
+                <div class="col-md-2"><input type="number" step="0.01" class="form-control" name="price" placeholder="රාත්‍රී මිල"></div>
+                <div class="col-md-2"><input type="number" step="0.01" class="form-control" name="multiplier" placeholder="ගුණකය (1.2)"></div>
+                <div class="col-md-2"><input type="number" class="form-control" name="min_nights" placeholder="අවම රාත්‍රී"></div>
+                <div class="col-md-2"><input type="number" step="0.1" class="form-control" name="discount_percent" placeholder="වට්ටම %"></div>
+                <div class="col-md-2"><input type="number" class="form-control" name="priority" placeholder="ප්‍රමුඛතාව" value="0"></div>
+                <div class="col-md-2"><button class="btn btn-success w-100">එකතු කරන්න</button></div>
+            </form>
+        </div>
+    </div>
+    """
+    return base_template("Rates", content)
+
+@app.route('/hotel/rate_rule/<int:rule_id>/delete', methods=['POST'])
+@login_required
+def delete_rate_rule(rule_id):
+    """මිල නීතිය මකා දැමීම"""
+    rule = RateRule.query.get_or_404(rule_id)
+    hotel = Hotel.query.get_or_404(rule.hotel_id)
+    if not can_manage_hotel(hotel):
+        flash('අවසරය නොමැත.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    db.session.delete(rule)
+    bump_rates_version(hotel.id)
+    db.session.commit()
+    flash('මිල නීතිය මකා දමන ලදී.', 'success')
+    return redirect(url_for('hotel_rates', hotel_id=hotel.id))
+
+@app.route('/hotel/<int:hotel_id>')
+def hotel_details(hotel_id):
+    """හොටෙල් විස්තර"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    rooms = Room.query.options(db.selectinload(Room.images)).filter_by(hotel_id=hotel_id, is_available=True).all()
+    return render_template('Hotels/hotel_details.html', hotel=hotel, rooms=rooms)
+
+def acquire_image_blob(content_hash, size_bytes):
+    """Take a reference on the blob for content_hash, creating the row on first upload"""
+    updated = ImageBlob.query.filter_by(content_hash=content_hash).update(
+        {'ref_count': ImageBlob.ref_count + 1, 'released_at': None}, synchronize_session=False)
+    if not updated:
+        try:
+            with db.session.begin_nested():
+                db.session.add(ImageBlob(content_hash=content_hash, size_bytes=size_bytes, ref_count=1))
+        except IntegrityError:
+            # another request stored the same bytes first
+            ImageBlob.query.filter_by(content_hash=content_hash).update(
+                {'ref_count': ImageBlob.ref_count + 1, 'released_at': None}, synchronize_session=False)
+
+def release_image_blob(content_hash):
+    """Drop one reference; unreferenced blobs are left for garbage collection"""
+    ImageBlob.query.filter_by(content_hash=content_hash).update(
+        {'ref_count': ImageBlob.ref_count - 1}, synchronize_session=False)
+
+class ImageQuotaExceeded(Exception):
+    pass
+
+def hotel_image_hashes(hotel_id):
+    """Content hashes referenced by a hotel's gallery and its rooms"""
+    return db.union(
+        db.select(HotelImage.content_hash).where(HotelImage.hotel_id == hotel_id),
+        db.select(RoomImage.content_hash).join(Room, Room.id == RoomImage.room_id).where(Room.hotel_id == hotel_id),
+    )
+
+def hotel_storage_used(hotel_id):
+    """Bytes of distinct originals referenced by a hotel"""
+    return db.session.query(db.func.coalesce(db.func.sum(ImageBlob.size_bytes), 0)).filter(
+        ImageBlob.content_hash.in_(hotel_image_hashes(hotel_id))).scalar()
+
+def check_storage_quota(hotel_id, content_hash, size_bytes):
+    """Raise ImageQuotaExceeded if referencing content_hash would push the hotel over its quota"""
+    hashes = hotel_image_hashes(hotel_id).subquery()
+    if db.session.query(db.exists().where(hashes.c.content_hash == content_hash)).scalar():
+        return  # already paid for
+    quota = app.config['HOTEL_STORAGE_QUOTA_MB'] * 1024 * 1024
+    if hotel_storage_used(hotel_id) + size_bytes > quota:
+        raise ImageQuotaExceeded(f"Hotel {hotel_id} image storage quota ({app.config['HOTEL_STORAGE_QUOTA_MB']} MB) exceeded")
+
+def queue_image_upload(model, owner, file, is_primary=False, **fields):
+    """Store an upload and reference its blob; returns the image row or None.
+    Raises ImageQuotaExceeded when the hotel has no room left for a new original."""
+    stored = image_utils.store_upload(file)
+    if stored is None:
+        return None
+    content_hash, size_bytes = stored
+    owner_filter = {'hotel_id': owner.id} if isinstance(owner, Hotel) else {'room_id': owner.id}
+    # the stored original is left for the garbage collector if the quota rejects it
+    check_storage_quota(owner.id if isinstance(owner, Hotel) else owner.hotel_id, content_hash, size_bytes)
+    
+    acquire_image_blob(content_hash, size_bytes)
+    if is_primary:
+        model.query.filter_by(is_primary=True, **owner_filter).update({'is_primary': False})
+    image = model(content_hash=content_hash, is_primary=is_primary, **owner_filter, **fields)
+    db.session.add(image)
+    return image
+
+def start_image_processing(images):
+    """Hand committed image rows to the process pool; already processed blobs are reused as-is"""
+    for image in images:
+        if image.blob.processing_status == 'ready':
+            if image.is_primary:
+                set_owner_image_path(image)
+            continue
+        image_utils.process_async(image.content_hash, image_processed_callback(image.content_hash))
+    db.session.commit()
+
+def set_owner_image_path(image):
+    owner = image.hotel if isinstance(image, HotelImage) else image.room
+    owner.image_path = image.variant_url('medium')
+
+def image_processed_callback(content_hash):
+    """Build the callback that records a processed blob's variants"""
+    def on_done(future):
+        with app.app_context():
+            blob = ImageBlob.query.filter_by(content_hash=content_hash).first()
+            if blob is None:
+                return
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Image processing error ({content_hash}): {e}")
+                blob.processing_status = 'failed'
+            else:
+                blob.variants = json.dumps(image_utils.public_variants(result, content_hash))
+                blob.width = result['width']
+                blob.height = result['height']
+                blob.placeholder = result['placeholder']
+                blob.processing_status = 'ready'
+                for model in (HotelImage, RoomImage):
+                    for image in model.query.filter_by(content_hash=content_hash, is_primary=True):
+                        set_owner_image_path(image)
+            db.session.commit()
+    return on_done
+
+@app.cli.command('backfill-placeholders')
+def backfill_placeholders_command():
+    """Compute inline placeholders for images processed before they existed"""
+    blobs = ImageBlob.query.filter_by(processing_status='ready', placeholder=None).all()
+    paths = [image_utils.original_path(blob.content_hash) for blob in blobs]
+    for blob, placeholder in zip(blobs, image_utils.executor.map(generate_placeholder, paths)):
+        blob.placeholder = placeholder
+    db.session.commit()
+    print(f"🖼️ {len(blobs)} placeholder(s) generated")
+
+def collect_image_garbage(grace_seconds=None, dry_run=False, batch_size=500):
+    """Reconcile stored image files with the image tables and delete what nothing references"""
+    grace_seconds = app.config['IMAGE_GC_GRACE_SECONDS'] if grace_seconds is None else grace_seconds
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=grace_seconds)
+    cutoff_ts = time.time() - grace_seconds
+    stats = {'orphan_rows': 0, 'blobs': 0, 'files': 0, 'bytes': 0}
+    
+    # image rows whose hotel or room has been deleted
+    for model, owner in ((HotelImage, Hotel), (RoomImage, Room)):
+        owner_id = model.hotel_id if model is HotelImage else model.room_id
+        orphans = model.query.filter(~owner_id.in_(db.select(owner.id)))
+        stats['orphan_rows'] += orphans.count() if dry_run else orphans.delete(synchronize_session=False)
+    
+    # recount references so drift from failed requests can't keep blobs alive (or kill them)
+    ref_count = (
+        db.select(db.func.count(HotelImage.id)).where(HotelImage.content_hash == ImageBlob.content_hash)
+        .scalar_subquery() +
+        db.select(db.func.count(RoomImage.id)).where(RoomImage.content_hash == ImageBlob.content_hash)
+        .scalar_subquery()
+    )
+    if not dry_run:
+        ImageBlob.query.update({'ref_count': ref_count}, synchronize_session=False)
+        ImageBlob.query.filter(ImageBlob.ref_count > 0, ImageBlob.released_at.isnot(None)).update(
+            {'released_at': None}, synchronize_session=False)
+        ImageBlob.query.filter(ImageBlob.ref_count <= 0, ImageBlob.released_at.is_(None)).update(
+            {'released_at': now}, synchronize_session=False)
+    
+    expired = ImageBlob.query.filter(ImageBlob.ref_count <= 0, ImageBlob.released_at < cutoff)
+    for blob in expired.all():
+        try:
+            recently_reused = os.stat(image_utils.original_path(blob.content_hash)).st_mtime >= cutoff_ts
+        except FileNotFoundError:
+            recently_reused = False
+        if recently_reused:
+            continue  # a new upload of the same bytes may be about to reference it
+        stats['blobs'] += 1
+        if not dry_run:
+            # re-check in the DELETE so a concurrent upload's reference wins
+            ImageBlob.query.filter(ImageBlob.id == blob.id, ImageBlob.ref_count <= 0).delete(
+                synchronize_session=False)
+    if not dry_run:
+        db.session.commit()
+    
+    # stream the store in batches so memory stays flat however many files there are
+    def sweep(batch):
+        hashes = {content_hash for content_hash, _, _ in batch if content_hash}
+        live = {row[0] for row in db.session.query(ImageBlob.content_hash)
+                .filter(ImageBlob.content_hash.in_(hashes))} if hashes else set()
+        for content_hash, path, st in batch:
+            if content_hash in live or st.st_mtime >= cutoff_ts:
+                continue
+            stats['files'] += 1
+            stats['bytes'] += st.st_size
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+    
+    batch = []
+    for entry in image_utils.iter_stored_files():
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    sweep(batch)
+    return stats
+
+def hotels_over_quota():
+    """[(hotel, bytes_used)] for hotels above HOTEL_STORAGE_QUOTA_MB"""
+    quota = app.config['HOTEL_STORAGE_QUOTA_MB'] * 1024 * 1024
+    usage = ((hotel, hotel_storage_used(hotel.id)) for hotel in Hotel.query.all())
+    return [(hotel, used) for hotel, used in usage if used > quota]
+
+def run_image_gc_scheduler(interval_seconds):
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            with app.app_context():
+                collect_image_garbage()
+        except Exception as e:
+            print(f"Image GC error: {e}")
+
+_image_gc_scheduler_pid = None
+
+@app.before_request
+def start_image_gc_scheduler():
+    """Run the image garbage collector inside each worker when IMAGE_GC_INTERVAL is set"""
+    global _image_gc_scheduler_pid
+    interval = int(os.environ.get('IMAGE_GC_INTERVAL', 0))
+    if interval and _image_gc_scheduler_pid != os.getpid():
+        _image_gc_scheduler_pid = os.getpid()
+        threading.Thread(target=run_image_gc_scheduler, args=(interval,), name='image-gc', daemon=True).start()
+
+@app.cli.command('gc-images')
+@click.option('--grace', type=int, default=None, help='Seconds an unreferenced file is kept (default IMAGE_GC_GRACE_SECONDS)')
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed')
+def gc_images_command(grace, dry_run):
+    """Delete unreferenced image files and report hotels over their storage quota"""
+    stats = collect_image_garbage(grace, dry_run)
+    verb = 'would remove' if dry_run else 'removed'
+    print(f"🧹 {verb} {stats['files']} file(s) ({stats['bytes'] / 1024 / 1024:.1f} MB), "
+          f"{stats['blobs']} blob(s), {stats['orphan_rows']} orphaned image row(s)")
+    for hotel, used in hotels_over_quota():
+        print(f"⚠️ {hotel.name}: {used / 1024 / 1024:.1f} MB of {app.config['HOTEL_STORAGE_QUOTA_MB']} MB")
+
+@app.route('/hotel/<int:hotel_id>/upload_image', methods=['POST'])
+@login_required
+def upload_hotel_image(hotel_id):
+    """හොටෙල් රූපයක් ඇතුලත් කිරීම"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        flash('ඔබට මෙම හොටෙල් සඳහා රූප ඇතුලත් කිරීමට අවසරය නොමැත.', 'danger')
+        return redirect(url_for('hotel_details', hotel_id=hotel_id))
+    
+    try:
+        image = queue_image_upload(HotelImage, hotel, request.files.get('image'),
+                                   is_primary=request.form.get('is_primary') == 'true')
+    except ImageQuotaExceeded:
+        flash('හොටෙල් රූප ගබඩා සීමාව ඉක්මවා ඇත. පැරණි රූප මකා නැවත උත්සාහ කරන්න.', 'danger')
+        return redirect(url_for('hotel_details', hotel_id=hotel_id))
+    if image is None:
+        flash('රූපය ඇතුලත් කිරීම අසාර්ථකයි. කරුණාකර වලංගු රූපයක් තෝරන්න.', 'danger')
+        return redirect(url_for('hotel_details', hotel_id=hotel_id))
+    
+    db.session.commit()
+    start_image_processing([image])
+    
+    flash('රූපය සාර්ථකව ඇතුලත් කරන ලදී!', 'success')
+    return redirect(url_for('hotel_details', hotel_id=hotel_id))
+
+@app.route('/hotel/<int:hotel_id>/upload_images', methods=['POST'])
+@login_required
+def upload_hotel_images(hotel_id):
+    """හොටෙල් රූප ඇතුලත් කිරීම"""
+    hotel = Hotel.query.get_or_404(hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    files = [f for f in request.files.getlist('images') if f.filename]
+    if not files:
+        return jsonify({'success': False, 'message': 'No images selected'})
+    
+    # Files are already on disk and hashed; decoding and resizing fan out to the
+    # process pool, so the response doesn't wait for any of them
+    job_id = uuid.uuid4().hex
+    set_primary = request.form.get('set_primary') == 'true'
+    images = []
+    over_quota = 0
+    for index, file in enumerate(files):
+        try:
+            image = queue_image_upload(HotelImage, hotel, file, is_primary=set_primary and index == 0,
+                                       upload_job_id=job_id)
+        except ImageQuotaExceeded:
+            over_quota += 1
+            continue
+        if image is not None:
+            images.append(image)
+    if not images:
+        message = 'Image storage quota exceeded' if over_quota else 'No valid images selected'
+        return jsonify({'success': False, 'message': message})
+    
+    db.session.commit()
+    start_image_processing(images)
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'progress_url': url_for('upload_job_progress', job_id=job_id),
+        'accepted': len(images),
+        'rejected': len(files) - len(images),
+        'over_quota': over_quota,
+        'message': f'{len(images)} images uploaded successfully'
+    }), 202
+
+@app.route('/hotel/upload_jobs/<job_id>')
+@login_required
+def upload_job_progress(job_id):
+    """Batch upload progress"""
+    images = HotelImage.query.filter_by(upload_job_id=job_id).all()
+    if not images:
+        return jsonify({'success': False, 'message': 'Unknown job'}), 404
+    if not can_manage_hotel(images[0].hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    counts = {'pending': 0, 'ready': 0, 'failed': 0}
+    for image in images:
+        counts[image.processing_status] += 1
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'total': len(images),
+        **counts,
+        'done': counts['pending'] == 0,
+        'images': [{'id': image.id, 'status': image.processing_status,
+                    'thumb': image.variant_url('thumb')} for image in images]
+    })
+
+@app.route('/room/<int:room_id>/upload_image', methods=['POST'])
+@login_required
+def upload_room_image(room_id):
+    """කාමර රූපයක් ඇතුලත් කිරීම"""
+    room = Room.query.get_or_404(room_id)
+    hotel = Hotel.query.get(room.hotel_id)
+    
+    if not can_manage_hotel(hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    try:
+        image = queue_image_upload(RoomImage, room, request.files.get('image'),
+                                   is_primary=request.form.get('is_primary') == 'true')
+    except ImageQuotaExceeded as e:
+        return jsonify({'success': False, 'message': str(e)}), 413
+    if image is None:
+        return jsonify({'success': False, 'message': 'Invalid image'})
+    
+    db.session.commit()
+    start_image_processing([image])
+    return jsonify({'success': True, 'image_id': image.id, 'status': image.processing_status})
+
+@app.route('/hotel/image/<int:image_id>/set_primary', methods=['POST'])
+@login_required
+def set_primary_hotel_image(image_id):
+    """ප්‍රධාන රූපය සැකසීම"""
+    image = HotelImage.query.get_or_404(image_id)
+    if not can_manage_hotel(image.hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    HotelImage.query.filter_by(hotel_id=image.hotel_id, is_primary=True).update({'is_primary': False})
+    image.is_primary = True
+    if image.processing_status == 'ready':
+        image.hotel.image_path = image.variant_url('medium')
+    db.session.commit()
+    return jsonify({'success': True})
+
+@app.route('/hotel/image/<int:image_id>/delete', methods=['DELETE'])
+@login_required
+def delete_hotel_image(image_id):
+    """රූපය මකා දැමීම"""
+    image = HotelImage.query.get_or_404(image_id)
+    if not can_manage_hotel(image.hotel):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 403
+    
+    if image.is_primary:
+        image.hotel.image_path = None
+    release_image_blob(image.content_hash)
+    db.session.delete(image)
+    db.session.commit()
+    return jsonify({'success': True})
+
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+
+@app.route('/media/<path:filename>')
+def serve_media(filename):
+    """Uploaded image variants, with ETag/Range support and long-lived caching for content-addressed files"""
+    upload_folder = os.path.abspath(app.config['UPLOAD_FOLDER'])
+    path = safe_join(upload_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    
+    if app.config['IMAGE_SENDFILE'] == 'x-accel':
+        # nginx serves the file (including Range and If-None-Match) from an internal location
+        response = app.response_class(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{app.config['IMAGE_ACCEL_PREFIX'].rstrip('/')}/{filename}"
+    else:
+        # conditional=True answers If-None-Match/If-Modified-Since with 304 and Range with 206;
+        # with USE_X_SENDFILE the body is left to the proxy
+        response = send_from_directory(upload_folder, filename, conditional=True)
+    
+    if filename.startswith('cas/'):
+        # the name contains the content hash, so the bytes behind it never change
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = 3600
+    return response
+
+# ---- JSON API v1 (bearer tokens, no session) ----
+
+API_HOTEL_FIELDS = ('id', 'name', 'location', 'description', 'hotel_type', 'price_per_night',
+                    'total_rooms', 'available_rooms', 'amenities', 'contact_number', 'image_path')
+API_ROOM_FIELDS = ('id', 'hotel_id', 'room_number', 'room_type', 'capacity', 'price_per_night',
+                   'is_available', 'features', 'image_path')
+API_BOOKING_FIELDS = ('id', 'hotel_id', 'room_id', 'guest_name', 'guest_email', 'guest_phone',
+                      'check_in_date', 'check_out_date', 'total_price', 'booking_date', 'status', 'customer_id')
+API_MAX_LIMIT = 100
+
+def api_error(message, status):
+    return json_response({'success': False, 'message': message}, status)
+
+def api_auth(*roles):
+    """Require a valid bearer token (optionally one of roles); claims end up in g.api"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+            if scheme.lower() != 'bearer' or not token:
+                return api_error('Bearer token required', 401)
+            try:
+                g.api = api_tokens.verify(token)
+            except ApiTokenError as e:
+                return api_error(str(e), 401)
+            if roles and g.api['role'] not in roles:
+                return api_error('Forbidden', 403)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def api_can_manage(hotel_id):
+    """Token-side equivalent of can_manage_hotel()"""
+    return g.api['role'] == 'super_admin' or hotel_id in g.api['hotels']
+
+def api_hotel_visible(hotel_id):
+    """The hotel exists and the token may see it: approved, or one it manages"""
+    row = db.session.query(Hotel.is_approved).filter(Hotel.id == hotel_id).first()
+    return row is not None and (row.is_approved or api_can_manage(hotel_id))
+
+def api_columns(model, allowed, default=None):
+    """Columns for ?fields=a,b (sparse field selection), restricted to allowed"""
+    requested = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    fields = [f for f in requested if f in allowed] or list(default or allowed)
+    return [getattr(model, f) for f in fields]
+
+def api_page(query):
+    limit = max(1, min(request.args.get('limit', 50, type=int), API_MAX_LIMIT))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    return [dict(row._mapping) for row in query.limit(limit).offset(offset)], limit, offset
+
+def unavailable_room_ids(hotel_id, check_in, check_out, except_hold=None):
+    """Rooms with a confirmed booking, a blocked calendar day or a live waitlist hold inside [check_in, check_out);
+    except_hold is a waitlist entry id whose own hold does not count"""
+    booked = db.select(Booking.room_id).where(
+        Booking.hotel_id == hotel_id, Booking.status == 'confirmed',
+        Booking.check_in_date < check_out, Booking.check_out_date > check_in)
+    blocked = db.select(BookingCalendar.room_id).where(
+        BookingCalendar.hotel_id == hotel_id, BookingCalendar.status == 'blocked',
+        BookingCalendar.date >= check_in, BookingCalendar.date < check_out)
+    held = db.select(WaitlistEntry.held_room_id).where(
+        WaitlistEntry.hotel_id == hotel_id, WaitlistEntry.status == 'held',
+        WaitlistEntry.hold_expires_at > datetime.utcnow(),
+        WaitlistEntry.check_in_date < check_out, WaitlistEntry.check_out_date > check_in)
+    if except_hold is not None:
+        held = held.where(WaitlistEntry.id != except_hold)
+    return {row[0] for row in db.session.execute(db.union(booked, blocked, held))}
+
+def lock_free_room(hotel_id, check_in, check_out, room_id=None):
+    """Lock the hotel's bookable rooms (or only room_id) and return the cheapest one free for all of
+    [check_in, check_out), or None. "Any room" bookings get a real room this way, never room 0"""
+    candidates = Room.query.filter_by(hotel_id=hotel_id, is_available=True)
+    if room_id:
+        candidates = candidates.filter_by(id=room_id)
+    # two customers cannot both be handed the same free room
+    candidates = candidates.order_by(Room.price_per_night, Room.id).with_for_update().all()
+    taken = unavailable_room_ids(hotel_id, check_in, check_out)
+    return next((room for room in candidates if room.id not in taken), None)
+
+AVAILABILITY_CACHE_TTL = 300
+
+def availability_version(hotel_id):
+    return cache.get(f"availability:version:{hotel_id}") or 0
+
+@events.subscribe('inventory.changed')
+def invalidate_availability(topic, payload):
+    """Any committed booking or calendar change retires the hotel's cached availability"""
+    cache.incr(f"availability:version:{payload['hotel_id']}")
+
+def cached_unavailable_room_ids(hotel_id, check_in, check_out):
+    """unavailable_room_ids, cached per hotel until the next inventory.changed event.
+    Only with the shared (Redis) cache: an in-process copy would miss changes made by
+    other processes, such as 'flask expire-waitlist' or an import, for up to the TTL"""
+    if not cache.shared:
+        return unavailable_room_ids(hotel_id, check_in, check_out)
+    key = f"availability:{hotel_id}:{availability_version(hotel_id)}:{check_in}:{check_out}"
+    cached = cache.get(key)
+    metrics.cache_lookup('availability', cached is not None)
+    if cached is not None:
+        return set(json.loads(cached))
+    unavailable = unavailable_room_ids(hotel_id, check_in, check_out)
+    cache.set(key, json.dumps(sorted(unavailable)), ttl=AVAILABILITY_CACHE_TTL)
+    return unavailable
+
+@app.route('/api/v1/token', methods=['POST'])
+def api_issue_token():
+    """Exchange username/password for a bearer token"""
+    data = request.get_json(silent=True) or request.form
+    username, password = data.get('username', ''), data.get('password', '')
+    
+    wait = login_throttle.check(username, request.remote_addr)
+    if wait:
+        response = api_error('Too many attempts', 429)
+        response.headers['Retry-After'] = str(int(wait) + 1)
+        return response
+    
+    user = User.query.filter_by(username=username).first()
+    try:
+        authenticated = user and user.is_active and user.check_password(password)
+    except PasswordHasherBusy:
+        return api_error('Busy, retry shortly', 503)
+    if not authenticated:
+        login_throttle.failed(username)
+        return api_error('Invalid credentials', 401)
+    login_throttle.succeeded(username)
+    
+    hotel_ids = []
+    if user.user_type == 'hotel_admin':
+        hotel_ids = [row[0] for row in db.session.query(Hotel.id).filter_by(owner_email=user.email)]
+    return json_response({
+        'success': True,
+        'token': api_tokens.issue(user.id, user.user_type, hotel_ids),
+        'token_type': 'Bearer',
+        'expires_in': api_tokens.max_age,
+    })
+
+@app.route('/api/v1/hotels')
+@api_auth()
+def api_hotels():
+    query = db.session.query(*api_columns(Hotel, API_HOTEL_FIELDS)).filter(Hotel.is_approved == True)
+    if request.args.get('location'):
+        query = query.filter(Hotel.location.ilike(f"%{request.args['location']}%"))
+    hotels, limit, offset = api_page(query.order_by(Hotel.id))
+    return json_response({'success': True, 'hotels': hotels, 'limit': limit, 'offset': offset})
+
+@app.route('/api/v1/hotels/<int:hotel_id>')
+@api_auth()
+def api_hotel(hotel_id):
+    row = db.session.query(Hotel.is_approved, *api_columns(Hotel, API_HOTEL_FIELDS)) \
+        .filter(Hotel.id == hotel_id).first()
+    if row is None or not (row.is_approved or api_can_manage(hotel_id)):
+        return api_error('Hotel not found', 404)
+    hotel = dict(row._mapping)
+    del hotel['is_approved']
+    return json_response({'success': True, 'hotel': hotel})
+
+@app.route('/api/v1/hotels/<int:hotel_id>/rooms')
+@api_auth()
+def api_hotel_rooms(hotel_id):
+    if not api_hotel_visible(hotel_id):
+        return api_error('Hotel not found', 404)
+    query = db.session.query(*api_columns(Room, API_ROOM_FIELDS)).filter(Room.hotel_id == hotel_id)
+    if not api_can_manage(hotel_id):
+        query = query.filter(Room.is_available == True)
+    rooms, limit, offset = api_page(query.order_by(Room.room_number))
+    return json_response({'success': True, 'rooms': rooms, 'limit': limit, 'offset': offset})
+
+@app.route('/api/v1/hotels/<int:hotel_id>/availability')
+@api_auth()
+def api_hotel_availability(hotel_id):
+    if not api_hotel_visible(hotel_id):
+        return api_error('Hotel not found', 404)
+    try:
+        check_in = datetime.strptime(request.args['check_in'], '%Y-%m-%d').date()
+        check_out = datetime.strptime(request.args['check_out'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return api_error('check_in and check_out (YYYY-MM-DD) are required', 400)
+    if check_in >= check_out:
+        return api_error('check_out must be after check_in', 400)
+    
+    unavailable = cached_unavailable_room_ids(hotel_id, check_in, check_out)
+    rooms = db.session.query(*api_columns(Room, API_ROOM_FIELDS, ('id', 'room_number', 'room_type',
+                                                                  'capacity', 'price_per_night'))) \
+        .filter(Room.hotel_id == hotel_id, Room.is_available == True, ~Room.id.in_(unavailable or [0])) \
+        .order_by(Room.room_number).all()
+    return json_response({
+        'success': True,
+        'hotel_id': hotel_id,
+        'check_in': check_in,
+        'check_out': check_out,
+        'nights': (check_out - check_in).days,
+        'rooms': [dict(row._mapping) for row in rooms],
+    })
+
+@app.route('/api/v1/bookings')
+@api_auth()
+def api_bookings():
+    """Customers see their own bookings, hotel admins their hotels', super admins everything"""
+    query = db.session.query(*api_columns(Booking, API_BOOKING_FIELDS))
+    if g.api['role'] == 'customer':
+        query = query.filter(Booking.customer_id == g.api['uid'])
+    elif g.api['role'] != 'super_admin':
+        query = query.filter(Booking.hotel_id.in_(g.api['hotels'] or [0]))
+    
+    if request.args.get('hotel_id', type=int):
+        query = query.filter(Booking.hotel_id == request.args.get('hotel_id', type=int))
+    if request.args.get('status'):
+        query = query.filter(Booking.status == request.args['status'])
+    bookings, limit, offset = api_page(query.order_by(Booking.booking_date.desc()))
+    return json_response({'success': True, 'bookings': bookings, 'limit': limit, 'offset': offset})
+
+QUOTE_MAX_ITEMS = 500
+QUOTE_MAX_NIGHTS = 30
+QUOTE_ITEMS_PER_TOKEN = 25  # a full 500-stay request drains the caller's whole bucket
+
+def parse_quote_item(item):
+    """(hotel_id, room_id, check_in, check_out, guests) from one /api/quotes entry, or raise ValueError"""
+    hotel_id = int(item['hotel_id'])
+    room_id = int(item['room_id']) if item.get('room_id') else None
+    check_in = datetime.strptime(item['check_in'], '%Y-%m-%d').date()
+    check_out = datetime.strptime(item['check_out'], '%Y-%m-%d').date()
+    guests = int(item.get('guests') or 1)
+    if check_in >= check_out or guests < 1:
+        raise ValueError('check_out must be after check_in and guests at least 1')
+    today = datetime.now().date()
+    if check_in < today or check_in >= today + timedelta(days=HORIZON_DAYS):
+        raise ValueError(f'check_in must be between today and {HORIZON_DAYS} days ahead')
+    if (check_out - check_in).days > QUOTE_MAX_NIGHTS:
+        raise ValueError(f'at most {QUOTE_MAX_NIGHTS} nights per stay')
+    return hotel_id, room_id, check_in, check_out, guests
+
+@app.route('/api/quotes', methods=['POST'])
+def api_quotes():
+    """Availability and price for many stays at once, in a fixed number of queries.
+    
+    Body: {"stays": [{"hotel_id": 4, "room_id": 10 (optional), "check_in": "2026-12-20",
+                      "check_out": "2026-12-23", "guests": 2}, ...]}
+    Without room_id the cheapest free room that fits the guests is quoted.
+    """
+    stays = (request.get_json(silent=True) or {}).get('stays')
+    if not isinstance(stays, list) or not stays:
+        return api_error('stays must be a non-empty list', 400)
+    if len(stays) > QUOTE_MAX_ITEMS:
+        return api_error(f'At most {QUOTE_MAX_ITEMS} stays per request', 400)
+    
+    # anonymous endpoint: throttled per client address, weighted by the number of stays
+    allowed, retry_after = cache.token_bucket(f"quotes:{request.remote_addr}", rate=5, capacity=20,
+                                              cost=-(-len(stays) // QUOTE_ITEMS_PER_TOKEN))
+    if not allowed:
+        response = api_error('Too many requests', 429)
+        response.headers['Retry-After'] = str(int(retry_after) + 1)
+        return response
+    
+    parsed, results = [], [None] * len(stays)
+    for index, item in enumerate(stays):
+        try:
+            parsed.append((index, *parse_quote_item(item)))
+        except (KeyError, TypeError, ValueError) as e:
+            results[index] = {'index': index, 'available': False, 'error': f'Invalid stay: {e}'}
+    
+    if parsed:
+        hotel_ids = {p[1] for p in parsed}
+        first_night = min(p[3] for p in parsed)
+        last_night = max(p[4] for p in parsed)
+        
+        # 1-3: rooms, hotel-level prices and active rules for every hotel involved
+        rooms_by_hotel = {}
+        for room in db.session.query(Room.id, Room.hotel_id, Room.room_type, Room.capacity,
+                                     Room.price_per_night, Room.is_available).filter(Room.hotel_id.in_(hotel_ids)):
+            rooms_by_hotel.setdefault(room.hotel_id, []).append(room)
+        hotel_prices, hotel_versions = {}, {}
+        for row in db.session.query(Hotel.id, Hotel.price_per_night, Hotel.rates_version).filter(
+                Hotel.id.in_(hotel_ids), Hotel.is_approved == True):
+            hotel_prices[row.id], hotel_versions[row.id] = row.price_per_night, row.rates_version
+        rules_by_hotel = {}
+        for rule in RateRule.query.filter(RateRule.hotel_id.in_(hotel_ids), RateRule.is_active == True):
+            rules_by_hotel.setdefault(rule.hotel_id, []).append(rule.as_rule())
+        
+        # 4-6: everything that occupies or holds a room anywhere in the requested window
+        busy = {}
+        for row in db.session.query(Booking.room_id, Booking.check_in_date, Booking.check_out_date).filter(
+                Booking.hotel_id.in_(hotel_ids), Booking.status == 'confirmed',
+                Booking.check_in_date < last_night, Booking.check_out_date > first_night):
+            busy.setdefault(row.room_id, []).append((row.check_in_date, row.check_out_date))
+        for row in db.session.query(BookingCalendar.room_id, BookingCalendar.date).filter(
+                BookingCalendar.hotel_id.in_(hotel_ids), BookingCalendar.status == 'blocked',
+                BookingCalendar.date >= first_night, BookingCalendar.date < last_night):
+            busy.setdefault(row.room_id, []).append((row.date, row.date + timedelta(days=1)))
+        for row in db.session.query(WaitlistEntry.held_room_id, WaitlistEntry.check_in_date,
+                                    WaitlistEntry.check_out_date).filter(
+                WaitlistEntry.hotel_id.in_(hotel_ids), WaitlistEntry.status == 'held',
+                WaitlistEntry.hold_expires_at > datetime.utcnow(),
+                WaitlistEntry.check_in_date < last_night, WaitlistEntry.check_out_date > first_night):
+            busy.setdefault(row.held_room_id, []).append((row.check_in_date, row.check_out_date))
+        
+        def is_free(room_id, check_in, check_out):
+            return not any(start < check_out and end > check_in for start, end in busy.get(room_id, ()))
+        
+        calendars = {}
+        def calendar_for(hotel_id, check_in, check_out):
+            if hotel_id not in calendars:
+                rooms = [(r.id, r.room_type, r.price_per_night) for r in rooms_by_hotel.get(hotel_id, [])]
+                rooms.append((HOTEL_KEY, None, hotel_prices[hotel_id]))
+                version = hotel_versions[hotel_id]
+                calendars[hotel_id] = (rate_engine.cached(hotel_id, version) or
+                                       rate_engine.build(hotel_id, rooms, rules_by_hotel.get(hotel_id, []), version),
+                                       rooms)
+            calendar, rooms = calendars[hotel_id]
+            if calendar.covers(check_in, check_out):
+                return calendar
+            # beyond the precomputed horizon: price from the inputs already loaded
+            start = min(check_in, calendar.start)
+            return build_rate_calendar(start, rooms, rules_by_hotel.get(hotel_id, []), (check_out - start).days)
+        
+        # pick a room per stay, then price all picks per hotel in one vectorised call
+        picks = {}
+        for index, hotel_id, room_id, check_in, check_out, guests in parsed:
+            if hotel_id not in hotel_prices:
+                results[index] = {'index': index, 'hotel_id': hotel_id, 'available': False, 'error': 'Unknown hotel'}
+                continue
+            bookable = [r for r in rooms_by_hotel.get(hotel_id, []) if r.is_available
+                        and (room_id is None or r.id == room_id)]
+            candidates = [r for r in bookable if r.capacity >= guests]
+            free = [r for r in candidates if is_free(r.id, check_in, check_out)]
+            if not free:
+                if not bookable:
+                    # book_hotel refuses hotels without rooms too
+                    error = 'Room not found' if room_id is not None else 'Hotel has no rooms to book'
+                elif not candidates:
+                    most = max(r.capacity for r in bookable)
+                    error = f'Room holds {most} guests' if room_id is not None else f'Rooms hold at most {most} guests'
+                else:
+                    error = 'No room available'
+                results[index] = {'index': index, 'hotel_id': hotel_id, 'room_id': room_id, 'available': False,
+                                  'error': error}
+                continue
+            calendar = calendar_for(hotel_id, check_in, check_out)
+            if room_id is None and len(free) > 1:
+                _, _, totals = calendar.stay_totals([r.id for r in free], [check_in] * len(free), [check_out] * len(free))
+                chosen = free[int(totals.argmin())]
+            else:
+                chosen = free[0]
+            picks.setdefault(id(calendar), (calendar, []))[1].append((index, hotel_id, chosen.id, check_in, check_out))
+        
+        for calendar, items in picks.values():
+            subtotal, discount, total = calendar.stay_totals([i[2] for i in items], [i[3] for i in items],
+                                                             [i[4] for i in items])
+            for n, (index, hotel_id, room_id, check_in, check_out) in enumerate(items):
+                results[index] = {
+                    'index': index,
+                    'hotel_id': hotel_id,
+                    'room_id': room_id,
+                    'available': True,
+                    'check_in': check_in,
+                    'check_out': check_out,
+                    'nights': (check_out - check_in).days,
+                    'nightly': calendar.nightly(room_id, check_in, check_out),
+                    'subtotal': round(float(subtotal[n]), 2),
+                    'discount_percent': float(discount[n]),
+                    'total': float(total[n]),
+                }
+    
+    return json_response({'success': True, 'quotes': results})
+
 # ... (rest of your routes remain the same)
 
 # Main execution
@@ -2,12 +2,15 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from auth import auth_bp
 import re
+from login_throttle import login_throttle
+from password_hashing import PasswordHasherBusy
 
 
 # Import your models and db instance from main app
-from app import db, login_manager
+from app import db, login_manager, DUPLICATE_USER_MESSAGES, duplicate_user_field
 from models import User
 
 # Register the blueprint
@@ -54,9 +57,24 @@ def login():
             flash('කරුණාකර සියලුම ක්ෂේත්ර පුරවන්න.', 'danger')
             return render_template('auth/login.html')
         
+        wait = login_throttle.check(username, request.remote_addr)
+        if wait:
+            flash(f'පිවිසුම් උත්සාහයන් වැඩියි. කරුණාකර තත්පර {int(wait) + 1} කින් නැවත උත්සාහ කරන්න.', 'warning')
+            return render_template('auth/login.html')
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password) and user.is_active:
+        try:
+            authenticated = user and user.check_password(password) and user.is_active
+            if authenticated and user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+        except PasswordHasherBusy:
+            flash('පද්ධතිය කාර්යබහුලයි. කරුණාකර මොහොතකින් නැවත උත්සාහ කරන්න.', 'warning')
+            return render_template('auth/login.html')
+        
+        if authenticated:
+            login_throttle.succeeded(username)
             login_user(user)
             flash('සාර්ථකව පිවිසිය!', 'success')
             
@@ -66,6 +84,7 @@ def login():
                 return redirect(next_page)
             return redirect(url_for('main.dashboard'))
         else:
+            login_throttle.failed(username)
             flash('පිවිසීම අසාර්ථකයි. කරුණාකර පරිශීලක නාමය සහ මුරපදය පරීක්ෂා කරන්න.', 'danger')
     
     return render_template('auth/login.html')
@@ -106,13 +125,6 @@ def register():
         if user_type not in ['hotel_admin', 'customer']:
             errors.append('කරුණාකර වලංගු ගිණුම් වර්ගයක් තෝරන්න.')
         
-        # Check if user exists
-        if User.query.filter_by(username=username).first():
-            errors.append('මෙම පරිශීලක නාමය දැනටමත් භාවිතා කර ඇත.')
-        
-        if User.query.filter_by(email=email).first():
-            errors.append('මෙම ඊමේල් ලිපිනය දැනටමත් භාවිතා කර ඇත.')
-        
         if errors:
             for error in errors:
                 flash(error, 'danger')
@@ -131,7 +143,16 @@ def register():
             phone=phone,
             user_type=user_type
         )
-        user.set_password(password)
+        try:
+            user.set_password(password)
+        except PasswordHasherBusy:
+            flash('පද්ධතිය කාර්යබහුලයි. කරුණාකර මොහොතකින් නැවත උත්සාහ කරන්න.', 'warning')
+            return render_template('auth/register.html',
+                                username=username,
+                                email=email,
+                                full_name=full_name,
+                                phone=phone,
+                                user_type=user_type)
         
         try:
             db.session.add(user)
@@ -143,6 +164,18 @@ def register():
             flash('ඔබගේ ගිණුම සාර්ථකව නිර්මාණය කරන ලදී!', 'success')
             return redirect(url_for('main.dashboard'))
             
+        except IntegrityError as e:
+            # username/email uniqueness comes from the table constraints
+            db.session.rollback()
+            flash(DUPLICATE_USER_MESSAGES.get(duplicate_user_field(e),
+                                              'ලියාපදිංචි වීමේ දෝෂයක්. කරුණාකර පසුව උත්සාහ කරන්න.'), 'danger')
+            return render_template('auth/register.html',
+                                username=username,
+                                email=email,
+                                full_name=full_name,
+                                phone=phone,
+                                user_type=user_type)
+        
         except Exception as e:
             db.session.rollback()
             flash('ලියාපදිංචි වීමේ දෝෂයක්. කරුණාකර පසුව උත්සාහ කරන්න.', 'danger')
@@ -178,7 +211,12 @@ def change_password():
             flash('කරුණාකර සියලුම ක්ෂේත්ර පුරවන්න.', 'danger')
             return render_template('auth/change_password.html')
         
-        if not current_user.check_password(current_password):
+        try:
+            password_matches = current_user.check_password(current_password)
+        except PasswordHasherBusy:
+            flash('පද්ධතිය කාර්යබහුලයි. කරුණාකර මොහොතකින් නැවත උත්සාහ කරන්න.', 'warning')
+            return render_template('auth/change_password.html')
+        if not password_matches:
             flash('වත්මන් මුරපදය වැරදියි.', 'danger')
             return render_template('auth/change_password.html')
         
@@ -196,7 +234,11 @@ def change_password():
             return render_template('auth/change_password.html')
         
         # Update password
-        current_user.set_password(new_password)
+        try:
+            current_user.set_password(new_password)
+        except PasswordHasherBusy:
+            flash('පද්ධතිය කාර්යබහුලයි. කරුණාකර මොහොතකින් නැවත උත්සාහ කරන්න.', 'warning')
+            return render_template('auth/change_password.html')
         db.session.commit()
         
         flash('මුරපදය සාර්ථකව වෙනස් කරන ලදී!', 'success')
@@ -574,17 +616,11 @@ def book_hotel(hotel_id):
         
         db.session.commit()
         
-        # Send WhatsApp notifications
-        try:
-            # To hotel owner
-            whatsapp_service.send_booking_notification_to_owner(hotel, booking, current_user)
-            
-            # To customer
-            whatsapp_service.send_booking_confirmation_to_customer(hotel, booking)
-            
-            flash('බුකින්ග් සාර්ථකයි! WhatsApp දන්වීම් යවන ලදී.', 'success')
-        except Exception as e:
-            flash(f'බුකින්ග් සාර්ථකයි! (WhatsApp දෝෂය: {e})', 'warning')
+        # Send WhatsApp notifications (queued; failures are retried and dead-lettered)
+        whatsapp_service.send_booking_notification_to_owner(hotel, booking, current_user)
+        whatsapp_service.send_booking_confirmation_to_customer(hotel, booking)
+        
+        flash('බුකින්ග් සාර්ථකයි! WhatsApp දන්වීම් යවන ලදී.', 'success')
         
         return redirect(url_for('my_bookings'))
     
@@ -1,7 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, TextAreaField, FloatField, IntegerField
 from wtforms.validators import DataRequired, Length, Email, EqualTo, ValidationError
-from app.models import User
 
 class LoginForm(FlaskForm):
     username = StringField('පරිශීලක නාමය', validators=[DataRequired()])
@@ -21,16 +20,8 @@ class RegistrationForm(FlaskForm):
                            choices=[('hotel_admin', 'හොටෙල් අයිතිකරු'), ('customer', 'ගනුදෙනුකරු')],
                            validators=[DataRequired()])
     submit = SubmitField('ලියාපදිංචි වන්න')
-    
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('මෙම පරිශීලක නාමය දැනටමත් භාවිතා කර ඇත.')
-    
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('මෙම ඊමේල් ලිපිනය දැනටමත් භාවිතා කර ඇත.')
+    # no username/email lookups: the register view inserts and reports the unique
+    # constraint an IntegrityError names
 
 class HotelForm(FlaskForm):
     name = StringField('හොටෙල් නම', validators=[DataRequired()])
@@ -1,6 +1,6 @@
 from app import db, login_manager
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import password_hasher
 from datetime import datetime
 
 @login_manager.user_loader
@@ -22,10 +22,13 @@ class User(UserMixin, db.Model):
     hotel_id = db.Column(db.Integer, nullable=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f"<User(username='{self.username}', type='{self.user_type}')>"
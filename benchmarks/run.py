@@ -0,0 +1,360 @@
+"""
+Route benchmarks
+Seeds a synthetic dataset once (the same generator as `flask seed-synthetic`),
+then drives the hot routes against a fresh copy of it, either in-process through
+the Flask test client or over HTTP against gunicorn workers. Reports latency
+percentiles, throughput and SQL statements per request, and compares them with
+benchmarks/baseline.json so regressions stand out.
+
+    python benchmarks/run.py --dataset small
+    CACHE_URL=redis://localhost:6379/1 python benchmarks/run.py --dataset medium --gunicorn --workers 4 --concurrency 8
+    python benchmarks/run.py --dataset small --save-baseline
+
+Exits with status 1 when a route runs more SQL per request than the baseline.
+Latency is machine-dependent, so p95 changes are only reported unless
+--check-latency is given (use it against a baseline saved on the same machine).
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DATA_DIR = os.path.join(HERE, '.data')
+BASELINE_PATH = os.path.join(HERE, 'baseline.json')
+
+DATASETS = {
+    'small': {'hotels': 50, 'rooms': 1000, 'users': 2000, 'bookings': 20000},
+    'medium': {'hotels': 1000, 'rooms': 20000, 'users': 100000, 'bookings': 1000000},
+    'large': {'hotels': 10000, 'rooms': 200000, 'users': 1000000, 'bookings': 10000000},
+}
+
+OWNER = ('bench_owner', 'bench123')
+ADMIN = ('superadmin', 'admin123')
+
+
+def default_anchor():
+    """First day of the current month: the cached dataset is reused all month, yet keeps future bookings"""
+    return date.today().replace(day=1)
+
+
+def seed_dataset(name, seed, anchor):
+    """Path of the seeded SQLite file, building it on first use (large takes several minutes)"""
+    path = os.path.join(DATA_DIR, f"{name}-{seed}-{anchor.isoformat()}.db")
+    if os.path.exists(path):
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for stale in glob.glob(os.path.join(DATA_DIR, f"{name}-{seed}-*.db")):
+        os.remove(stale)  # an older anchor's copy
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    env = {**os.environ, 'DATABASE_URL': f'sqlite:///{partial}', 'WHATSAPP_API_KEY': ''}
+    print(f"🌱 Seeding {name} dataset into {path}")
+    subprocess.run([sys.executable, '-c', 'import app; app.init_db()'], cwd=ROOT, env=env, check=True)
+    volumes = [f"--{table}={count}" for table, count in DATASETS[name].items()]
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'seed-synthetic', *volumes,
+                    f'--seed={seed}', f'--anchor={anchor.isoformat()}'], cwd=ROOT, env=env, check=True)
+    os.replace(partial, path)
+    return path
+
+
+def prepare_fixtures(app_module):
+    """Pick the busiest synthetic hotel and give it a hotel admin; returns ids and logins"""
+    A = app_module
+    with A.app.app_context():
+        A.upgrade_schema()  # datasets cached before a model change
+        synthetic = A.db.session.query(A.Hotel.id).filter(A.Hotel.owner_email.like(f'%@{A.SYNTHETIC_DOMAIN}'))
+        hotel_id = A.db.session.query(A.Booking.hotel_id).filter(A.Booking.hotel_id.in_(synthetic)) \
+            .group_by(A.Booking.hotel_id).order_by(A.db.func.count(A.Booking.id).desc()).limit(1).scalar()
+        hotel = A.db.session.get(A.Hotel, hotel_id)
+        room_ids = [row[0] for row in A.db.session.query(A.Room.id).filter_by(hotel_id=hotel_id).order_by(A.Room.id)]
+
+        owner = A.User.query.filter_by(username=OWNER[0]).first()
+        if owner is None:
+            owner = A.User(username=OWNER[0], email=hotel.owner_email, user_type='hotel_admin',
+                           full_name='Benchmark Owner')
+            owner.set_password(OWNER[1])
+            A.db.session.add(owner)
+        owner.email = hotel.owner_email
+        A.db.session.commit()
+        A.db.session.remove()
+
+    return {
+        'hotel_id': hotel_id,
+        'room_ids': room_ids,
+        'users': {'customer': ('synthetic1', A.SYNTHETIC_PASSWORD), 'owner': OWNER, 'admin': ADMIN},
+    }
+
+
+def scenarios(fixtures):
+    """(name, user, request(i) -> (method, path, options)); user None means anonymous"""
+    hotel_id, room_ids = fixtures['hotel_id'], fixtures['room_ids']
+    today = date.today()
+
+    def get(path):
+        return lambda i: ('GET', path, {})
+
+    def book(i):
+        # past the seeded bookings (anchor + 365 days) but inside the rate horizon, and never the same
+        # room twice for the same nights: every request takes the successful write path
+        rounds = i // max(len(room_ids), 1)
+        check_in = today + timedelta(days=400 + 2 * (rounds % 70))
+        return 'POST', f'/book_hotel/{hotel_id}', {'data': {
+            'check_in_date': check_in.isoformat(),
+            'check_out_date': (check_in + timedelta(days=2)).isoformat(),
+            'guest_name': f'Benchmark Guest {i}',
+            'guest_phone': '0770000000',
+            'room_id': str(room_ids[i % len(room_ids)]) if room_ids else '',
+        }}
+
+    def update_calendar(i):
+        return 'POST', '/api/calendar/update', {'json': {
+            'hotel_id': hotel_id,
+            'room_id': room_ids[i % len(room_ids)] if room_ids else None,
+            'date': (today + timedelta(days=i % 90)).isoformat(),
+            'status': 'blocked' if (i // 90) % 2 == 0 else 'available',
+        }}
+
+    return [
+        ('home', None, get('/')),
+        ('view_hotels', None, get('/hotels')),
+        ('hotel_details', None, get(f'/hotel/{hotel_id}')),
+        ('book_hotel POST', 'customer', book),
+        ('my_bookings', 'customer', get('/my_bookings')),
+        ('dashboard (customer)', 'customer', get('/dashboard')),
+        ('dashboard (hotel admin)', 'owner', get('/dashboard')),
+        ('dashboard (super admin)', 'admin', get('/dashboard')),
+        ('hotel_calendar', 'owner', get(f'/hotel/{hotel_id}/calendar')),
+        ('calendar update POST', 'owner', update_calendar),
+    ]
+
+
+class InProcessTarget:
+    """Flask test client; SQL statements are counted with an engine event listener"""
+
+    def __init__(self, app_module):
+        self.A = app_module
+        self.statements = 0
+        with self.A.app.app_context():
+            self.A.db.event.listen(self.A.db.engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.statements += 1
+
+    def client(self, login):
+        client = self.A.app.test_client()
+        if login:
+            response = client.post('/login', data={'username': login[0], 'password': login[1]})
+            if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+                raise SystemExit(f"Could not log in as {login[0]}")
+        return client
+
+    def request(self, client, method, path, options):
+        response = client.open(path, method=method, **options)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpTarget:
+    """gunicorn workers on a free local port, driven with requests; SQL counts come from X-SQL-Count"""
+
+    def __init__(self, database_url, workers, verbose=False):
+        import requests
+        self.requests = requests
+        self.statements = 0
+        self._lock = threading.Lock()
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        env = {**os.environ, 'DATABASE_URL': database_url, 'WHATSAPP_API_KEY': '', 'PROFILING': '1',
+               'PROFILING_HEADERS': '1'}
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}', 'app:app'],
+            cwd=ROOT, env=env, stdout=None if verbose else subprocess.DEVNULL)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                if self.process.poll() is not None:
+                    raise SystemExit('gunicorn exited during start-up')
+                time.sleep(0.2)
+        self.close()
+        raise SystemExit('gunicorn did not start listening within 60s')
+
+    def client(self, login):
+        session = self.requests.Session()
+        if login:
+            response = session.post(self.base_url + '/login', data={'username': login[0], 'password': login[1]},
+                                    allow_redirects=False)
+            if response.status_code != 302 or '/login' in response.headers.get('Location', ''):
+                raise SystemExit(f"Could not log in as {login[0]}")
+        return session
+
+    def request(self, client, method, path, options):
+        response = client.request(method, self.base_url + path, allow_redirects=False, **options)
+        with self._lock:
+            self.statements += int(response.headers.get('X-SQL-Count', 0))
+        return response.status_code
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def measure(target, fixtures, name, user, build, requests, warmup, concurrency):
+    login = fixtures['users'][user] if user else None
+    threads = max(1, concurrency if isinstance(target, HttpTarget) else 1)
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, 'client'):
+            local.client = target.client(login)
+        method, path, options = build(i)
+        started = time.perf_counter()
+        status = target.request(local.client, method, path, options)
+        return time.perf_counter() - started, status
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(call, range(warmup)))
+        statements_before = target.statements
+        started = time.perf_counter()
+        results = list(pool.map(call, range(warmup, warmup + requests)))
+        elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, status in results if status >= 400),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'rps': round(requests / elapsed, 1),
+        'sql': round((target.statements - statements_before) / requests, 1),
+    }
+
+
+def compare(result, baseline, tolerance, check_latency=False):
+    """(regressed, notes) for one route: more SQL per request always regresses; p95 beyond the
+    tolerance is only noted unless check_latency"""
+    if not baseline:
+        return False, []
+    regressed, notes = False, []
+    # a whole extra statement per request; fractions come from POSTs that sometimes insert and sometimes update
+    if baseline.get('sql') is not None and result['sql'] >= baseline['sql'] + 1:
+        regressed = True
+        notes.append(f"SQL {baseline['sql']} -> {result['sql']}")
+    if baseline['p95_ms'] and result['p95_ms'] > baseline['p95_ms'] * (1 + tolerance):
+        regressed = regressed or check_latency
+        notes.append(f"p95 {result['p95_ms'] / baseline['p95_ms']:.2f}x")
+    return regressed, notes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dataset', choices=DATASETS, default='small')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--anchor', type=date.fromisoformat, default=default_anchor(),
+                        help='Booking window centre for seeding (default the 1st of this month); '
+                             'a new anchor seeds a new file')
+    parser.add_argument('--reseed', action='store_true', help='Rebuild the cached dataset')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per route')
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--route', action='append', help='Only these routes (repeatable)')
+    parser.add_argument('--gunicorn', action='store_true', help='Drive gunicorn workers over HTTP')
+    parser.add_argument('--workers', type=int, default=1, help='More than one needs CACHE_URL (Redis)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads (gunicorn mode)')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='p95 slowdown reported against the baseline')
+    parser.add_argument('--check-latency', action='store_true',
+                        help='Also fail on p95 slowdowns (baseline must come from this machine)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--verbose', action='store_true', help="Show the app's own output while measuring")
+    parser.add_argument('--output', help='Also write the results as JSON to this path')
+    args = parser.parse_args()
+
+    if args.reseed:
+        stale = os.path.join(DATA_DIR, f"{args.dataset}-{args.seed}-{args.anchor.isoformat()}.db")
+        if os.path.exists(stale):
+            os.remove(stale)
+    seeded = seed_dataset(args.dataset, args.seed, args.anchor)
+
+    # every run starts from the same rows: bookings and calendar updates only touch the copy
+    workdir = tempfile.mkdtemp(prefix='hotel-bench-')
+    database = os.path.join(workdir, 'bench.db')
+    shutil.copyfile(seeded, database)
+    os.environ['DATABASE_URL'] = f'sqlite:///{database}'
+    os.environ['WHATSAPP_API_KEY'] = ''
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    fixtures = prepare_fixtures(app_module)
+    mode = 'gunicorn' if args.gunicorn else 'inprocess'
+    target = HttpTarget(os.environ['DATABASE_URL'], args.workers, args.verbose) if args.gunicorn else InProcessTarget(app_module)
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(args.dataset, {}).get(mode, {})
+
+    results, regressed = {}, []
+    print(f"\n{args.dataset} dataset, {mode}, {args.requests} requests per route\n")
+    print(f"{'route':<26}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'SQL/req':>9}{'errors':>8}  vs baseline")
+    try:
+        for name, user, build in scenarios(fixtures):
+            if args.route and name not in args.route:
+                continue
+            with open(os.devnull, 'w') as quiet, contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+                # the app prints every notification it would send; keep the table readable
+                result = measure(target, fixtures, name, user, build, args.requests, args.warmup, args.concurrency)
+            results[name] = result
+            failed, notes = compare(result, baseline.get(name), args.tolerance, args.check_latency)
+            if failed:
+                regressed.append(name)
+            status = ', '.join(notes) if notes else ('ok' if name in baseline else '-')
+            print(f"{name:<26}{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+                  f"{result['rps']:>9}{result['sql']:>9}{result['errors']:>8}  {status}")
+    finally:
+        target.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'dataset': args.dataset, 'mode': mode, 'results': results}, f, indent=2)
+            f.write('\n')
+    if args.save_baseline:
+        baselines.setdefault(args.dataset, {}).setdefault(mode, {}).update(results)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\n💾 Baseline saved to {BASELINE_PATH}")
+    elif regressed:
+        print(f"\n⚠️ {len(regressed)} route(s) regressed: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
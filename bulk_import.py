@@ -0,0 +1,200 @@
+"""
+Bulk data import
+Reads hotels, rooms and bookings from CSV or JSON (an array or JSON lines),
+checks every row against a field spec and reports problems by row number, so
+clean rows can be written in large batches instead of one commit per record
+"""
+
+import csv
+import io
+import itertools
+import json
+from datetime import datetime
+
+
+class RowError:
+    def __init__(self, row, field, message):
+        self.row = row
+        self.field = field
+        self.message = message
+
+    def __repr__(self):
+        return f"row {self.row}: {self.field + ': ' if self.field else ''}{self.message}"
+
+
+def text(max_length):
+    def parse(value):
+        value = str(value).strip()
+        if len(value) > max_length:
+            raise ValueError(f'longer than {max_length} characters')
+        return value
+    return parse
+
+
+def integer(minimum=None):
+    def parse(value):
+        number = int(str(value).strip())
+        if minimum is not None and number < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        return number
+    return parse
+
+
+def number(minimum=None):
+    def parse(value):
+        result = float(str(value).strip().replace(',', ''))
+        if minimum is not None and result < minimum:
+            raise ValueError(f'must be at least {minimum}')
+        return result
+    return parse
+
+
+def boolean(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ('1', 'true', 'yes', 'y'):
+        return True
+    if value in ('0', 'false', 'no', 'n'):
+        return False
+    raise ValueError('expected true or false')
+
+
+def iso_date(value):
+    return datetime.strptime(str(value).strip(), '%Y-%m-%d').date()
+
+
+def iso_datetime(value):
+    return datetime.fromisoformat(str(value).strip())
+
+
+def one_of(*choices):
+    def parse(value):
+        value = str(value).strip().lower()
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}")
+        return value
+    return parse
+
+
+class Field:
+    def __init__(self, name, parse, required=False, default=None):
+        self.name = name
+        self.parse = parse
+        self.required = required
+        self.default = default
+
+
+# hotel / room references are resolved against the database by the caller
+HOTEL_FIELDS = [
+    Field('name', text(100), required=True),
+    Field('location', text(200), required=True),
+    Field('description', text(10000)),
+    Field('owner_name', text(100)),
+    Field('owner_email', text(100)),
+    Field('contact_number', text(20)),
+    Field('whatsapp_number', text(20)),
+    Field('price_per_night', number(0), required=True),
+    Field('total_rooms', integer(0), required=True),
+    Field('available_rooms', integer(0)),
+    Field('amenities', text(10000)),
+    Field('hotel_type', one_of('hotel', 'villa', 'resort'), default='hotel'),
+    Field('image_path', text(255)),
+    Field('is_approved', boolean, default=True),
+]
+
+ROOM_FIELDS = [
+    Field('hotel_id', integer(1)),
+    Field('hotel', text(100)),
+    Field('room_number', text(10), required=True),
+    Field('room_type', text(50)),
+    Field('capacity', integer(1), required=True),
+    Field('price_per_night', number(0), required=True),
+    Field('is_available', boolean, default=True),
+    Field('features', text(10000)),
+]
+
+BOOKING_FIELDS = [
+    Field('hotel_id', integer(1)),
+    Field('hotel', text(100)),
+    Field('room_number', text(10)),
+    Field('guest_name', text(100), required=True),
+    Field('guest_email', text(100)),
+    Field('guest_phone', text(20)),
+    Field('guest_whatsapp', text(20)),
+    Field('check_in_date', iso_date, required=True),
+    Field('check_out_date', iso_date, required=True),
+    Field('total_price', number(0), required=True),
+    Field('status', one_of('confirmed', 'cancelled'), default='confirmed'),
+    Field('booking_date', iso_datetime),
+]
+
+
+def check_hotel(row):
+    if row['available_rooms'] is not None and row['available_rooms'] > row['total_rooms']:
+        yield 'available_rooms', 'more than total_rooms'
+
+
+def check_hotel_reference(row):
+    if row['hotel_id'] is None and not row['hotel']:
+        yield 'hotel', 'hotel_id or hotel (name) is required'
+
+
+def check_booking(row):
+    yield from check_hotel_reference(row)
+    if row['check_out_date'] <= row['check_in_date']:
+        yield 'check_out_date', 'must be after check_in_date'
+
+
+SPECS = {
+    'hotels': (HOTEL_FIELDS, check_hotel),
+    'rooms': (ROOM_FIELDS, check_hotel_reference),
+    'bookings': (BOOKING_FIELDS, check_booking),
+}
+
+
+def detect_format(filename):
+    return 'json' if filename.lower().endswith(('.json', '.jsonl', '.ndjson')) else 'csv'
+
+
+def read_records(stream, fmt):
+    """Dicts from a binary or text stream; CSV headers are the field names"""
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        yield from json.loads(first + stream.read())
+        return
+    for line in itertools.chain([first + stream.readline()], stream):
+        if line.strip():
+            yield json.loads(line)
+
+
+def validate(kind, records):
+    """Yield (row_number, clean_row or None, [RowError]) in file order; row 1 is the first data row"""
+    fields, check = SPECS[kind]
+    for row_number, record in enumerate(records, 1):
+        if not isinstance(record, dict):
+            yield row_number, None, [RowError(row_number, None, 'not an object')]
+            continue
+        clean, errors = {}, []
+        for field in fields:
+            value = record.get(field.name)
+            if value is None or (isinstance(value, str) and not value.strip()):
+                if field.required:
+                    errors.append(RowError(row_number, field.name, 'is required'))
+                clean[field.name] = field.default
+                continue
+            try:
+                clean[field.name] = field.parse(value)
+            except (TypeError, ValueError) as e:
+                errors.append(RowError(row_number, field.name, str(e) or 'invalid value'))
+        if not errors:
+            errors = [RowError(row_number, name, message) for name, message in check(clean)]
+        yield row_number, (None if errors else clean), errors
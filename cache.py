@@ -0,0 +1,192 @@
+"""
+Shared cache backend
+Redis when CACHE_URL/REDIS_URL is set (so every gunicorn worker sees the same
+counters), otherwise an in-process store that is only shared between threads.
+The in-process store is for a single worker: with several, throttle counts and
+cached versions differ per worker, so gunicorn.conf.py refuses to start them
+without Redis
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    """Thread-safe in-process cache; each worker process has its own copy.
+    Bounded: expired keys are swept every sweep_interval seconds, and past max_entries
+    the least recently used key is evicted"""
+
+    shared = False
+
+    def __init__(self, max_entries=10000, sweep_interval=60):
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_sweep = time.time() + sweep_interval
+
+    def _alive(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def _store(self, key, item, now):
+        self._data[key] = item
+        self._data.move_to_end(key)
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            for expired in [k for k, (_, expires_at) in self._data.items()
+                            if expires_at is not None and expires_at <= now]:
+                del self._data[expired]
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            item = self._alive(key, time.time())
+            return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            now = time.time()
+            self._store(key, (value, now + ttl if ttl else None), now)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def incr(self, key, ttl=None):
+        """Increment a counter; ttl is applied when the counter is created"""
+        with self._lock:
+            now = time.time()
+            item = self._alive(key, now)
+            if item is None:
+                value, expires_at = 1, (now + ttl if ttl else None)
+            else:
+                value, expires_at = item[0] + 1, item[1]
+            self._store(key, (value, expires_at), now)
+            return value
+
+    def ttl(self, key):
+        """Seconds until key expires, 0 if missing"""
+        with self._lock:
+            now = time.time()
+            item = self._alive(key, now)
+            if item is None:
+                return 0
+            return item[1] - now if item[1] is not None else float('inf')
+
+    def token_bucket(self, key, rate, capacity, cost=1):
+        """Take cost tokens from the bucket -> (allowed, retry_after_seconds)"""
+        with self._lock:
+            now = time.time()
+            item = self._alive(key, now)
+            tokens, updated = item[0] if item else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._store(key, ((tokens, now), now + capacity / rate), now)
+            return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+# KEYS[1] bucket; ARGV rate, capacity, cost, now -> {allowed, retry_after * 1000}
+TOKEN_BUCKET_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local rate, capacity, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+if allowed == 1 then return {1, 0} end
+return {0, math.ceil((cost - tokens) / rate * 1000)}
+"""
+
+
+class RedisCache:
+    """Cache backed by Redis; operations are atomic across workers and hosts"""
+
+    shared = True
+
+    def __init__(self, url, prefix='hotel:'):
+        import redis  # optional dependency, only needed when a cache URL is configured
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._token_bucket = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*(self.prefix + key for key in keys))
+
+    def incr(self, key, ttl=None):
+        pipe = self.client.pipeline()
+        if ttl:
+            pipe.set(self.prefix + key, 0, ex=int(ttl), nx=True)  # start the window only once
+        pipe.incr(self.prefix + key)
+        return pipe.execute()[-1]
+
+    def ttl(self, key):
+        remaining = self.client.pttl(self.prefix + key)
+        if remaining == -1:
+            return float('inf')
+        return max(remaining, 0) / 1000.0
+
+    def token_bucket(self, key, rate, capacity, cost=1):
+        allowed, retry_ms = self._token_bucket(keys=[self.prefix + key],
+                                               args=[rate, capacity, cost, time.time()])
+        return bool(allowed), retry_ms / 1000.0
+
+
+def create_cache(url=None):
+    url = url or os.environ.get('CACHE_URL') or os.environ.get('REDIS_URL')
+    if url:
+        return RedisCache(url)
+    return MemoryCache(max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 10000)))
+
+
+class LazyCache:
+    """Module-level handle that picks the backend on first use (after load_dotenv)"""
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+
+    def configure(self, url=None):
+        self._backend = create_cache(url)
+        return self._backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = create_cache()
+        return self._backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+cache = LazyCache()
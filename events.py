@@ -0,0 +1,56 @@
+"""
+Domain events
+In-process publish/subscribe so that, once a change is committed, caches and
+matchers hear exactly what moved instead of recomputing everything. With
+EVENTS_URL/REDIS_URL set, events are also published on a Redis channel for
+other workers and services to consume
+"""
+
+import json
+import os
+import threading
+from collections import defaultdict
+
+
+class EventBus:
+    """Synchronous local dispatch plus an optional Redis fan-out"""
+
+    def __init__(self, channel='hotel:events'):
+        self.channel = channel
+        self._handlers = defaultdict(list)
+        self._lock = threading.Lock()
+        self._redis = None
+
+    def configure_from_env(self):
+        url = os.environ.get('EVENTS_URL') or os.environ.get('REDIS_URL')
+        if url:
+            import redis  # optional dependency, only needed when events leave the process
+            self._redis = redis.Redis.from_url(url)
+        self.channel = os.environ.get('EVENTS_CHANNEL', self.channel)
+
+    def subscribe(self, topic, handler=None):
+        """Register handler(topic, payload) for a topic ('*' for every topic); usable as a decorator"""
+        def register(func):
+            with self._lock:
+                self._handlers[topic].append(func)
+            return func
+        return register(handler) if handler is not None else register
+
+    def publish(self, topic, **payload):
+        """Call local handlers, then fan out; a failing handler never undoes the committed change"""
+        with self._lock:
+            handlers = self._handlers.get(topic, []) + self._handlers.get('*', [])
+        for handler in handlers:
+            try:
+                handler(topic, payload)
+            except Exception as e:
+                print(f"⚠️ Event handler {getattr(handler, '__name__', handler)} failed for {topic}: {e}")
+
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.channel, json.dumps({'topic': topic, 'payload': payload}, default=str))
+            except Exception as e:
+                print(f"⚠️ Could not publish {topic} to {self.channel}: {e}")
+
+
+events = EventBus()
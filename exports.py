@@ -0,0 +1,81 @@
+"""
+Streaming exports
+Row iterables (typically a yield_per query) become CSV chunks as they are read,
+or an XLSX file written in xlsxwriter's constant-memory mode, so exporting any
+number of rows keeps worker memory flat
+"""
+
+import csv
+import io
+import os
+import tempfile
+
+try:
+    import xlsxwriter
+except ImportError:  # optional; only the XLSX export needs it
+    xlsxwriter = None
+
+CHUNK_ROWS = 1000
+FILE_CHUNK_BYTES = 64 * 1024
+# spreadsheet apps run cells starting with these as formulas (CSV injection)
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def safe_cell(value):
+    """Text that a spreadsheet would evaluate is prefixed with ' so it stays text"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(header, rows, chunk_rows=CHUNK_ROWS):
+    """Yield CSV text a chunk of rows at a time; the BOM lets Excel open Sinhala text as UTF-8"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for count, row in enumerate(rows, 1):
+        writer.writerow([safe_cell(value) for value in row])
+        if count % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def xlsx_stream(header, rows, sheet_name='Sheet1'):
+    """Chunks of an XLSX file; raises ExportUnavailable up front when XlsxWriter is missing"""
+    if xlsxwriter is None:
+        raise ExportUnavailable('XLSX export needs the XlsxWriter package')
+    return _xlsx_chunks(header, rows, sheet_name)
+
+
+def _xlsx_chunks(header, rows, sheet_name):
+    """Write rows to a temporary workbook in constant-memory mode, then yield the file"""
+    handle, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(handle)
+    try:
+        # constant_memory flushes each row to disk as soon as the next one starts
+        # customer text is written as text: never as a formula or a hyperlink
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd',
+                                              'tmpdir': tempfile.gettempdir(), 'strings_to_formulas': False,
+                                              'strings_to_urls': False})
+        worksheet = workbook.add_worksheet(sheet_name)
+        bold = workbook.add_format({'bold': True})
+        worksheet.write_row(0, 0, header, bold)
+        for index, row in enumerate(rows, 1):
+            worksheet.write_row(index, 0, row)
+        workbook.close()
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
@@ -0,0 +1,37 @@
+"""
+gunicorn settings, read automatically from the working directory
+With PROMETHEUS_MULTIPROC_DIR set, workers share metrics through files in that
+directory: start every server with it empty, and drop a worker's live gauges
+when the worker exits. More than one worker should share the Redis cache
+(CACHE_URL or REDIS_URL), or throttling, rate and availability caches drift apart
+per worker; set REQUIRE_SHARED_CACHE=1 to refuse to start without it
+"""
+
+import glob
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def on_starting(server):
+    if server.cfg.workers > 1 and not (os.environ.get('CACHE_URL') or os.environ.get('REDIS_URL')):
+        # WEB_CONCURRENCY is often set by the host, so this only fails when asked to
+        message = (f'{server.cfg.workers} workers without a shared cache: login throttling, rate and '
+                   'availability caches are per worker. Set CACHE_URL/REDIS_URL to a Redis server, '
+                   'or run a single worker')
+        if os.environ.get('REQUIRE_SHARED_CACHE') == '1':
+            raise RuntimeError(message)
+        server.log.warning(f"⚠️ {message}")
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
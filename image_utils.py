@@ -0,0 +1,273 @@
+"""
+Image upload helpers
+Uploads are hashed while Werkzeug streams them to disk and stored once per
+content hash outside the public folder; a process pool turns each stored
+original into EXIF-free WebP/JPEG variants that templates serve through srcset
+"""
+
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import Request
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+# Longest edge in pixels for each generated size
+VARIANT_SIZES = {'thumb': 320, 'medium': 800, 'large': 1600}
+VARIANT_FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+# Longest edge of the inline low-quality placeholder shown until the real image loads
+PLACEHOLDER_SIZE = 16
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadFile:
+    """Upload spool file that hashes the bytes as Werkzeug writes them"""
+
+    def __init__(self, directory):
+        self.file = tempfile.NamedTemporaryFile(dir=directory, prefix='upload_')
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def __iter__(self):
+        return iter(self.file)
+
+
+class UploadRequest(Request):
+    """Request class that spools file uploads straight into the hashing temp folder"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUploadFile(image_utils.tmp_folder)
+
+
+def make_placeholder(image):
+    """Tiny JPEG data URI of an already decoded, upright PIL image"""
+    from PIL import Image
+
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    tiny.convert('RGB').save(buffer, 'JPEG', quality=50)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def generate_placeholder(source_path):
+    """Placeholder for a stored original (used to backfill older uploads)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        original.seek(0)
+        return make_placeholder(ImageOps.exif_transpose(original))
+
+
+def generate_variants(source_path, output_dir, stem):
+    """Decode an upload and write resized, metadata-free variants (runs in a worker process)"""
+    from PIL import Image, ImageOps
+
+    os.makedirs(output_dir, exist_ok=True)
+    with Image.open(source_path) as original:
+        original.seek(0)  # first frame of animated GIF/WebP
+        # Bake the EXIF orientation into the pixels; EXIF itself is not written back
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        width, height = image.size
+
+        variants = {}
+        previous = None
+        for name, max_edge in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            if previous and (previous['width'], previous['height']) == resized.size:
+                # small uploads: don't write identical copies for the larger sizes
+                variants[name] = previous
+                continue
+            files = {}
+            for fmt, (pil_format, extension) in VARIANT_FORMATS.items():
+                filename = f"{stem}_{name}.{extension}"
+                target = resized if pil_format == 'WEBP' or resized.mode == 'RGB' else resized.convert('RGB')
+                options = {'quality': 80, 'method': 4} if pil_format == 'WEBP' else \
+                    {'quality': 82, 'optimize': True, 'progressive': True}
+                # write-then-rename so concurrent workers never serve a half-written file
+                temp_path = os.path.join(output_dir, f".{filename}.{os.getpid()}.tmp")
+                target.save(temp_path, pil_format, **options)
+                os.replace(temp_path, os.path.join(output_dir, filename))
+                files[fmt] = filename
+            variants[name] = previous = {'width': resized.width, 'height': resized.height, **files}
+
+        placeholder = make_placeholder(image)
+
+    return {'width': width, 'height': height, 'variants': variants, 'placeholder': placeholder}
+
+
+class ImageUtils:
+    """Content-addressed image storage with off-request variant generation"""
+
+    def __init__(self, upload_folder='static/uploads', originals_folder='uploads/originals',
+                 upload_url='/static/uploads', max_workers=None):
+        self.upload_folder = upload_folder
+        self.originals_folder = originals_folder
+        self.upload_url = upload_url
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.upload_folder = app.config.get('UPLOAD_FOLDER', self.upload_folder)
+        self.originals_folder = app.config.get('IMAGE_ORIGINALS_FOLDER', self.originals_folder)
+        self.upload_url = app.config.get('IMAGE_URL_PREFIX') or '/' + self.upload_folder.strip('/')
+        self.max_workers = app.config.get('IMAGE_WORKERS', self.max_workers)
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        app.request_class = UploadRequest
+
+    @property
+    def tmp_folder(self):
+        # same filesystem as the store, so finished uploads can be hard-linked into place
+        return os.path.join(self.originals_folder, '.tmp')
+
+    @property
+    def executor(self):
+        """Process pool, created lazily in each worker process"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                    self._executor_pid = pid
+                    self._in_flight = set()
+        return self._executor
+
+    def allowed_file(self, filename):
+        return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+    def original_path(self, content_hash):
+        return os.path.join(self.originals_folder, content_hash[:2], content_hash[2:4], content_hash)
+
+    def variant_folder(self, content_hash):
+        return os.path.join(self.upload_folder, 'cas', content_hash[:2])
+
+    def store_upload(self, file):
+        """Put an upload into content-addressed storage -> (sha256, size), or None if not an image"""
+        if not file or not file.filename or not self.allowed_file(file.filename):
+            return None
+
+        stream = file.stream
+        if isinstance(stream, HashingUploadFile):
+            stream.flush()
+            content_hash, size = stream.hexdigest(), stream.size
+            source, is_temp = stream.name, False
+        else:
+            # not spooled by UploadRequest: hash and copy in fixed-size chunks
+            hasher, size = hashlib.sha256(), 0
+            with tempfile.NamedTemporaryFile(dir=self.tmp_folder, prefix='upload_', delete=False) as temp:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+                    size += len(chunk)
+                    temp.write(chunk)
+            content_hash, source, is_temp = hasher.hexdigest(), temp.name, True
+
+        target = self.original_path(content_hash)
+        if os.path.exists(target):
+            if is_temp:
+                os.remove(source)
+            # refresh the mtime so the garbage collector's grace period covers this reuse
+            os.utime(target)
+            return content_hash, size
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            if is_temp:
+                os.replace(source, target)
+            else:
+                os.link(source, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            # hard links unsupported here: copy aside, then rename into place atomically
+            temp_target = f"{target}.{os.getpid()}.tmp"
+            shutil.copyfile(source, temp_target)
+            os.replace(temp_target, target)
+        return content_hash, size
+
+    def iter_stored_files(self):
+        """Yield (content_hash, path, stat) for stored originals and variants, walking lazily"""
+        for root in (self.originals_folder, os.path.join(self.upload_folder, 'cas')):
+            stack = [root]
+            while stack:
+                try:
+                    entries = os.scandir(stack.pop())
+                except FileNotFoundError:
+                    continue
+                with entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            # originals are named <hash>, variants <hash>_<size>.<ext>;
+                            # anything else (spool and partial files) gets an empty hash
+                            content_hash = entry.name[:64]
+                            if len(content_hash) != 64 or entry.name[64:65] not in ('', '_'):
+                                content_hash = ''
+                            yield content_hash, entry.path, entry.stat(follow_symlinks=False)
+
+    @property
+    def in_flight(self):
+        """Variant jobs submitted by this process and not finished yet"""
+        return len(self._in_flight)
+
+    def process_async(self, content_hash, callback):
+        """Queue variant generation once per hash; callback(future) runs in this process when done"""
+        executor = self.executor
+        with self._lock:
+            if content_hash in self._in_flight:
+                return None
+            self._in_flight.add(content_hash)
+
+        future = executor.submit(generate_variants, self.original_path(content_hash),
+                                 self.variant_folder(content_hash), content_hash)
+        future.add_done_callback(lambda f: self._in_flight.discard(content_hash))
+        future.add_done_callback(callback)
+        return future
+
+    def public_variants(self, result, content_hash):
+        """Turn generate_variants() filenames into public URLs"""
+        base_url = f"{self.upload_url}/cas/{content_hash[:2]}"
+        return {
+            name: {key: (f"{base_url}/{value}" if key in VARIANT_FORMATS else value)
+                   for key, value in variant.items()}
+            for name, variant in result['variants'].items()
+        }
+
+    def variant_url(self, variants, name='medium', fmt='jpeg'):
+        variants = json.loads(variants) if isinstance(variants, str) else (variants or {})
+        variant = variants.get(name) or {}
+        return variant.get(fmt)
+
+    def srcset(self, variants, fmt='jpeg'):
+        """'url 320w, url 800w, ...' for <img srcset> / <source srcset>"""
+        variants = json.loads(variants) if isinstance(variants, str) else (variants or {})
+        by_width = {variant['width']: variant[fmt] for variant in variants.values() if variant.get(fmt)}
+        return ", ".join(f"{url} {width}w" for width, url in sorted(by_width.items()))
+
+
+image_utils = ImageUtils()
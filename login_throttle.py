@@ -0,0 +1,63 @@
+"""
+Login brute-force throttling
+Per-IP and per-username token buckets plus a progressive lockout after repeated
+failures, all kept in the shared cache so every worker enforces the same limits.
+check() is a couple of cache round trips and runs before any password hashing.
+"""
+
+import os
+
+from cache import cache
+
+
+class LoginThrottle:
+    def __init__(self, ip_rate=10 / 60, ip_burst=20, user_rate=5 / 60, user_burst=10,
+                 free_failures=3, max_lockout=900, failure_window=3600):
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.free_failures = free_failures
+        self.max_lockout = max_lockout
+        self.failure_window = failure_window
+
+    def configure_from_env(self):
+        """LOGIN_IP_PER_MINUTE, LOGIN_USER_PER_MINUTE, LOGIN_FREE_FAILURES, LOGIN_MAX_LOCKOUT"""
+        self.ip_rate = float(os.environ.get('LOGIN_IP_PER_MINUTE', self.ip_rate * 60)) / 60
+        self.user_rate = float(os.environ.get('LOGIN_USER_PER_MINUTE', self.user_rate * 60)) / 60
+        self.free_failures = int(os.environ.get('LOGIN_FREE_FAILURES', self.free_failures))
+        self.max_lockout = int(os.environ.get('LOGIN_MAX_LOCKOUT', self.max_lockout))
+
+    @staticmethod
+    def _user_key(username):
+        return (username or '').strip().lower()
+
+    def check(self, username, ip):
+        """Spend one attempt -> seconds to wait, or 0 if the password may be checked"""
+        user = self._user_key(username)
+        locked_for = cache.ttl(f"login:lock:{user}")
+        if locked_for:
+            return locked_for
+
+        allowed, retry_after = cache.token_bucket(f"login:ip:{ip}", self.ip_rate, self.ip_burst)
+        if not allowed:
+            return retry_after
+        allowed, retry_after = cache.token_bucket(f"login:user:{user}", self.user_rate, self.user_burst)
+        return 0 if allowed else retry_after
+
+    def failed(self, username):
+        """Record a wrong password; delays double with every failure past the free ones"""
+        user = self._user_key(username)
+        failures = cache.incr(f"login:fail:{user}", ttl=self.failure_window)
+        if failures > self.free_failures:
+            delay = min(2 ** (failures - self.free_failures), self.max_lockout)
+            cache.set(f"login:lock:{user}", failures, ttl=delay)
+            return delay
+        return 0
+
+    def succeeded(self, username):
+        user = self._user_key(username)
+        cache.delete(f"login:fail:{user}", f"login:lock:{user}")
+
+
+login_throttle = LoginThrottle()
@@ -0,0 +1,137 @@
+"""
+Prometheus metrics
+Request latency per route, booking outcomes, cache hit/miss counts and capacity
+gauges (notification outbox, DB pool, image backlog) for /metrics. With
+PROMETHEUS_MULTIPROC_DIR set, every gunicorn worker writes its samples there and
+a scrape of any worker reports the whole server (see gunicorn.conf.py)
+"""
+
+import os
+import time
+
+from flask import g, request
+
+# seconds; booking POSTs and dashboards sit in the 10ms-1s range
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class MetricsUnavailable(Exception):
+    pass
+
+
+class _NoopMetric:
+    """Stands in for every metric until prometheus_client is configured"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+class Metrics:
+    def __init__(self, namespace='hotel'):
+        self.namespace = namespace
+        self.enabled = False
+        self.multiprocess = False
+        self._client = None
+        self._sampler = None
+        self.ignore = set()
+        noop = _NoopMetric()
+        self.request_latency = self.requests = noop
+        self.booking_attempts = self.booking_successes = self.booking_conflicts = noop
+        self.cache_lookups = noop
+        self.notification_queue = self.db_pool_checked_out = self.db_pool_size = noop
+        self.image_backlog = self.image_jobs_in_flight = noop
+
+    def configure_from_env(self):
+        """Create the metrics; runs after load_dotenv so PROMETHEUS_MULTIPROC_DIR from .env is honoured"""
+        if os.environ.get('METRICS', '1') == '0' or self.enabled:
+            return
+        try:
+            import prometheus_client  # optional; /metrics answers 503 without it
+        except ImportError:
+            return
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self._client = prometheus_client
+        self.multiprocess = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+        ns = self.namespace
+        self.request_latency = Histogram('http_request_duration_seconds', 'Request latency by route',
+                                         ['endpoint', 'method'], namespace=ns, buckets=LATENCY_BUCKETS)
+        self.requests = Counter('http_requests_total', 'Requests by route and status',
+                                ['endpoint', 'method', 'status'], namespace=ns)
+        self.booking_attempts = Counter('booking_attempts_total', 'Booking requests that reached the write',
+                                        ['kind'], namespace=ns)
+        self.booking_successes = Counter('booking_successes_total', 'Committed bookings', ['kind'], namespace=ns)
+        self.booking_conflicts = Counter('booking_conflicts_total',
+                                         'Bookings refused because the inventory was taken first', ['kind'],
+                                         namespace=ns)
+        self.cache_lookups = Counter('cache_lookups_total', 'Cache lookups by cache and result',
+                                     ['cache', 'result'], namespace=ns)
+        # per-process values: summed over live workers
+        self.notification_queue = Gauge('notification_queue_depth', 'WhatsApp messages waiting in the outbox',
+                                         namespace=ns, multiprocess_mode='livesum')
+        self.db_pool_checked_out = Gauge('db_pool_checked_out', 'Database connections in use',
+                                         namespace=ns, multiprocess_mode='livesum')
+        self.db_pool_size = Gauge('db_pool_size', 'Database connections kept open by the pool',
+                                  namespace=ns, multiprocess_mode='livesum')
+        self.image_jobs_in_flight = Gauge('image_jobs_in_flight', 'Image variant jobs submitted and not finished',
+                                          namespace=ns, multiprocess_mode='livesum')
+        # read from the database at scrape time: the same for every worker, so take the latest
+        self.image_backlog = Gauge('image_processing_backlog', 'Stored images still waiting for variants',
+                                   namespace=ns, multiprocess_mode='livemostrecent')
+        self.enabled = True
+
+    def init_app(self, app, sampler=None, ignore=()):
+        """Time every request; sampler() refreshes the per-process gauges after each request and scrape"""
+        self._sampler = sampler
+        self.ignore = set(ignore)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.metrics_started = time.perf_counter()
+
+    def _finish(self, response):
+        started = g.pop('metrics_started', None)
+        if not self.enabled or started is None or request.endpoint in self.ignore:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        self.request_latency.labels(endpoint, request.method).observe(time.perf_counter() - started)
+        self.requests.labels(endpoint, request.method, str(response.status_code)).inc()
+        self.sample()
+        return response
+
+    def sample(self):
+        if self.enabled and self._sampler is not None:
+            try:
+                self._sampler()
+            except Exception as e:
+                print(f"⚠️ Metrics sampler failed: {e}")
+
+    def cache_lookup(self, cache, hit):
+        self.cache_lookups.labels(cache, 'hit' if hit else 'miss').inc()
+
+    def render(self):
+        """(body, content_type) of the text exposition; every worker's samples in multiprocess mode"""
+        if not self.enabled:
+            raise MetricsUnavailable('metrics need the prometheus_client package')
+        self.sample()
+        client = self._client
+        if self.multiprocess:
+            from prometheus_client import multiprocess
+            registry = client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = client.REGISTRY
+        return client.generate_latest(registry), client.CONTENT_TYPE_LATEST
+
+
+metrics = Metrics()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Local mock WhatsApp provider
+Serves /send and /send_batch so the notification transport can be benchmarked offline
+
+    python mock_whatsapp_server.py --port 8025 --latency-ms 20
+    python mock_whatsapp_server.py --bench 500 --latency-ms 20
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from whatsapp_service import WhatsAppProvider, WhatsAppService
+
+
+class MockWhatsAppHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like a real provider
+    disable_nagle_algorithm = True
+    latency = 0.0
+    failure_rate = 0.0
+    received = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        count = len(payload.get('messages', [])) if self.path == '/send_batch' else 1
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with MockWhatsAppHandler.lock:
+            MockWhatsAppHandler.received += count
+            failed = self.failure_rate and (MockWhatsAppHandler.received % int(1 / self.failure_rate) == 0)
+
+        status = 503 if failed else 200
+        body = json.dumps({'success': not failed, 'accepted': 0 if failed else count}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency_ms=0, failure_rate=0.0):
+    MockWhatsAppHandler.latency = latency_ms / 1000.0
+    MockWhatsAppHandler.failure_rate = failure_rate
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockWhatsAppHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_benchmark(count, latency_ms, batch_size, rate_limit):
+    server = start_server(latency_ms=latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    messages = [(f"07{i:08d}", f"Benchmark message {i}") for i in range(count)]
+
+    print(f"📊 {count} messages, {latency_ms} ms provider latency")
+
+    started = time.perf_counter()
+    for phone, message in messages:
+        requests.post(f"{base_url}/send", json={'phone': phone, 'message': message}, timeout=10)
+    elapsed = time.perf_counter() - started
+    print(f"   bare requests.post : {count / elapsed:8.1f} msg/s")
+
+    service = WhatsAppService()
+    service.register_provider(WhatsAppProvider('mock', f"{base_url}/send", api_key='mock',
+                                               rate_per_second=rate_limit, burst=rate_limit))
+    started = time.perf_counter()
+    for phone, message in messages:
+        service.send_message(phone, message)
+    elapsed = time.perf_counter() - started
+    print(f"   pooled session     : {count / elapsed:8.1f} msg/s")
+
+    service = WhatsAppService()
+    service.register_provider(WhatsAppProvider('mock', f"{base_url}/send", api_key='mock',
+                                               rate_per_second=rate_limit, burst=rate_limit,
+                                               batch_url=f"{base_url}/send_batch",
+                                               max_batch_size=batch_size))
+    started = time.perf_counter()
+    service.send_batch(messages)
+    elapsed = time.perf_counter() - started
+    print(f"   batched (size {batch_size:3d}) : {count / elapsed:8.1f} msg/s")
+
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock WhatsApp provider')
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help='fraction of requests answered with 503')
+    parser.add_argument('--bench', type=int, metavar='COUNT',
+                        help='run a throughput benchmark instead of serving')
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--rate-limit', type=float, default=1000.0)
+    args = parser.parse_args()
+
+    if args.bench:
+        run_benchmark(args.bench, args.latency_ms, args.batch_size, args.rate_limit)
+        return
+
+    server = start_server(args.port, args.latency_ms, args.failure_rate)
+    print(f"📱 Mock WhatsApp provider on http://127.0.0.1:{server.server_address[1]}")
+    print("   WHATSAPP_API_URL=http://127.0.0.1:%d/send" % server.server_address[1])
+    print("   WHATSAPP_BATCH_URL=http://127.0.0.1:%d/send_batch" % server.server_address[1])
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
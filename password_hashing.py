@@ -0,0 +1,85 @@
+"""
+Password hashing
+KDF work runs on a small dedicated thread pool so a burst of logins can only
+occupy a bounded number of cores; hash parameters come from the environment and
+outdated hashes are upgraded on the next successful login
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes already waiting; the caller should ask the user to retry"""
+
+
+class PasswordHasher:
+    """Bounded executor around Werkzeug's generate/check_password_hash"""
+
+    def __init__(self, method='pbkdf2:sha256:600000', salt_length=16, workers=2,
+                 max_pending=32, queue_timeout=5.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._executor_pid = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._method_prefix = None
+
+    def configure_from_env(self):
+        """Read PASSWORD_HASH_* settings, e.g. PASSWORD_HASH_METHOD=scrypt:32768:8:1"""
+        self.method = os.environ.get('PASSWORD_HASH_METHOD', self.method)
+        self.salt_length = int(os.environ.get('PASSWORD_HASH_SALT_LENGTH', self.salt_length))
+        self.workers = int(os.environ.get('PASSWORD_HASH_WORKERS', self.workers))
+        self.max_pending = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', self.max_pending))
+        self.queue_timeout = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', self.queue_timeout))
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._method_prefix = None
+
+    @property
+    def executor(self):
+        """Thread pool, created lazily in each worker process"""
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            with self._lock:
+                if self._executor is None or self._executor_pid != pid:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='password-hash')
+                    self._executor_pid = pid
+        return self._executor
+
+    def _run(self, func, *args):
+        # hashlib's KDFs release the GIL, so other request threads keep running meanwhile
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy('Password hashing queue is full')
+        try:
+            return self.executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    @property
+    def method_prefix(self):
+        """Stored form of the configured method, e.g. 'scrypt' expands to 'scrypt:32768:8:1'"""
+        if self._method_prefix is None:
+            self._method_prefix = self._run(generate_password_hash, '', self.method, 1).split('$', 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, password_hash):
+        method, _, salt_and_hash = password_hash.partition('$')
+        salt = salt_and_hash.partition('$')[0]
+        return method != self.method_prefix or len(salt) != self.salt_length
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,209 @@
+"""
+Request profiling
+Wall time, SQL statement count and database time (SQLAlchemy cursor events),
+render time and outbound calls for every request. Statements are also counted
+by shape, so a query issued once per row of a list (N+1) is flagged. The last
+few hundred requests are kept in memory for the admin report page
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from functools import wraps
+
+from flask import before_render_template, current_app, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# "IN (?, ?, ?)" and "IN (%(id_1)s, %(id_2)s)" are the same shape whatever the list length
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    return _PLACEHOLDER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+
+class RequestProfile:
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.endpoint = None
+        self.status = None
+        self.started_at = datetime.utcnow()
+        self.wall = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.outbound = 0
+        self.shapes = Counter()
+        self._started = time.perf_counter()
+        self._sql_started = None
+        self._render_started = None
+        self._request_id = None  # id() only: the history must not keep requests alive
+
+    def repeated(self, threshold):
+        """[(shape, count)] for statements run at least threshold times in this request"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+class RequestProfiler:
+    def __init__(self, history=500, repeat_threshold=5):
+        self.enabled = True
+        self.headers = None  # None = only when app.debug
+        self.repeat_threshold = repeat_threshold
+        self.history = deque(maxlen=history)
+        self.ignore = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def configure_from_env(self):
+        self.enabled = os.environ.get('PROFILING', '1') != '0'
+        self.history = deque(maxlen=int(os.environ.get('PROFILING_HISTORY', self.history.maxlen)))
+        self.repeat_threshold = int(os.environ.get('PROFILING_REPEAT_THRESHOLD', self.repeat_threshold))
+        if os.environ.get('PROFILING_HEADERS'):
+            self.headers = os.environ['PROFILING_HEADERS'] == '1'
+
+    def init_app(self, app, ignore=()):
+        """Hook request, template and engine events; endpoints in ignore are not recorded"""
+        if not self.enabled:
+            return
+        self.ignore = set(ignore)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        # on the Engine class, so every engine the app creates is covered
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    @property
+    def current(self):
+        """Profile of the request running on this thread, or None"""
+        return getattr(self._local, 'profile', None)
+
+    def outbound(self, calls=1):
+        """Count calls to outside services (sent or queued) against the current request"""
+        profile = self.current
+        if profile is not None:
+            profile.outbound += calls
+
+    def rendering(self, func):
+        """Decorator: time spent in func counts as render time"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = self.current
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.render_time += time.perf_counter() - started
+        return wrapper
+
+    def _start(self):
+        profile = RequestProfile(request.method, request.full_path.rstrip('?'))
+        profile._request_id = id(request._get_current_object())
+        self._local.profile = profile
+
+    def _finish(self, response):
+        profile = self.current
+        if profile is None:
+            return response
+        self._local.profile = None
+        profile.wall = time.perf_counter() - profile._started
+        profile.endpoint = request.endpoint
+        profile.status = response.status_code
+        if profile.endpoint not in self.ignore:
+            with self._lock:
+                self.history.append(profile)
+
+        if self.headers or (self.headers is None and current_app.debug):
+            repeated = profile.repeated(self.repeat_threshold)
+            response.headers['Server-Timing'] = (
+                f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.sql_count} queries", '
+                f'render;dur={profile.render_time * 1000:.1f}, total;dur={profile.wall * 1000:.1f}')
+            response.headers['X-SQL-Count'] = str(profile.sql_count)
+            response.headers['X-Outbound-Calls'] = str(profile.outbound)
+            response.headers['X-Repeated-Queries'] = str(len(repeated))
+        return response
+
+    def _discard(self, exc=None):
+        """Drop the profile of a request that failed before after_request ran"""
+        profile = self.current
+        # base_template pushes a nested test_request_context; its teardown must not end our request
+        if profile is not None and profile._request_id == id(request._get_current_object()):
+            self._local.profile = None
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self.current
+        if profile is not None:
+            profile._sql_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self.current
+        if profile is None or profile._sql_started is None:
+            return
+        profile.sql_time += time.perf_counter() - profile._sql_started
+        profile._sql_started = None
+        profile.sql_count += 1
+        profile.shapes[statement_shape(statement)] += 1
+
+    def _render_started(self, sender, template, context, **extra):
+        profile = self.current
+        if profile is not None:
+            profile._render_started = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        profile = self.current
+        if profile is not None and profile._render_started is not None:
+            profile.render_time += time.perf_counter() - profile._render_started
+            profile._render_started = None
+
+    def recent(self, limit=None, flagged_only=False):
+        """Newest first"""
+        with self._lock:
+            profiles = list(self.history)
+        profiles.reverse()
+        if flagged_only:
+            profiles = [p for p in profiles if p.repeated(self.repeat_threshold)]
+        return profiles[:limit] if limit else profiles
+
+    def summary(self):
+        """Per endpoint over the kept history: [(endpoint, stats)], slowest p95 first"""
+        by_endpoint = {}
+        for profile in self.recent():
+            by_endpoint.setdefault(profile.endpoint or profile.path, []).append(profile)
+        rows = []
+        for endpoint, profiles in by_endpoint.items():
+            walls = sorted(p.wall for p in profiles)
+            rows.append((endpoint, {
+                'requests': len(profiles),
+                'p50_ms': round(percentile(walls, 50) * 1000, 1),
+                'p95_ms': round(percentile(walls, 95) * 1000, 1),
+                'sql': round(sum(p.sql_count for p in profiles) / len(profiles), 1),
+                'db_ms': round(sum(p.sql_time for p in profiles) / len(profiles) * 1000, 1),
+                'render_ms': round(sum(p.render_time for p in profiles) / len(profiles) * 1000, 1),
+                'outbound': round(sum(p.outbound for p in profiles) / len(profiles), 1),
+                'flagged': sum(1 for p in profiles if p.repeated(self.repeat_threshold)),
+            }))
+        rows.sort(key=lambda row: row[1]['p95_ms'], reverse=True)
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,176 @@
+"""
+Rate engine
+Nightly prices per room over an 18-month horizon are materialised once per hotel
+into a numpy matrix with running totals, so any stay total is a subtraction and
+thousands of quotes are a handful of vectorised operations
+"""
+
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from metrics import metrics
+
+HORIZON_DAYS = 548  # ~18 months
+
+# Row key for stays booked against the hotel rather than a specific room
+HOTEL_KEY = 0
+
+
+def _day_index(start, day):
+    return (day - start).days
+
+
+class RateCalendar:
+    """Nightly prices for one hotel: row per room key, column per night from start"""
+
+    def __init__(self, start, keys, room_types, prices, stay_discounts, version=None):
+        self.start = start
+        self.days = prices.shape[1]
+        self.keys = list(keys)
+        self.row = {key: i for i, key in enumerate(self.keys)}
+        self.room_types = np.array(room_types, dtype=object)
+        self.prices = prices
+        # prefix[r, j] = sum of the first j nights, so a stay [i, j) costs prefix[j] - prefix[i]
+        self.prefix = np.zeros((prices.shape[0], self.days + 1))
+        np.cumsum(prices, axis=1, out=self.prefix[:, 1:])
+        self.stay_discounts = stay_discounts
+        self.version = version
+        self.built_at = time.time()
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.days)
+
+    def covers(self, check_in, check_out):
+        return self.start <= check_in and check_out <= self.end
+
+    def stay_totals(self, keys, check_ins, check_outs):
+        """Vectorised (subtotal, discount_percent, total) arrays for parallel sequences of stays"""
+        rows = np.fromiter((self.row[key] for key in keys), dtype=np.intp, count=len(keys))
+        first = np.fromiter((_day_index(self.start, d) for d in check_ins), dtype=np.intp, count=len(keys))
+        last = np.fromiter((_day_index(self.start, d) for d in check_outs), dtype=np.intp, count=len(keys))
+        subtotal = self.prefix[rows, last] - self.prefix[rows, first]
+        discount = self._discounts(rows, first, last - first)
+        total = np.round(subtotal * (1 - discount / 100.0), 2)
+        return subtotal, discount, total
+
+    def _discounts(self, rows, first, nights):
+        """Best applicable length-of-stay discount per stay"""
+        discount = np.zeros(len(rows))
+        types = self.room_types[rows]
+        for rule in self.stay_discounts:
+            mask = nights >= rule['min_nights']
+            if rule['room_type'] is not None:
+                mask &= types == rule['room_type']
+            if rule['start'] is not None:
+                mask &= first >= rule['start']
+            if rule['end'] is not None:
+                mask &= first < rule['end']
+            discount = np.where(mask, np.maximum(discount, rule['percent']), discount)
+        return discount
+
+    def nightly(self, key, check_in, check_out):
+        """Price of each night of the stay"""
+        i, j = _day_index(self.start, check_in), _day_index(self.start, check_out)
+        return [round(float(p), 2) for p in self.prices[self.row[key], i:j]]
+
+    def quote(self, key, check_in, check_out):
+        """Single stay with its nightly breakdown"""
+        subtotal, discount, total = self.stay_totals([key], [check_in], [check_out])
+        return {
+            'nights': (check_out - check_in).days,
+            'nightly': self.nightly(key, check_in, check_out),
+            'subtotal': round(float(subtotal[0]), 2),
+            'discount_percent': float(discount[0]),
+            'total': float(total[0]),
+        }
+
+
+def build_rate_calendar(start, rooms, rules, days=HORIZON_DAYS, version=None):
+    """
+    rooms: [(key, room_type, base_price)]
+    rules: dicts with room_type, start_date, end_date, weekdays (set of 0=Mon..6=Sun),
+           price, multiplier, min_nights, discount_percent, priority
+    """
+    keys = [key for key, _, _ in rooms]
+    room_types = [room_type for _, room_type, _ in rooms]
+    prices = np.repeat(np.array([float(base) for _, _, base in rooms])[:, None], days, axis=1)
+
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(start, 'D') + days)
+    weekdays = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    type_array = np.array(room_types, dtype=object)
+
+    stay_discounts = []
+    for rule in sorted(rules, key=lambda r: (r.get('priority') or 0)):
+        first = _day_index(start, rule['start_date']) if rule.get('start_date') else None
+        last = _day_index(start, rule['end_date']) + 1 if rule.get('end_date') else None
+
+        if rule.get('discount_percent'):
+            stay_discounts.append({'room_type': rule.get('room_type'), 'min_nights': rule.get('min_nights') or 1,
+                                   'percent': float(rule['discount_percent']), 'start': first, 'end': last})
+            continue
+
+        columns = np.ones(days, dtype=bool)
+        if first is not None:
+            columns[:max(first, 0)] = False
+        if last is not None:
+            columns[max(last, 0):] = False
+        if rule.get('weekdays'):
+            columns &= np.isin(weekdays, list(rule['weekdays']))
+        row_mask = np.ones(len(rooms), dtype=bool) if rule.get('room_type') is None else \
+            type_array == rule['room_type']
+        if not columns.any() or not row_mask.any():
+            continue
+
+        block = np.ix_(row_mask, columns)
+        if rule.get('price') is not None:
+            prices[block] = float(rule['price'])
+        if rule.get('multiplier') is not None:
+            prices[block] *= float(rule['multiplier'])
+
+    return RateCalendar(start, keys, room_types, prices, stay_discounts, version)
+
+
+class RateEngine:
+    """Per-process cache of hotel rate calendars, rebuilt daily, on version change or after max_age"""
+
+    def __init__(self, days=HORIZON_DAYS, max_age=3600):
+        self.days = days
+        self.max_age = max_age
+        self._calendars = {}
+        self._lock = threading.Lock()
+
+    def cached(self, hotel_id, version=None, today=None):
+        """The hotel's calendar if it is still current, else None"""
+        calendar = self._calendars.get(hotel_id)
+        fresh = calendar is not None and calendar.start == (today or date.today()) and \
+            calendar.version == version and time.time() - calendar.built_at < self.max_age
+        metrics.cache_lookup('rates', fresh)
+        return calendar if fresh else None
+
+    def build(self, hotel_id, rooms, rules, version=None, today=None):
+        calendar = build_rate_calendar(today or date.today(), rooms, rules, self.days, version)
+        with self._lock:
+            self._calendars[hotel_id] = calendar
+        return calendar
+
+    def calendar(self, hotel_id, loader, version=None, today=None):
+        """loader() -> (rooms, rules) as accepted by build_rate_calendar"""
+        calendar = self.cached(hotel_id, version, today)
+        if calendar is None:
+            rooms, rules = loader()
+            calendar = self.build(hotel_id, rooms, rules, version, today)
+        return calendar
+
+    def invalidate(self, hotel_id=None):
+        with self._lock:
+            if hotel_id is None:
+                self._calendars.clear()
+            else:
+                self._calendars.pop(hotel_id, None)
+
+
+rate_engine = RateEngine()
@@ -0,0 +1,188 @@
+"""
+Synthetic load-test data
+Reproducible (seeded numpy Generator) hotels, rooms, users and bookings with
+Zipf-skewed locations and hotel popularity and a tourist-season curve, produced
+in chunks of plain dicts so the caller can bulk insert millions of rows
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+DOMAIN = 'synthetic.test'  # every generated email ends with @synthetic.test, which is how purge finds them
+MAX_NIGHTS = 21
+
+LOCATIONS = [
+    'Colombo', 'Kandy', 'Galle', 'Ella', 'Nuwara Eliya', 'Negombo', 'Bentota', 'Mirissa', 'Sigiriya',
+    'Unawatuna', 'Hikkaduwa', 'Trincomalee', 'Arugam Bay', 'Dambulla', 'Anuradhapura', 'Jaffna',
+    'Polonnaruwa', 'Habarana', 'Tangalle', 'Kalpitiya', 'Haputale', 'Batticaloa', 'Ratnapura', 'Kitulgala',
+]
+HOTEL_TYPES = ['hotel', 'villa', 'resort']
+ROOM_TYPES = [('Standard', 1.0, 2), ('Deluxe', 1.4, 3), ('Suite', 2.2, 4), ('Family', 1.8, 5)]
+
+# relative check-ins per month: west/south coast high season Dec-Mar, a smaller Jul-Aug peak
+MONTH_WEIGHTS = np.array([1.5, 1.4, 1.3, 1.0, 0.7, 0.6, 1.0, 1.2, 0.8, 0.7, 0.8, 1.6])
+WEEKDAY_WEIGHTS = np.array([0.9, 0.85, 0.85, 0.9, 1.2, 1.35, 1.0])  # Monday first
+
+
+def zipf_weights(count, exponent=1.1):
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+class SyntheticData:
+    def __init__(self, seed=42, anchor=None, past_days=730, future_days=365):
+        self.seed = seed
+        self.anchor = anchor or datetime.utcnow().date()
+        self.past_days = past_days
+        self.future_days = future_days
+
+    def rng(self, stream):
+        """Independent generator per table, so changing one volume does not reshuffle the others"""
+        return np.random.default_rng([self.seed, stream])
+
+    def hotels(self, count, chunk=10000):
+        rng = self.rng(1)
+        location_weights = zipf_weights(len(LOCATIONS))
+        created = datetime.combine(self.anchor - timedelta(days=self.past_days), datetime.min.time())
+        for offset in range(0, count, chunk):
+            size = min(chunk, count - offset)
+            locations = rng.choice(len(LOCATIONS), size=size, p=location_weights)
+            types = rng.choice(len(HOTEL_TYPES), size=size, p=[0.8, 0.12, 0.08])
+            prices = np.round(rng.lognormal(np.log(9000), 0.5, size=size), -2)
+            yield [{
+                'name': f"Synthetic {LOCATIONS[loc]} {HOTEL_TYPES[kind].title()} {offset + i + 1}",
+                'location': f"{LOCATIONS[loc]}, Sri Lanka",
+                'description': f"Load-test {HOTEL_TYPES[kind]} in {LOCATIONS[loc]}",
+                'owner_name': f"Owner {offset + i + 1}",
+                'owner_email': f"owner{offset + i + 1}@{DOMAIN}",
+                'contact_number': f"07{(offset + i) % 100000000:08d}",
+                'whatsapp_number': None,
+                'price_per_night': float(prices[i]),
+                'total_rooms': 0,
+                'available_rooms': 0,
+                'amenities': 'WiFi, Parking',
+                'hotel_type': HOTEL_TYPES[kind],
+                'is_approved': True,
+                'created_at': created,
+                'approved_at': created,
+            } for i, (loc, kind) in enumerate(zip(locations, types))]
+
+    def rooms(self, hotels, total, chunk=50000):
+        """hotels: [(hotel_id, base_price)]; rooms are spread over hotels with a skew towards big ones"""
+        rng = self.rng(2)
+        per_hotel = rng.multinomial(total, zipf_weights(len(hotels), 0.6)[rng.permutation(len(hotels))])
+        type_weights = [0.45, 0.3, 0.1, 0.15]
+        created = datetime.combine(self.anchor - timedelta(days=self.past_days), datetime.min.time())
+        batch = []
+        for (hotel_id, base_price), count in zip(hotels, per_hotel):
+            kinds = rng.choice(len(ROOM_TYPES), size=count, p=type_weights)
+            for number, kind in enumerate(kinds, 1):
+                name, multiplier, capacity = ROOM_TYPES[kind]
+                batch.append({
+                    'hotel_id': hotel_id,
+                    'room_number': str(100 * (number // 100 + 1) + number % 100),
+                    'room_type': name,
+                    'capacity': capacity,
+                    'price_per_night': float(round(base_price * multiplier, -2)),
+                    'is_available': True,
+                    'features': None,
+                    'created_at': created,
+                })
+                if len(batch) >= chunk:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def users(self, count, password_hash, chunk=50000):
+        created = datetime.combine(self.anchor - timedelta(days=self.past_days), datetime.min.time())
+        for offset in range(0, count, chunk):
+            yield [{
+                'username': f"synthetic{n}",
+                'password_hash': password_hash,
+                'email': f"user{n}@{DOMAIN}",
+                'user_type': 'customer',
+                'full_name': f"Synthetic Guest {n}",
+                'phone': f"07{n % 100000000:08d}",
+                'created_at': created,
+            } for n in range(offset + 1, min(offset + chunk, count) + 1)]
+
+    def day_demand(self):
+        """(window start, relative demand per day) from the month and weekday curves; mean 1"""
+        start = self.anchor - timedelta(days=self.past_days)
+        dates = np.arange(np.datetime64(start), np.datetime64(start) + self.past_days + self.future_days)
+        months = dates.astype('datetime64[M]').astype(int) % 12
+        weekdays = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        demand = MONTH_WEIGHTS[months] * WEEKDAY_WEIGHTS[weekdays]
+        return start, demand / demand.mean()
+
+    def bookings(self, rooms, customer_ids, count, chunk=50000):
+        """rooms: [(room_id, hotel_id, price)], customer_ids in users() order; busy hotels get most bookings.
+
+        A confirmed stay that would share a night with an earlier confirmed stay in the same room is
+        dropped, so popular hotels fill up instead of double-booking and fewer than count rows may come out
+        """
+        rng = self.rng(3)
+        room_ids = np.array([r[0] for r in rooms])
+        hotel_ids = np.array([r[1] for r in rooms])
+        prices = np.array([r[2] for r in rooms])
+        hotels, hotel_of_room = np.unique(hotel_ids, return_inverse=True)
+        hotel_weights = zipf_weights(len(hotels), 0.9)[rng.permutation(len(hotels))]
+        # room weight = hotel popularity shared over its rooms
+        room_weights = hotel_weights[hotel_of_room] / np.bincount(hotel_of_room)[hotel_of_room]
+        room_weights /= room_weights.sum()
+        customers = np.asarray(customer_ids)
+        start, demand = self.day_demand()
+        day_weights = demand / demand.sum()
+        # one bit per room and night of the window (plus the longest stay past its end)
+        days = len(demand) + MAX_NIGHTS
+        occupied = np.zeros((len(room_ids) * days + 7) // 8, dtype=np.uint8)
+
+        for offset in range(0, count, chunk):
+            size = min(chunk, count - offset)
+            picks = rng.choice(len(room_ids), size=size, p=room_weights)
+            first_day = rng.choice(len(demand), size=size, p=day_weights)
+            nights = np.minimum(rng.geometric(0.45, size=size), MAX_NIGHTS)
+            lead = np.minimum(rng.exponential(30, size=size).astype(int), 365)
+            cancelled = rng.random(size) < 0.08
+            keep = self._claim_nights(occupied, days, picks, first_day, nights, ~cancelled)
+            # index into customers: user n (1-based) is synthetic<n>, whatever id the database gave it
+            guests = rng.integers(len(customers), size=size) if len(customers) else np.full(size, -1)
+            # busy season is dearer: scale the rate by the check-in day's demand
+            totals = np.round(prices[picks] * nights * np.clip(demand[first_day], 0.8, 1.5), 2)
+            yield [{
+                'hotel_id': int(hotel_ids[p]),
+                'room_id': int(room_ids[p]),
+                'guest_name': f"Synthetic Guest {g + 1}",
+                'guest_email': f"user{g + 1}@{DOMAIN}",
+                'guest_phone': None,
+                'guest_whatsapp': None,
+                'check_in_date': start + timedelta(days=int(d)),
+                'check_out_date': start + timedelta(days=int(d) + int(n)),
+                'total_price': float(t),
+                'booking_date': datetime.combine(start + timedelta(days=int(d) - int(l)), datetime.min.time()),
+                'status': 'cancelled' if c else 'confirmed',
+                'customer_id': int(customers[g]) if g >= 0 else None,
+                'group_id': None,
+                'updated_at': datetime.combine(start + timedelta(days=int(d) - int(l)), datetime.min.time()),
+            } for p, d, n, l, c, g, t, k in zip(picks, first_day, nights, lead, cancelled, guests, totals, keep) if k]
+
+    @staticmethod
+    def _claim_nights(occupied, days, picks, first_day, nights, confirmed):
+        """Keep-mask for one chunk: a confirmed stay is kept when none of its room-nights is taken, either
+        by an earlier chunk or by an earlier stay in this one; kept stays are marked in occupied"""
+        stay = np.repeat(np.arange(len(picks)), nights)
+        night = first_day[stay] + np.arange(len(stay)) - np.repeat(np.cumsum(nights) - nights, nights)
+        slot = picks[stay].astype(np.int64) * days + night
+        slot, stay = slot[confirmed[stay]], stay[confirmed[stay]]
+        taken = (occupied[slot >> 3] >> (slot & 7)) & 1 == 1
+        # within the chunk the first stay (in order) to name a room-night wins it
+        loses = np.ones(len(slot), dtype=bool)
+        loses[np.unique(slot, return_index=True)[1]] = False
+        clash = np.zeros(len(picks), dtype=bool)
+        np.logical_or.at(clash, stay, taken | loses)
+        keep = ~clash
+        claim = slot[keep[stay]]
+        np.bitwise_or.at(occupied, claim >> 3, (1 << (claim & 7)).astype(np.uint8))
+        return keep
@@ -1,6 +1,7 @@
 import os
 from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
@@ -188,6 +189,20 @@ def init_db():
 def get_today():
     return datetime.now().date().isoformat()
 
+DUPLICATE_USER_MESSAGES = {
+    'username': 'මෙම පරිශීලක නාමය දැනටමත් භාවිතා කර ඇත.',
+    'email': 'මෙම ඊමේල් ලිපිනය දැනටමත් භාවිතා කර ඇත.',
+}
+
+def duplicate_user_field(error):
+    """Which unique User column an IntegrityError tripped: 'username', 'email' or None"""
+    # SQLite: "UNIQUE constraint failed: user.email"; PostgreSQL: "... Key (email)=(...) already exists"
+    detail = str(error.orig).lower()
+    for field in DUPLICATE_USER_MESSAGES:
+        if field in detail:
+            return field
+    return None
+
 # Routes
 @app.route('/')
 def home():
@@ -229,14 +244,6 @@ def register():
         phone = request.form.get('phone', '').strip()
         user_type = request.form.get('user_type', '').strip()
         
-        if User.query.filter_by(username=username).first():
-            flash('මෙම පරිශීලක නාමය දැනටමත් භාවිතා කර ඇත.', 'danger')
-            return redirect(url_for('register'))
-        
-        if User.query.filter_by(email=email).first():
-            flash('මෙම ඊමේල් ලිපිනය දැනටමත් භාවිතා කර ඇත.', 'danger')
-            return redirect(url_for('register'))
-        
         user = User(
             username=username,
             email=email,
@@ -247,7 +254,13 @@ def register():
         user.set_password(password)
         
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            flash(DUPLICATE_USER_MESSAGES.get(duplicate_user_field(e),
+                                              'ලියාපදිංචි වීමේ දෝෂයක්. කරුණාකර පසුව උත්සාහ කරන්න.'), 'danger')
+            return redirect(url_for('register'))
         
         flash('ඔබගේ ගිණුම සාර්ථකව නිර්මාණය කරන ලදී! දැන් ඔබට පිවිසිය හැකිය.', 'success')
         return redirect(url_for('login'))
@@ -0,0 +1,95 @@
+"""
+Shared fixtures
+app.py is imported once against a throwaway SQLite file; every test starts from
+a freshly seeded database (init_db) and an empty in-process cache
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='hotel-tests-'), 'test.db')
+
+# set before app.py runs load_dotenv(), which never overrides what is already set
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{DB_PATH}',
+    'WHATSAPP_API_KEY': '',
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    'METRICS': '0',
+    'PROFILING': '0',
+})
+for name in ('CACHE_URL', 'REDIS_URL'):
+    os.environ.pop(name, None)
+sys.path.insert(0, ROOT)
+
+import app as hotel_app  # noqa: E402
+
+
+def day(offset):
+    """ISO date `offset` days from today, as the booking forms send it"""
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+def book_stay(client, hotel_id, check_in, check_out, room_id=''):
+    """Book as the logged-in customer, nights given as offsets from today -> True if it went through"""
+    response = client.post(f'/book_hotel/{hotel_id}', data={
+        'check_in_date': day(check_in), 'check_out_date': day(check_out), 'room_id': room_id,
+        'guest_name': 'Guest', 'guest_phone': '0770000000'})
+    return response.headers['Location'].endswith('/my_bookings')
+
+
+def flashes(client):
+    """Messages flashed so far and not yet shown, as (category, message) pairs"""
+    with client.session_transaction() as session:
+        return list(session.get('_flashes', []))
+
+
+def reset_database(A, source=None):
+    """Drop the test database file, or replace it with a copy of source"""
+    with A.app.app_context():
+        A.db.session.remove()
+        A.db.engine.dispose()
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    if source:
+        with open(source, 'rb') as src, open(DB_PATH, 'wb') as dst:
+            dst.write(src.read())
+
+
+@pytest.fixture
+def app_module():
+    """app.py over a freshly seeded database"""
+    A = hotel_app
+    reset_database(A)
+    A.cache.configure()
+    A.init_db()
+    yield A
+    with A.app.app_context():
+        A.db.session.remove()
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    def login(username, password):
+        client.get('/logout')
+        return client.post('/login', data={'username': username, 'password': password})
+    return login
+
+
+@pytest.fixture
+def kris_hotel(app_module):
+    """(hotel id, room ids) of the seeded hotel owned by kris / kris123"""
+    A = app_module
+    with A.app.app_context():
+        hotel = A.Hotel.query.filter_by(owner_email='kris@gmail.com').one()
+        rooms = A.Room.query.filter_by(hotel_id=hotel.id).order_by(A.Room.id).all()
+        return hotel.id, [room.id for room in rooms]
@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import day
+
+
+@pytest.fixture
+def token(client):
+    def token(username, password):
+        response = client.post('/api/v1/token', json={'username': username, 'password': password})
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return token
+
+
+@pytest.fixture
+def unapproved_hotel(app_module, kris_hotel):
+    A = app_module
+    with A.app.app_context():
+        A.db.session.get(A.Hotel, kris_hotel[0]).is_approved = False
+        A.db.session.commit()
+    return kris_hotel[0]
+
+
+def hotel_urls(hotel_id):
+    return [f'/api/v1/hotels/{hotel_id}',
+            f'/api/v1/hotels/{hotel_id}/rooms',
+            f'/api/v1/hotels/{hotel_id}/availability?check_in={day(3)}&check_out={day(5)}']
+
+
+def test_unapproved_hotels_are_hidden_from_other_tokens(client, token, unapproved_hotel):
+    headers = token('customer', 'customer123')
+    for url in hotel_urls(unapproved_hotel):
+        assert client.get(url, headers=headers).status_code == 404, url
+
+
+def test_owners_and_super_admins_see_their_unapproved_hotel(client, token, unapproved_hotel):
+    for login in (('kris', 'kris123'), ('superadmin', 'admin123')):
+        headers = token(*login)
+        for url in hotel_urls(unapproved_hotel):
+            assert client.get(url, headers=headers).status_code == 200, (login, url)
+
+
+def test_unknown_hotels_are_not_found(client, token):
+    headers = token('superadmin', 'admin123')
+    for url in hotel_urls(9999):
+        assert client.get(url, headers=headers).status_code == 404, url
+
+
+def test_availability_lists_the_free_rooms(client, token, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    response = client.get(hotel_urls(hotel_id)[2], headers=token('customer', 'customer123'))
+    assert sorted(room['id'] for room in response.get_json()['rooms']) == room_ids
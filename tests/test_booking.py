@@ -0,0 +1,140 @@
+from datetime import date
+
+import pytest
+
+from conftest import book_stay, day
+
+
+@pytest.fixture
+def book(client, login):
+    login('customer', 'customer123')
+
+    def book(hotel_id, check_in, check_out, room_id=''):
+        return book_stay(client, hotel_id, check_in, check_out, room_id)
+    return book
+
+
+def confirmed(A, hotel_id):
+    with A.app.app_context():
+        return A.Booking.query.filter_by(hotel_id=hotel_id, status='confirmed').order_by(A.Booking.id).all()
+
+
+def booked_rooms(A, hotel_id):
+    """{date: booked_rooms} from DailyInventory, nights with nothing booked left out"""
+    with A.app.app_context():
+        return {row.date.isoformat(): row.booked_rooms
+                for row in A.DailyInventory.query.filter_by(hotel_id=hotel_id) if row.booked_rooms}
+
+
+def modify(client, booking, check_in, check_out, room_id=''):
+    response = client.post(f'/booking/{booking.id}/modify', data={
+        'check_in_date': day(check_in), 'check_out_date': day(check_out), 'room_id': room_id})
+    return response.headers['Location'].endswith('/my_bookings')
+
+
+def test_any_room_bookings_stop_when_every_room_is_taken(app_module, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    assert [book(hotel_id, 3, 5) for _ in room_ids] == [True] * len(room_ids)
+    assert not book(hotel_id, 3, 5)
+    assert not book(hotel_id, 4, 6, room_id=room_ids[0])
+
+    bookings = confirmed(app_module, hotel_id)
+    assert sorted(b.room_id for b in bookings) == room_ids
+    assert booked_rooms(app_module, hotel_id) == {day(3): len(room_ids), day(4): len(room_ids)}
+
+
+def test_any_room_takes_the_cheapest_free_room(app_module, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    with app_module.app.app_context():
+        cheapest = app_module.Room.query.filter_by(hotel_id=hotel_id).order_by(
+            app_module.Room.price_per_night).first().id
+    assert book(hotel_id, 3, 5, room_id=cheapest)
+    assert book(hotel_id, 3, 5)
+    assert confirmed(app_module, hotel_id)[1].room_id not in (0, cheapest)
+
+
+def test_a_room_is_booked_once_per_night(app_module, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    room_id = room_ids[0]
+    assert book(hotel_id, 3, 6, room_id=room_id)
+    assert not book(hotel_id, 5, 8, room_id=room_id)
+    assert not book(hotel_id, 2, 4, room_id=room_id)
+    # back-to-back stays share no night
+    assert book(hotel_id, 6, 8, room_id=room_id)
+    assert book(hotel_id, 1, 3, room_id=room_id)
+
+    assert len(confirmed(app_module, hotel_id)) == 3
+    assert set(booked_rooms(app_module, hotel_id).values()) == {1}
+
+
+def test_unavailable_rooms_cannot_be_booked(app_module, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    with app_module.app.app_context():
+        app_module.db.session.get(app_module.Room, room_ids[0]).is_available = False
+        app_module.db.session.commit()
+    assert not book(hotel_id, 3, 5, room_id=room_ids[0])
+    assert confirmed(app_module, hotel_id) == []
+
+
+def test_cancel_releases_the_nights(app_module, client, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    book(hotel_id, 3, 6, room_id=room_ids[0])
+    book(hotel_id, 4, 5, room_id=room_ids[1])
+    [first, second] = confirmed(app_module, hotel_id)
+    assert booked_rooms(app_module, hotel_id) == {day(3): 1, day(4): 2, day(5): 1}
+
+    client.post(f'/booking/{first.id}/cancel')
+    assert booked_rooms(app_module, hotel_id) == {day(4): 1}
+    assert [b.id for b in confirmed(app_module, hotel_id)] == [second.id]
+    # the room is free again
+    assert book(hotel_id, 3, 6, room_id=room_ids[0])
+
+
+def test_modify_recounts_only_the_nights_that_changed(app_module, client, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    book(hotel_id, 3, 6, room_id=room_ids[0])
+    [booking] = confirmed(app_module, hotel_id)
+
+    assert modify(client, booking, 4, 8, room_id=room_ids[0])
+    assert booked_rooms(app_module, hotel_id) == {day(n): 1 for n in range(4, 8)}
+    assert modify(client, booking, 4, 8, room_id=room_ids[1])
+    assert booked_rooms(app_module, hotel_id) == {day(n): 1 for n in range(4, 8)}
+    assert confirmed(app_module, hotel_id)[0].room_id == room_ids[1]
+    # extending into another booking of the same room is refused
+    book(hotel_id, 8, 10, room_id=room_ids[1])
+    assert not modify(client, booking, 4, 9, room_id=room_ids[1])
+    assert booked_rooms(app_module, hotel_id) == {**{day(n): 1 for n in range(4, 8)}, day(8): 1, day(9): 1}
+
+
+def test_modify_to_any_room_cannot_overbook(app_module, client, book, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    for _ in room_ids:
+        book(hotel_id, 3, 5)
+    book(hotel_id, 6, 8, room_id=room_ids[0])
+    moving = confirmed(app_module, hotel_id)[-1]
+
+    assert not modify(client, moving, 3, 5)
+    assert modify(client, moving, 6, 9)
+    assert confirmed(app_module, hotel_id)[-1].room_id == room_ids[0]
+    assert max(booked_rooms(app_module, hotel_id).values()) == len(room_ids)
+
+
+def test_a_booking_without_a_room_gets_one_when_modified(app_module, client, book, kris_hotel):
+    A = app_module
+    hotel_id, room_ids = kris_hotel
+    for room_id in room_ids:
+        book(hotel_id, 6, 8, room_id=room_id)
+    with A.app.app_context():
+        customer = A.User.query.filter_by(username='customer').one()
+        legacy = A.Booking(hotel_id=hotel_id, room_id=0, guest_name='Old', check_in_date=date.fromisoformat(day(3)),
+                           check_out_date=date.fromisoformat(day(5)), total_price=1, customer_id=customer.id)
+        A.db.session.add(legacy)
+        A.adjust_daily_inventory(hotel_id, legacy.check_in_date, legacy.check_out_date, 1)
+        A.db.session.commit()
+        A.db.session.refresh(legacy)
+
+    assert not modify(client, legacy, 6, 8)
+    assert modify(client, legacy, 10, 12)
+    with A.app.app_context():
+        assert A.db.session.get(A.Booking, legacy.id).room_id in room_ids
+    assert booked_rooms(A, hotel_id) == {day(6): 3, day(7): 3, day(10): 1, day(11): 1}
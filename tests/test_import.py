@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+from conftest import day
+
+
+@pytest.fixture
+def import_bookings(app_module, kris_hotel):
+    A = app_module
+    hotel_id, _ = kris_hotel
+
+    def import_bookings(rows, skip_invalid=False):
+        records = [{'hotel_id': hotel_id, 'total_price': 100, 'guest_name': 'Guest', **row,
+                    'check_in_date': day(row['check_in_date']), 'check_out_date': day(row['check_out_date'])}
+                   for row in rows]
+        with A.app.app_context():
+            report = A.import_records('bookings', records, skip_invalid=skip_invalid)
+            return report, {(error.row, error.field): error.message for error in report['error_rows']}
+    return import_bookings
+
+
+def confirmed_nights(A, hotel_id):
+    with A.app.app_context():
+        return {row.date.isoformat(): row.booked_rooms for row in A.DailyInventory.query.filter_by(hotel_id=hotel_id)}
+
+
+def test_overlapping_rows_for_one_room_are_rejected(app_module, kris_hotel, import_bookings):
+    A = app_module
+    hotel_id, _ = kris_hotel
+    report, errors = import_bookings([
+        {'room_number': '101', 'guest_name': 'First', 'check_in_date': 3, 'check_out_date': 6},
+        {'room_number': '101', 'guest_name': 'Second', 'check_in_date': 5, 'check_out_date': 7},
+        {'room_number': '102', 'guest_name': 'Third', 'check_in_date': 5, 'check_out_date': 7},
+    ])
+    assert report['imported'] == 0
+    assert errors == {(2, 'check_in_date'): 'room already booked for these nights (row 1)'}
+
+    report, errors = import_bookings([
+        {'room_number': '101', 'guest_name': 'First', 'check_in_date': 3, 'check_out_date': 6},
+        {'room_number': '101', 'guest_name': 'Second', 'check_in_date': 5, 'check_out_date': 7},
+        {'room_number': '102', 'guest_name': 'Third', 'check_in_date': 5, 'check_out_date': 7},
+        # back-to-back stays and cancelled rows do not clash
+        {'room_number': '101', 'guest_name': 'Fourth', 'check_in_date': 6, 'check_out_date': 8},
+        {'room_number': '102', 'guest_name': 'Fifth', 'check_in_date': 5, 'check_out_date': 7, 'status': 'cancelled'},
+    ], skip_invalid=True)
+    assert report['imported'] == 4
+    assert list(errors) == [(2, 'check_in_date')]
+    assert confirmed_nights(A, hotel_id) == {day(3): 1, day(4): 1, day(5): 2, day(6): 2, day(7): 1}
+
+
+def test_rows_clashing_with_existing_bookings_are_rejected(app_module, kris_hotel, import_bookings):
+    A = app_module
+    rows = [{'room_number': '201', 'guest_name': 'First', 'check_in_date': 3, 'check_out_date': 5}]
+    assert import_bookings(rows)[0]['imported'] == 1
+    with A.app.app_context():
+        booking_id = A.Booking.query.filter_by(guest_name='First').one().id
+
+    # importing the same file again loads nothing
+    report, errors = import_bookings(rows)
+    assert report['imported'] == 0
+    assert errors == {(1, 'guest_name'): f'same booking as booking #{booking_id}'}
+
+    report, errors = import_bookings([
+        {'room_number': '201', 'guest_name': 'Other', 'check_in_date': 4, 'check_out_date': 6}])
+    assert errors == {(1, 'check_in_date'): f'room already booked for these nights (booking #{booking_id})'}
+
+
+def test_admin_import_reports_rejected_rows(app_module, client, login, kris_hotel):
+    A = app_module
+    hotel_id, _ = kris_hotel
+    login('superadmin', 'admin123')
+    upload = io.BytesIO((
+        'hotel_id,room_number,guest_name,check_in_date,check_out_date,total_price\n'
+        f'{hotel_id},101,First,{day(3)},{day(5)},100\n'
+        f'{hotel_id},101,Second,{day(4)},{day(6)},100\n').encode())
+    response = client.post('/admin/import', data={'kind': 'bookings', 'file': (upload, 'bookings.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert 'room already booked for these nights (row 1)' in response.get_data(as_text=True)
+    with A.app.app_context():
+        assert A.Booking.query.filter(A.Booking.guest_name.in_(['First', 'Second'])).count() == 0
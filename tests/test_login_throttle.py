@@ -0,0 +1,34 @@
+def test_repeated_failures_lock_the_username_out(app_module, client, login, monkeypatch):
+    A = app_module
+    for _ in range(A.login_throttle.free_failures + 1):
+        assert login('customer', 'wrong').headers['Location'].endswith('/login')
+
+    # while locked even the right password is turned away before any hashing
+    verified = []
+    verify = A.password_hasher.verify
+    monkeypatch.setattr(A.password_hasher, 'verify', lambda *args: verified.append(args) or verify(*args))
+    assert login('customer', 'customer123').headers['Location'].endswith('/login')
+    assert verified == []
+    assert 0 < A.cache.ttl('login:lock:customer') <= 2
+
+    # the lockout doubles with every further failure past the free ones
+    assert A.login_throttle.failed('customer') == 4
+
+    A.cache.delete('login:lock:customer')
+    assert login('customer', 'customer123').headers['Location'].endswith('/dashboard')
+    assert verified
+    assert A.cache.get('login:fail:customer') is None
+
+
+def test_each_username_is_throttled_on_its_own(app_module, login):
+    A = app_module
+    for _ in range(A.login_throttle.free_failures + 1):
+        login('customer', 'wrong')
+    assert login('kris', 'kris123').headers['Location'].endswith('/dashboard')
+
+
+def test_one_address_cannot_spray_many_usernames(app_module, login):
+    A = app_module
+    for attempt in range(A.login_throttle.ip_burst):
+        login(f'nobody{attempt}', 'wrong')
+    assert A.login_throttle.check('kris', '127.0.0.1') > 0
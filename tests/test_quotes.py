@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import day
+
+
+def quote(client, *stays):
+    response = client.post('/api/quotes', json={'stays': list(stays)})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['quotes']
+
+
+def stay(hotel_id, **fields):
+    return {'hotel_id': hotel_id, 'check_in': day(3), 'check_out': day(5), **fields}
+
+
+@pytest.fixture
+def roomless_hotel(app_module):
+    A = app_module
+    with A.app.app_context():
+        hotel = A.Hotel(name='Roomless', location='Kandy', price_per_night=10000, total_rooms=5,
+                        available_rooms=5, is_approved=True)
+        A.db.session.add(hotel)
+        A.db.session.commit()
+        return hotel.id
+
+
+def test_quotes_price_the_cheapest_free_room_that_fits(client, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    [any_room, three_guests, four_guests] = quote(client, stay(hotel_id), stay(hotel_id, guests=3),
+                                                stay(hotel_id, guests=4))
+    assert any_room['available'] and any_room['nights'] == 2 and any_room['total'] > 0
+    assert three_guests['available'] and three_guests['room_id'] != any_room['room_id']
+    assert four_guests['available'] and four_guests['total'] > three_guests['total']
+
+
+def test_quote_errors_say_what_is_wrong(client, kris_hotel, roomless_hotel):
+    hotel_id, room_ids = kris_hotel
+    quotes = quote(client,
+                   stay(hotel_id, room_id=room_ids[0], guests=3),
+                   stay(hotel_id, guests=9),
+                   stay(hotel_id, room_id=9999),
+                   stay(roomless_hotel),
+                   stay(9999),
+                   stay(hotel_id, check_in=day(-1)),
+                   stay(hotel_id, check_out=day(40)),
+                   {'hotel_id': hotel_id})
+    assert [q['available'] for q in quotes] == [False] * len(quotes)
+    assert quotes[0]['error'] == 'Room holds 2 guests'
+    assert quotes[1]['error'] == 'Rooms hold at most 4 guests'
+    assert quotes[2]['error'] == 'Room not found'
+    assert quotes[3]['error'] == 'Hotel has no rooms to book'
+    assert quotes[4]['error'] == 'Unknown hotel'
+    assert quotes[5]['error'].startswith('Invalid stay: check_in must be between today')
+    assert quotes[6]['error'].startswith('Invalid stay: at most')
+    assert quotes[7]['error'].startswith('Invalid stay')
+
+
+def test_booked_rooms_are_not_quoted(app_module, client, login, kris_hotel):
+    hotel_id, room_ids = kris_hotel
+    login('customer', 'customer123')
+    client.post(f'/book_hotel/{hotel_id}', data={'check_in_date': day(3), 'check_out_date': day(5),
+                                                 'room_id': room_ids[0], 'guest_name': 'G', 'guest_phone': '0770000000'})
+    [booked, overlapping] = quote(client, stay(hotel_id, room_id=room_ids[0]),
+                                  stay(hotel_id, check_in=day(4), check_out=day(6)))
+    assert booked['error'] == 'No room available'
+    assert overlapping['available'] and overlapping['room_id'] != room_ids[0]
+
+
+def test_hotels_without_rooms_can_be_neither_quoted_nor_booked(app_module, client, login, roomless_hotel):
+    assert quote(client, stay(roomless_hotel))[0]['error'] == 'Hotel has no rooms to book'
+    login('customer', 'customer123')
+    client.post(f'/book_hotel/{roomless_hotel}', data={'check_in_date': day(3), 'check_out_date': day(5),
+                                                       'guest_name': 'G', 'guest_phone': '0770000000'})
+    with app_module.app.app_context():
+        assert app_module.Booking.query.filter_by(hotel_id=roomless_hotel).count() == 0
+
+
+def test_request_size_is_limited(app_module, client, kris_hotel):
+    too_many = [stay(kris_hotel[0])] * (app_module.QUOTE_MAX_ITEMS + 1)
+    assert client.post('/api/quotes', json={'stays': too_many}).status_code == 400
+    assert client.post('/api/quotes', json={'stays': []}).status_code == 400
+
+
+def test_large_requests_drain_the_callers_bucket(app_module, client, kris_hotel):
+    full = [stay(kris_hotel[0])] * app_module.QUOTE_MAX_ITEMS
+    assert client.post('/api/quotes', json={'stays': full}).status_code == 200
+    response = client.post('/api/quotes', json={'stays': full})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
@@ -0,0 +1,23 @@
+import pytest
+
+from conftest import flashes
+
+
+def register(client, **fields):
+    form = {'username': 'newuser', 'email': 'new@example.com', 'password': 'Secret123',
+            'full_name': 'New User', 'phone': '0770000001', 'user_type': 'customer', **fields}
+    return client.post('/register', data=form)
+
+
+def test_register_creates_the_user(app_module, client):
+    assert register(client).headers['Location'].endswith('/login')
+    with app_module.app.app_context():
+        assert app_module.User.query.filter_by(username='newuser').count() == 1
+
+
+@pytest.mark.parametrize('field, value', [('username', 'customer'), ('email', 'customer@example.com')])
+def test_register_reports_the_duplicate_field(app_module, client, field, value):
+    assert register(client, **{field: value}).headers['Location'].endswith('/register')
+    assert ('danger', app_module.DUPLICATE_USER_MESSAGES[field]) in flashes(client)
+    with app_module.app.app_context():
+        assert app_module.User.query.filter_by(**{field: value}).count() == 1
@@ -0,0 +1,39 @@
+import os
+
+from conftest import ROOT, day, reset_database
+
+BASELINE_DB = os.path.join(ROOT, 'instance', 'hotel_booking.db')
+
+
+def test_upgrade_schema_brings_a_baseline_database_up_to_the_models(app_module, client, login):
+    A = app_module
+    reset_database(A, source=BASELINE_DB)
+
+    with A.app.app_context():
+        users = A.User.query.count()
+        changes = A.upgrade_schema()
+        assert changes
+
+        inspector = A.db.inspect(A.db.engine)
+        for table in A.db.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            assert set(table.c.keys()) <= columns, table.name
+
+        assert A.upgrade_schema() == []
+        assert A.User.query.count() == users
+        room = A.Room.query.filter_by(is_available=True).order_by(A.Room.id).first()
+        hotel_id, room_id = room.hotel_id, room.id
+
+    # the upgraded database serves the app: old password hashes still log in, bookings commit
+    assert login('customer', 'customer123').status_code == 302
+    response = client.post(f'/book_hotel/{hotel_id}', data={
+        'check_in_date': day(3), 'check_out_date': day(5), 'room_id': room_id,
+        'guest_name': 'Guest', 'guest_phone': '0770000000'})
+    assert response.headers['Location'].endswith('/my_bookings')
+    with A.app.app_context():
+        assert A.Booking.query.filter_by(room_id=room_id, status='confirmed').count() == 1
+
+
+def test_upgrade_schema_is_a_no_op_on_a_current_database(app_module):
+    with app_module.app.app_context():
+        assert app_module.upgrade_schema() == []
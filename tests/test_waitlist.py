@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import book_stay, day
+
+
+@pytest.fixture
+def full_hotel(app_module, login, client, kris_hotel):
+    """kris's hotel with every room booked by customer for nights 3 and 4"""
+    hotel_id, room_ids = kris_hotel
+    login('customer', 'customer123')
+    for _ in room_ids:
+        assert book_stay(client, hotel_id, 3, 5)
+    A = app_module
+    with A.app.app_context():
+        for username in ('guest2', 'guest3'):
+            user = A.User(username=username, email=f'{username}@example.com', user_type='customer',
+                          full_name=username, phone='0770000002', is_active=True)
+            user.set_password('guest123')
+            A.db.session.add(user)
+        A.db.session.commit()
+    return hotel_id, room_ids
+
+
+def join(client, login, username, hotel_id, check_in=3, check_out=5):
+    login(username, 'guest123')
+    client.post(f'/hotel/{hotel_id}/waitlist', data={
+        'check_in_date': day(check_in), 'check_out_date': day(check_out), 'guests': 1,
+        'guest_name': username, 'guest_phone': '0770000002'})
+
+
+def entries(A):
+    with A.app.app_context():
+        rows = A.WaitlistEntry.query.order_by(A.WaitlistEntry.id).all()
+        nights = {row.id: A.WaitlistNight.query.filter_by(entry_id=row.id).count() for row in rows}
+        return [(row.status, row.held_room_id, nights[row.id]) for row in rows]
+
+
+def cancel_first_booking(A, client, login):
+    login('customer', 'customer123')
+    with A.app.app_context():
+        booking = A.Booking.query.filter_by(status='confirmed').order_by(A.Booking.id).first()
+    client.post(f'/booking/{booking.id}/cancel')
+    return booking.room_id
+
+
+def test_freed_room_is_held_for_the_waitlist_and_confirmed(app_module, client, login, full_hotel):
+    A = app_module
+    hotel_id, room_ids = full_hotel
+    join(client, login, 'guest2', hotel_id)
+    assert entries(A) == [('waiting', None, 2)]
+
+    freed = cancel_first_booking(A, client, login)
+    assert entries(A) == [('held', freed, 0)]
+    # the hold keeps the room from everyone else
+    assert not book_stay(client, hotel_id, 3, 5)
+
+    login('guest2', 'guest123')
+    with A.app.app_context():
+        entry_id = A.WaitlistEntry.query.one().id
+    client.post(f'/waitlist/{entry_id}/confirm')
+    assert entries(A) == [('booked', freed, 0)]
+    with A.app.app_context():
+        booking = A.Booking.query.filter_by(room_id=freed, status='confirmed').one()
+        assert booking.customer_id == A.User.query.filter_by(username='guest2').one().id
+        nights = A.DailyInventory.query.filter_by(hotel_id=hotel_id).all()
+        assert {row.booked_rooms for row in nights} == {len(room_ids)}
+
+
+def test_a_lapsed_hold_passes_to_the_next_entry(app_module, client, login, full_hotel):
+    A = app_module
+    hotel_id, _ = full_hotel
+    join(client, login, 'guest2', hotel_id)
+    join(client, login, 'guest3', hotel_id)
+    freed = cancel_first_booking(A, client, login)
+    assert entries(A) == [('held', freed, 0), ('waiting', None, 2)]
+
+    with A.app.app_context():
+        assert A.expire_waitlist(now=datetime.utcnow() + timedelta(minutes=A.WAITLIST_HOLD_MINUTES + 1)) == 1
+    assert entries(A) == [('expired', freed, 0), ('held', freed, 0)]
+
+    # the expired entry cannot confirm any more
+    login('guest2', 'guest123')
+    with A.app.app_context():
+        expired_id = A.WaitlistEntry.query.filter_by(status='expired').one().id
+    client.post(f'/waitlist/{expired_id}/confirm')
+    with A.app.app_context():
+        assert A.Booking.query.filter_by(room_id=freed, status='confirmed').count() == 0
+
+
+def test_confirm_rechecks_the_held_room(app_module, client, login, full_hotel):
+    A = app_module
+    hotel_id, _ = full_hotel
+    join(client, login, 'guest2', hotel_id)
+    freed = cancel_first_booking(A, client, login)
+    with A.app.app_context():
+        # written around the hold, e.g. by an import
+        A.db.session.add(A.Booking(hotel_id=hotel_id, room_id=freed, guest_name='Walk-in', total_price=1,
+                                   check_in_date=datetime.now().date() + timedelta(days=4),
+                                   check_out_date=datetime.now().date() + timedelta(days=5)))
+        A.db.session.commit()
+        entry_id = A.WaitlistEntry.query.one().id
+
+    login('guest2', 'guest123')
+    client.post(f'/waitlist/{entry_id}/confirm')
+    assert entries(A) == [('waiting', None, 2)]
+    with A.app.app_context():
+        assert A.Booking.query.filter_by(room_id=freed, status='confirmed').count() == 1
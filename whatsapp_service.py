@@ -0,0 +1,450 @@
+"""
+WhatsApp notification transport
+Pooled HTTP sessions with per-provider rate limiting and batch sending,
+plus a background outbox with retries, circuit breakers and dead-lettering.
+The outbox lives in worker memory: whatever is still queued or waiting for a
+retry when the worker exits normally (deploy, max_requests recycle) is
+dead-lettered so it can be replayed. A worker that is killed outright
+(SIGKILL, out of memory) loses its queue
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from profiling import profiler
+
+
+DIGEST_EVENT_LABELS = {
+    'booking': 'නව බුකින්ග්',
+    'cancellation': 'අවලංගු කිරීම්',
+    'modification': 'වෙනස් කිරීම්',
+    'calendar': 'කැලන්ඩර වෙනස්කම්',
+}
+DIGEST_MAX_LINES = 15
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """Take tokens, waiting up to `timeout` seconds (None waits forever)"""
+        if tokens > self.capacity:
+            # the bucket never holds more than capacity, so this would wait forever
+            raise ValueError(f"cannot take {tokens} tokens from a bucket of {self.capacity:g}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate if self.rate > 0 else 1.0
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Stop calling a destination after repeated failures until it cools down"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        return self.state != 'open'
+
+    def retry_after(self):
+        """Seconds until an open breaker lets a trial request through"""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # a failed half-open trial re-opens the breaker for another full timeout
+                self.opened_at = time.monotonic()
+
+
+class OutboundMessage:
+    """A queued notification and its delivery history"""
+
+    def __init__(self, phone, message, provider=None, context=None):
+        self.phone = phone
+        self.message = message
+        self.provider = provider
+        self.context = context or {}
+        self.attempts = 0
+        self.last_error = None
+        self.created_at = datetime.utcnow()
+
+
+class WhatsAppProvider:
+    """WhatsApp API provider settings"""
+
+    def __init__(self, name, api_url, api_key=None, rate_per_second=10.0, burst=None,
+                 batch_url=None, max_batch_size=1, timeout=(3.05, 10)):
+        self.name = name
+        self.api_url = api_url
+        self.api_key = api_key
+        self.batch_url = batch_url
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate_per_second, burst)
+        self.circuit_breaker = CircuitBreaker()
+
+    @property
+    def supports_batch(self):
+        return bool(self.batch_url) and self.max_batch_size > 1
+
+
+class WhatsAppService:
+    """Send WhatsApp messages through keep-alive connection pools"""
+
+    def __init__(self, pool_size=10, max_attempts=5, backoff_base=2.0, backoff_cap=300.0):
+        self.pool_size = pool_size
+        self.providers = {}
+        self.default_provider = None
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+
+        # Outbox: min-heap of (due_at, seq, message) drained by one worker thread
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.dead_letter_handler = None
+        self._outbox = []
+        self._outbox_seq = itertools.count()
+        self._outbox_cond = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+
+    def register_provider(self, provider, default=False):
+        self.providers[provider.name] = provider
+        if default or self.default_provider is None:
+            self.default_provider = provider.name
+        return provider
+
+    def configure_from_env(self):
+        """Register the default provider from WHATSAPP_* environment variables"""
+        self.pool_size = int(os.environ.get('WHATSAPP_POOL_SIZE', self.pool_size))
+        self.max_attempts = int(os.environ.get('WHATSAPP_MAX_ATTEMPTS', self.max_attempts))
+        api_key = os.environ.get('WHATSAPP_API_KEY')
+        if not api_key:
+            return None
+
+        burst = os.environ.get('WHATSAPP_RATE_BURST')
+        connect_timeout = float(os.environ.get('WHATSAPP_CONNECT_TIMEOUT', 3.05))
+        read_timeout = float(os.environ.get('WHATSAPP_READ_TIMEOUT', 10))
+        return self.register_provider(WhatsAppProvider(
+            name=os.environ.get('WHATSAPP_PROVIDER', 'default'),
+            api_url=os.environ.get('WHATSAPP_API_URL', 'https://api.whatsapp.com/send'),
+            api_key=api_key,
+            rate_per_second=float(os.environ.get('WHATSAPP_RATE_LIMIT', 10)),
+            burst=float(burst) if burst else None,
+            batch_url=os.environ.get('WHATSAPP_BATCH_URL'),
+            max_batch_size=int(os.environ.get('WHATSAPP_BATCH_SIZE', 1)),
+            timeout=(connect_timeout, read_timeout)
+        ), default=True)
+
+    @property
+    def session(self):
+        """Shared session, recreated after fork so gunicorn workers never share sockets"""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=len(self.providers) or 1,
+                                          pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+                    self._session_pid = pid
+        return self._session
+
+    def get_provider(self, name=None):
+        return self.providers.get(name or self.default_provider)
+
+    def send_message(self, phone, message, provider=None):
+        """Send one message, returns True on success"""
+        profiler.outbound()
+        return self._deliver(phone, message, provider)[0]
+
+    def _deliver(self, phone, message, provider=None):
+        """Single delivery attempt -> (ok, retryable, error)"""
+        provider = self.get_provider(provider)
+        if provider is None:
+            print(f"📧 WhatsApp API would send to {phone}: {message[:50]}...")
+            return True, False, None
+
+        if not provider.circuit_breaker.allow():
+            return False, True, f'circuit open for {provider.name}'
+
+        provider.rate_limiter.acquire()
+        try:
+            response = self.session.post(provider.api_url, json={
+                'phone': phone,
+                'message': message,
+                'api_key': provider.api_key
+            }, timeout=provider.timeout)
+        except requests.RequestException as e:
+            print(f"WhatsApp API Error: {e}")
+            provider.circuit_breaker.record_failure()
+            return False, True, str(e)
+
+        if response.status_code == 200:
+            provider.circuit_breaker.record_success()
+            return True, False, None
+
+        # 429 and 5xx mean the provider is struggling; other 4xx will never succeed
+        retryable = response.status_code == 429 or response.status_code >= 500
+        if retryable:
+            provider.circuit_breaker.record_failure()
+        return False, retryable, f'HTTP {response.status_code}'
+
+    def send_batch(self, messages, provider=None):
+        """Send (phone, message) pairs, batched when the provider allows it"""
+        provider_obj = self.get_provider(provider)
+        if provider_obj is None or not provider_obj.supports_batch:
+            return [self.send_message(phone, message, provider) for phone, message in messages]
+
+        # a batch costs one token per message, so it can be no bigger than the bucket
+        batch_size = max(1, min(provider_obj.max_batch_size, int(provider_obj.rate_limiter.capacity)))
+        results = []
+        for start in range(0, len(messages), batch_size):
+            chunk = messages[start:start + batch_size]
+            if not provider_obj.circuit_breaker.allow():
+                results.extend([False] * len(chunk))
+                continue
+            provider_obj.rate_limiter.acquire(len(chunk))
+            profiler.outbound()
+            try:
+                response = self.session.post(provider_obj.batch_url, json={
+                    'messages': [{'phone': phone, 'message': message} for phone, message in chunk],
+                    'api_key': provider_obj.api_key
+                }, timeout=provider_obj.timeout)
+                ok = response.status_code == 200
+            except requests.RequestException as e:
+                print(f"WhatsApp API Error: {e}")
+                ok = False
+            if ok:
+                provider_obj.circuit_breaker.record_success()
+            else:
+                provider_obj.circuit_breaker.record_failure()
+            results.extend([ok] * len(chunk))
+        return results
+
+    # Outbox
+    def enqueue(self, phone, message, provider=None, context=None):
+        """Queue a message for background delivery with retries"""
+        outbound = OutboundMessage(phone, message, provider, context)
+        profiler.outbound()
+        self._schedule(outbound, 0.0)
+        return outbound
+
+    @property
+    def queue_depth(self):
+        return len(self._outbox)
+
+    def backoff_delay(self, attempts):
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempts)))
+
+    def _schedule(self, outbound, delay):
+        self._ensure_worker()
+        with self._outbox_cond:
+            heapq.heappush(self._outbox, (time.monotonic() + delay, next(self._outbox_seq), outbound))
+            self._outbox_cond.notify()
+
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._session_lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                if self._worker_pid != pid:
+                    # a forked worker must not replay the parent's queue
+                    self._outbox = []
+                self._worker = threading.Thread(target=self._run_outbox, name='whatsapp-outbox', daemon=True)
+                self._worker_pid = pid
+                self._worker.start()
+
+    def _run_outbox(self):
+        while True:
+            with self._outbox_cond:
+                while not self._outbox or self._outbox[0][0] > time.monotonic():
+                    timeout = self._outbox[0][0] - time.monotonic() if self._outbox else None
+                    self._outbox_cond.wait(timeout)
+                _, _, outbound = heapq.heappop(self._outbox)
+            try:
+                self._process(outbound)
+            except Exception as e:
+                print(f"WhatsApp outbox error: {e}")
+
+    def _process(self, outbound):
+        provider = self.get_provider(outbound.provider)
+        if provider is not None and not provider.circuit_breaker.allow():
+            # don't burn an attempt while the provider is known to be down
+            self._schedule(outbound, provider.circuit_breaker.retry_after() + random.uniform(0, 1))
+            return
+
+        outbound.attempts += 1
+        ok, retryable, error = self._deliver(outbound.phone, outbound.message, outbound.provider)
+        if ok:
+            return
+
+        outbound.last_error = error
+        if retryable and outbound.attempts < self.max_attempts:
+            self._schedule(outbound, self.backoff_delay(outbound.attempts))
+        else:
+            self._dead_letter(outbound)
+
+    def drain_to_dead_letters(self):
+        """Dead-letter every message still queued in this process; run at exit"""
+        with self._outbox_cond:
+            if self._worker_pid != os.getpid():
+                # a forked copy of the parent's queue, which the parent drains itself
+                return 0
+            pending = [outbound for _, _, outbound in self._outbox]
+            self._outbox = []
+        for outbound in pending:
+            outbound.last_error = outbound.last_error or 'still queued at shutdown'
+            try:
+                self._dead_letter(outbound)
+            except Exception as e:
+                print(f"WhatsApp outbox error: {e}")
+        return len(pending)
+
+    def _dead_letter(self, outbound):
+        print(f"☠️ WhatsApp to {outbound.phone} dead-lettered after {outbound.attempts} attempts: {outbound.last_error}")
+        if self.dead_letter_handler is not None:
+            self.dead_letter_handler(outbound)
+
+    def booking_notification_message(self, hotel, booking):
+        return (f"🆕 නව බුකින්ග් #{booking.id} - {hotel.name}\n"
+                f"අමුත්තන්: {booking.guest_name}\n"
+                f"Check-in: {booking.check_in_date}\n"
+                f"Check-out: {booking.check_out_date}")
+
+    def group_booking_notification_message(self, hotel, bookings, rooms):
+        """One owner message for every room of a group booking; rooms maps room id -> Room"""
+        first = bookings[0]
+        counts = Counter(getattr(rooms.get(b.room_id), 'room_type', None) or '-' for b in bookings)
+        lines = [f"🆕 නව කණ්ඩායම් බුකින්ග් - {hotel.name} ({len(bookings)} කාමර)",
+                 f"අමුත්තන්: {first.guest_name}",
+                 f"Check-in: {first.check_in_date}",
+                 f"Check-out: {first.check_out_date}"]
+        lines += [f"• {room_type}: {count}" for room_type, count in counts.items()]
+        lines.append("බුකින්ග්: " + ", ".join(f"#{b.id}" for b in bookings[:DIGEST_MAX_LINES]) +
+                     (" ..." if len(bookings) > DIGEST_MAX_LINES else ""))
+        return "\n".join(lines)
+
+    def send_group_confirmation_to_customer(self, hotel, bookings):
+        first = bookings[0]
+        phone = getattr(first, 'guest_whatsapp', None) or first.guest_phone
+        total = sum(b.total_price for b in bookings)
+        message = (f"✅ ඔබගේ කණ්ඩායම් බුකින්ග් තහවුරුයි - {hotel.name}\n"
+                   f"කාමර: {len(bookings)}\n"
+                   f"Check-in: {first.check_in_date}\n"
+                   f"Check-out: {first.check_out_date}\n"
+                   f"මුළු මුදල: රු. {total:,.2f}")
+        self.enqueue(phone, message, context={'group_id': first.group_id, 'hotel_id': hotel.id})
+        return {'success': True, 'queued': True}
+
+    def send_booking_notification_to_owner(self, hotel, booking, customer):
+        phone = getattr(hotel, 'whatsapp_number', None) or hotel.contact_number
+        message = self.booking_notification_message(hotel, booking)
+        self.enqueue(phone, message, context={'booking_id': booking.id, 'hotel_id': hotel.id})
+        return {'success': True, 'queued': True}
+
+    def send_owner_digest(self, hotel, events):
+        """Coalesce (event_type, summary) pairs into a single owner message"""
+        counts = Counter(event_type for event_type, _ in events)
+        lines = [f"📋 {hotel.name} - යාවත්කාලීන සාරාංශය"]
+        lines += [f"{DIGEST_EVENT_LABELS.get(event_type, event_type)}: {count}"
+                  for event_type, count in counts.items()]
+        lines.append('')
+        lines += [f"• {summary}" for _, summary in events[:DIGEST_MAX_LINES]]
+        if len(events) > DIGEST_MAX_LINES:
+            lines.append(f"... සහ තවත් {len(events) - DIGEST_MAX_LINES}ක්")
+
+        phone = getattr(hotel, 'whatsapp_number', None) or hotel.contact_number
+        self.enqueue(phone, "\n".join(lines), context={'hotel_id': hotel.id, 'digest_events': len(events)})
+        return {'success': True, 'queued': True}
+
+    def send_booking_confirmation_to_customer(self, hotel, booking):
+        phone = getattr(booking, 'guest_whatsapp', None) or booking.guest_phone
+        message = (f"✅ ඔබගේ බුකින්ග් #{booking.id} තහවුරුයි - {hotel.name}\n"
+                   f"Check-in: {booking.check_in_date}\n"
+                   f"Check-out: {booking.check_out_date}")
+        self.enqueue(phone, message, context={'booking_id': booking.id, 'hotel_id': hotel.id})
+        return {'success': True, 'queued': True}
+
+    def send_booking_change_to_customer(self, hotel, booking):
+        phone = getattr(booking, 'guest_whatsapp', None) or booking.guest_phone
+        if booking.status == 'cancelled':
+            message = f"❌ ඔබගේ බුකින්ග් #{booking.id} අවලංගු කරන ලදී - {hotel.name}"
+        else:
+            message = (f"✏️ ඔබගේ බුකින්ග් #{booking.id} යාවත්කාලීන කරන ලදී - {hotel.name}\n"
+                       f"Check-in: {booking.check_in_date}\n"
+                       f"Check-out: {booking.check_out_date}\n"
+                       f"මුළු මුදල: රු. {booking.total_price:,.2f}")
+        self.enqueue(phone, message, context={'booking_id': booking.id, 'hotel_id': hotel.id})
+        return {'success': True, 'queued': True}
+
+    def send_waitlist_offer(self, hotel, entry, room):
+        phone = getattr(entry, 'guest_whatsapp', None) or entry.guest_phone
+        message = (f"🎉 {hotel.name} හි කාමරයක් ඔබ වෙනුවෙන් රඳවා ඇත!\n"
+                   f"කාමරය: {room.room_number} ({room.room_type or '-'})\n"
+                   f"Check-in: {entry.check_in_date}\n"
+                   f"Check-out: {entry.check_out_date}\n"
+                   f"{entry.hold_expires_at:%Y-%m-%d %H:%M} UTC ට පෙර 'මගේ බුකින්ග්' හි තහවුරු කරන්න.")
+        self.enqueue(phone, message, context={'waitlist_id': entry.id, 'hotel_id': hotel.id})
+        return {'success': True, 'queued': True}
+
+
+whatsapp_service = WhatsAppService()